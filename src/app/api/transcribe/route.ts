@@ -124,6 +124,9 @@ export async function POST(request: NextRequest) {
     const scriptStartTime = Date.now(); // Record script execution start time
     try {
         const { stdout, stderr } = await execPromise(command, {
+            // Only the JSON is returned: its "waveform" field carries the inline peak levels,
+            // so no .peaks sidecar is written next to the temporary output
+            env: { ...process.env, WAVEFORM_SIDECAR: '0' },
             timeout: 600000, // 10 minute timeout
             maxBuffer: 10 * 1024 * 1024 // 10MB buffer
         });
@@ -1,11 +1,31 @@
 import { NextRequest, NextResponse } from 'next/server';
 import path from 'path';
-import { exec } from 'child_process';
+import { execFile } from 'child_process';
 import { promisify } from 'util';
 import os from 'os';
 import fs from 'fs';
 
-const execPromise = promisify(exec);
+const execFilePromise = promisify(execFile);
+
+// Raw NLLB-200 codes (e.g. hin_Deva), which translate.py accepts as well as language names
+const NLLB_CODE = /^[a-z]{3}_[A-Z][a-z]{3}$/;
+// Whisper language codes (e.g. hi, haw) as stored in transcripts; translate.py maps them with nllb_code
+const WHISPER_CODE = /^[a-z]{2,3}$/;
+
+// Language names translate.py supports (TranscriptTranslator.LANGUAGE_CODES), read once per server process
+let supportedLanguages: Promise<Set<string>> | null = null;
+
+function loadSupportedLanguages(pythonPath: string, scriptPath: string): Promise<Set<string>> {
+  if (!supportedLanguages) {
+    supportedLanguages = execFilePromise(pythonPath, [scriptPath, '--list-languages'], { timeout: 60000 })
+      .then(({ stdout }) => new Set<string>(JSON.parse(stdout.trim().split('\n').pop() || '{}').languages || []))
+      .catch((error) => {
+        supportedLanguages = null; // Retry on the next request
+        throw error;
+      });
+  }
+  return supportedLanguages;
+}
 
 // Increase response limit for larger translations
 export const config = {
@@ -18,13 +38,15 @@ export async function POST(request: NextRequest) {
   try {
     // Parse the request body
     const data = await request.json();
-    const { text, targetLanguage } = data;
+    const { text, targetLanguage, targetLanguages, sourceLanguage } = data;
+    // Several targets are translated in one pass (shared encoder states)
+    const multiTarget = Array.isArray(targetLanguages) && targetLanguages.length > 0;
 
     if (!text) {
       return NextResponse.json({ error: 'No text provided for translation' }, { status: 400 });
     }
 
-    if (!targetLanguage) {
+    if (!targetLanguage && !multiTarget) {
       return NextResponse.json({ error: 'No target language specified' }, { status: 400 });
     }
 
@@ -47,7 +69,7 @@ export async function POST(request: NextRequest) {
       
       for (const alt of alternatives) {
         try {
-          await execPromise(`"${alt}" --version`);
+          await execFilePromise(alt, ['--version']);
           pythonPath = alt;
           console.log(`Found Python at: ${alt}`);
           break;
@@ -66,6 +88,31 @@ export async function POST(request: NextRequest) {
       return NextResponse.json({ error: 'Translation script not found' }, { status: 500 });
     }
 
+    // Only known languages reach the command line
+    let languages: Set<string>;
+    try {
+      languages = await loadSupportedLanguages(pythonPath, scriptPath);
+    } catch (listError) {
+      console.error('Could not read the supported languages from translate.py:', listError);
+      return NextResponse.json({ error: 'Translation languages unavailable' }, { status: 500 });
+    }
+    const normalizeLanguage = (language: string) => NLLB_CODE.test(language) ? language : language.toLowerCase();
+    const requestedLanguages: unknown[] = multiTarget ? targetLanguages : [targetLanguage];
+    const unsupported = requestedLanguages.filter(
+      (language) => typeof language !== 'string' || !(NLLB_CODE.test(language) || languages.has(language.toLowerCase()))
+    );
+    if (unsupported.length > 0) {
+      return NextResponse.json({
+        error: `Unsupported target language: ${unsupported.map(String).join(', ')}`,
+        supportedLanguages: Array.from(languages),
+      }, { status: 400 });
+    }
+    if (sourceLanguage !== undefined && sourceLanguage !== null && (typeof sourceLanguage !== 'string'
+        || !(NLLB_CODE.test(sourceLanguage) || WHISPER_CODE.test(sourceLanguage) || languages.has(sourceLanguage.toLowerCase())))) {
+      return NextResponse.json({ error: `Unsupported source language: ${String(sourceLanguage)}` }, { status: 400 });
+    }
+    const sourceArgs = sourceLanguage ? ['--source', normalizeLanguage(sourceLanguage)] : [];
+
     // Encode text to avoid command-line issues - base64 encoding is safer for command-line
     const encodedText = Buffer.from(text).toString('base64');
     
@@ -77,15 +124,18 @@ export async function POST(request: NextRequest) {
     
     const outputFile = path.join(tempDir, `translation-${Date.now()}.txt`);
 
-    // Use a command that writes to file instead of stdout to avoid encoding issues
-    const command = `"${pythonPath}" "${scriptPath}" --text "${encodedText}" --target "${targetLanguage}" --base64 --output-file "${outputFile}"`;
+    // Arguments are passed to Python as-is (no shell); output goes to a file to avoid encoding issues
+    const targetArgs = multiTarget
+      ? ['--targets', ...targetLanguages.map(normalizeLanguage)]
+      : ['--target', normalizeLanguage(targetLanguage)];
+    const args = [scriptPath, '--text', encodedText, ...sourceArgs, ...targetArgs, '--base64', '--output-file', outputFile];
     
     console.log(`Executing translation command (text length: ${text.length} chars)`);
-    console.log(`Command: ${pythonPath} ${scriptPath} --base64 [text hidden] --target ${targetLanguage} --output-file ${outputFile}`);
+    console.log(`Command: ${pythonPath} ${scriptPath} --base64 [text hidden] ${[...sourceArgs, ...targetArgs].join(' ')} --output-file ${outputFile}`);
     
     try {
       // Execute with a generous timeout for larger texts
-      const { stdout, stderr } = await execPromise(command, {
+      const { stdout, stderr } = await execFilePromise(pythonPath, args, {
         maxBuffer: 10 * 1024 * 1024, // 10MB buffer for large translations
         timeout: 180000 // 3 minute timeout
       });
@@ -123,6 +173,9 @@ export async function POST(request: NextRequest) {
       }
 
       // Return successful translation
+      if (multiTarget) {
+        return NextResponse.json(JSON.parse(translatedText));
+      }
       return NextResponse.json({ translatedText: translatedText.trim() });
     } catch (execError) {
       console.error('Error executing translation command:', execError);
@@ -140,6 +193,9 @@ export async function POST(request: NextRequest) {
           }
           
           if (!translatedText.startsWith('ERROR:')) {
+            if (multiTarget) {
+              return NextResponse.json(JSON.parse(translatedText));
+            }
             return NextResponse.json({ translatedText: translatedText.trim() });
           }
         } catch (readError) {
@@ -26,6 +26,7 @@ const AudioDrop = ({ onTranscriptionUpdate, onPlayerReady, onHypothesisUpdate }:
   const audioChunksRef = useRef<Blob[]>([]);
   const [currentAudioSource, setCurrentAudioSource] = useState<string | File | null>(null);
   const [transcription, setTranscription] = useState<any[]>([]);
+  const [transcriptLanguage, setTranscriptLanguage] = useState<string | null>(null); // Identified language (Whisper code)
   const [isTranscribing, setIsTranscribing] = useState(false);
   const [transcriptionError, setTranscriptionError] = useState<string | null>(null);
   const [transcriptionProgress, setTranscriptionProgress] = useState(0);
@@ -173,6 +174,7 @@ const AudioDrop = ({ onTranscriptionUpdate, onPlayerReady, onHypothesisUpdate }:
     setIsTranscribing(true);
     setTranscriptionError(null);
     setTranscription([]);
+    setTranscriptLanguage(null);
     setTranscriptionProgress(0);
     setActiveSegmentIndex(-1);
     setHypothesisText(null); // Clear local hypothesis text
@@ -247,6 +249,7 @@ const AudioDrop = ({ onTranscriptionUpdate, onPlayerReady, onHypothesisUpdate }:
 
         const segmentsWithWordTimestamps = generateWordTimestampsForTranscript(processedSegments);
         setTranscription(segmentsWithWordTimestamps);
+        setTranscriptLanguage(typeof data.language === 'string' && data.language !== 'unknown' ? data.language : null);
 
         // --- Extract and update hypothesis text ---
         const fullText = extractHypothesisText(data);
@@ -477,15 +480,17 @@ const AudioDrop = ({ onTranscriptionUpdate, onPlayerReady, onHypothesisUpdate }:
 
       // Use the same handler as file uploads
       const transcriptionResult = result.transcription || result;
+      // Shared transcript schema keeps segments under `transcription` (older output used `segments`)
+      const youtubeSegments = transcriptionResult?.transcription ?? transcriptionResult?.segments;
 
-      // --- Check if transcriptionResult is an array before mapping ---
-      if (!Array.isArray(transcriptionResult?.segments)) {
+      // --- Check if the segment list is an array before mapping ---
+      if (!Array.isArray(youtubeSegments)) {
           console.error("Invalid transcription data received from YouTube API:", transcriptionResult);
           throw new Error("Received invalid data format from YouTube transcript fetch.");
       }
       // --- End Check ---
 
-      const processedSegments = transcriptionResult.segments.map((segment: any, index: number) => {
+      const processedSegments = youtubeSegments.map((segment: any, index: number) => {
         // ... (rest of the segment processing logic remains the same) ...
         const startSeconds = segment.start_seconds ??
                             (typeof segment.start === 'string' ? Math.round(parseFloat(segment.start)) :
@@ -683,6 +688,7 @@ const AudioDrop = ({ onTranscriptionUpdate, onPlayerReady, onHypothesisUpdate }:
           ) : transcription.length > 0 ? (
             <Transcript
               segments={transcription}
+              language={transcriptLanguage}
               onSegmentClick={(segment: any) => handleSeekTo(segment.start_seconds)}
               onWordClick={handleWordClick}
               activeSegmentIndex={activeSegmentIndex}
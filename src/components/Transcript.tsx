@@ -33,6 +33,7 @@ interface TranscriptSegment {
 
 interface TranscriptProps {
   segments: TranscriptSegment[];
+  language?: string | null; // Identified language of the transcript, the translation source
   onSegmentClick?: (segment: TranscriptSegment) => void;
   onWordClick?: (timestamp: number) => void;
   activeSegmentIndex?: number;
@@ -41,6 +42,7 @@ interface TranscriptProps {
 
 export default function Transcript({
   segments,
+  language = null,
   onSegmentClick,
   onWordClick,
   activeSegmentIndex = -1,
@@ -345,7 +347,7 @@ export default function Transcript({
         </TabsContent>
         
         <TabsContent value="translation" className="mt-0">
-          <TranslationControls transcriptText={fullTranscriptText} />
+          <TranslationControls transcriptText={fullTranscriptText} sourceLanguage={language} />
         </TabsContent>
 
         <TabsContent value="summary" className="mt-0">
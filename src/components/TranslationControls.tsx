@@ -21,9 +21,10 @@ const LANGUAGES = [
 
 interface TranslationControlsProps {
   transcriptText: string;
+  sourceLanguage?: string | null; // Language identified at transcription time; English is assumed without it
 }
 
-export default function TranslationControls({ transcriptText }: TranslationControlsProps) {
+export default function TranslationControls({ transcriptText, sourceLanguage = null }: TranslationControlsProps) {
   const [selectedLanguage, setSelectedLanguage] = useState("spanish");
   const [translatedText, setTranslatedText] = useState("");
   const [isTranslating, setIsTranslating] = useState(false);
@@ -53,7 +54,8 @@ export default function TranslationControls({ transcriptText }: TranslationContr
         },
         body: JSON.stringify({
           text: transcriptText,
-          targetLanguage: selectedLanguage
+          targetLanguage: selectedLanguage,
+          ...(sourceLanguage ? { sourceLanguage } : {}),
         }),
       });
 
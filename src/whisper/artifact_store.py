@@ -0,0 +1,278 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+
+# Per-media store of pipeline stage outputs, for incremental reprocessing.
+#
+# Every stage (decoded PCM, VAD map, ASR segments, diarization turns, aligned
+# result) is saved separately under
+#
+#   <ARTIFACT_DIR>/<media sha1>/<stage>-<key>.<ext>
+#
+# where <key> hashes the stage's config together with the keys of the stages it
+# consumes. Changing one setting therefore changes the key of that stage and of
+# everything downstream, while upstream artifacts are reused: turning on
+# --diarize for an already transcribed file reuses the PCM and ASR artifacts and
+# only runs diarization + alignment.
+#
+# The store is bounded on every write: artifacts unused for ARTIFACT_MAX_AGE_DAYS
+# are deleted, and beyond ARTIFACT_STORE_MB the least recently used ones are
+# evicted (never those of the media being written, nor anything used within
+# IN_USE_SECONDS, which may belong to a running job).
+
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "sonicseeker", "artifacts")
+STAGE_VERSION = 1 # Bump to invalidate every stored artifact after a format change
+PCM_CONFIG = {"sample_rate": 16000, "channels": 1, "codec": "pcm_s16le"} # The "pcm" stage (decoded WAV)
+ARTIFACT_STORE_MB = float(os.environ.get("ARTIFACT_STORE_MB", 20480)) # 0 = no size cap
+ARTIFACT_MAX_AGE_DAYS = float(os.environ.get("ARTIFACT_MAX_AGE_DAYS", 30)) # 0 = no age limit
+IN_USE_SECONDS = 3600
+
+
+def media_hash(path, chunk_size=1 << 20):
+    """SHA-1 of the file contents (the key survives renames/re-uploads)."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stage_key(stage, config, inputs=()):
+    """Deterministic key for a stage's config plus the keys of its input artifacts."""
+    payload = json.dumps({"stage": stage, "version": STAGE_VERSION, "config": config, "inputs": list(inputs)},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class Artifact:
+    """One stage output: a JSON value or a file produced by the stage."""
+
+    def __init__(self, directory, stage, key, ext):
+        self.stage = stage
+        self.key = key
+        self.ext = ext
+        self.path = os.path.join(directory, f"{stage}-{key}.{ext}")
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            value = json.load(f)
+        os.utime(self.path) # Recently used artifacts survive pruning
+        return value
+
+    def save(self, value):
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        return value
+
+    def temp_path(self):
+        """Where a file-producing stage should write before commit_file() (keeps the extension for ffmpeg)."""
+        return f"{self.path[:-len(self.ext) - 1]}.{os.getpid()}.{threading.get_ident()}.tmp.{self.ext}"
+
+    def commit_file(self):
+        os.replace(self.temp_path(), self.path)
+        return self.path
+
+
+class MediaArtifacts:
+    """Artifacts of one media file."""
+
+    persistent = True
+
+    def __init__(self, media_path, root=None):
+        self.media = media_hash(media_path)
+        self.root = root or ARTIFACT_DIR
+        self.directory = os.path.join(self.root, self.media)
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = []
+        self.misses = []
+
+    def artifact(self, stage, config, inputs=(), ext="json"):
+        return Artifact(self.directory, stage, stage_key(stage, config, inputs), ext)
+
+    def json_stage(self, stage, config, inputs, compute):
+        """
+        Returns (value, key): the stored value when one exists for these inputs,
+        otherwise compute() saved as the new artifact. compute() returning None
+        (a failed stage) is not stored.
+        """
+        artifact = self.artifact(stage, config, inputs)
+        if artifact.exists():
+            try:
+                value = artifact.load()
+                self.hits.append(stage)
+                logging.info(f"Reusing {stage} artifact {artifact.key}")
+                return value, artifact.key
+            except (OSError, ValueError) as e:
+                logging.warning(f"Discarding unreadable {stage} artifact: {e}")
+        self.misses.append(stage)
+        value = compute()
+        if value is not None:
+            artifact.save(value)
+            self._enforce_limits()
+        return value, artifact.key
+
+    def file_stage(self, stage, config, inputs, produce, ext):
+        """
+        Like json_stage for stages that write a file: produce(path) must write to
+        `path` and return True. Returns (path or None, key).
+        """
+        artifact = self.artifact(stage, config, inputs, ext)
+        if artifact.exists():
+            os.utime(artifact.path)
+            self.hits.append(stage)
+            logging.info(f"Reusing {stage} artifact {artifact.key}")
+            return artifact.path, artifact.key
+        self.misses.append(stage)
+        if not produce(artifact.temp_path()):
+            if os.path.exists(artifact.temp_path()):
+                os.remove(artifact.temp_path())
+            return None, artifact.key
+        path = artifact.commit_file()
+        self._enforce_limits()
+        return path, artifact.key
+
+    def _enforce_limits(self):
+        try:
+            enforce_limits(self.root, keep=self.directory)
+        except OSError as e:
+            logging.warning(f"Could not enforce artifact store limits: {e}")
+
+
+class TransientArtifacts:
+    """Same interface as MediaArtifacts, but nothing is kept (store disabled or unavailable)."""
+
+    persistent = False
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.media = None
+        self.hits = []
+        self.misses = []
+
+    def json_stage(self, stage, config, inputs, compute):
+        self.misses.append(stage)
+        return compute(), None
+
+    def file_stage(self, stage, config, inputs, produce, ext):
+        self.misses.append(stage)
+        path = os.path.join(self.directory, f"{stage}.{ext}")
+        return (path if produce(path) else None), None
+
+
+def cached_pcm(media, root=None):
+    """Path of the stored decoded WAV of a media hash, or None (no transcription run kept it)."""
+    artifact = Artifact(os.path.join(root or ARTIFACT_DIR, media), "pcm", stage_key("pcm", PCM_CONFIG, [media]), "wav")
+    return artifact.path if artifact.exists() else None
+
+def artifacts_enabled():
+    return os.environ.get("ARTIFACT_STORE", "1").lower() not in ("0", "false", "no")
+
+def open_artifacts(media_path, temp_dir, enabled=None):
+    """The persistent store for media_path, or a transient one under temp_dir."""
+    if enabled if enabled is not None else artifacts_enabled():
+        try:
+            return MediaArtifacts(media_path)
+        except OSError as e:
+            logging.warning(f"Artifact store unavailable, computing every stage: {e}")
+    return TransientArtifacts(temp_dir)
+
+
+# --- Maintenance ---
+
+def store_stats(root=None):
+    root = root or ARTIFACT_DIR
+    media = 0
+    files = 0
+    size = 0
+    for entry in os.scandir(root) if os.path.isdir(root) else []:
+        if entry.is_dir():
+            media += 1
+            for artifact in os.scandir(entry.path):
+                files += 1
+                size += artifact.stat().st_size
+    return {"root": root, "media": media, "artifacts": files, "size_mb": round(size / 2**20, 1),
+            "limit_mb": ARTIFACT_STORE_MB, "max_age_days": ARTIFACT_MAX_AGE_DAYS}
+
+def _artifact_files(root):
+    """[(last used, size, path)] of every stored file, oldest first."""
+    files = []
+    for entry in os.scandir(root) if os.path.isdir(root) else []:
+        if entry.is_dir():
+            for artifact in os.scandir(entry.path):
+                try:
+                    stat = artifact.stat()
+                except FileNotFoundError: # Removed by another process meanwhile
+                    continue
+                files.append((stat.st_mtime, stat.st_size, artifact.path))
+    return sorted(files)
+
+def _remove_empty_dirs(root, before=None):
+    for entry in os.scandir(root) if os.path.isdir(root) else []:
+        if entry.is_dir() and not os.listdir(entry.path) and (before is None or entry.stat().st_mtime < before):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+def enforce_limits(root=None, keep=None, max_mb=None, max_age_days=None):
+    """
+    Deletes artifacts older than max_age_days, then least recently used ones
+    until the store fits in max_mb. Files under `keep` and files used within
+    IN_USE_SECONDS are left alone. Returns how many artifacts were removed.
+    """
+    root = root or ARTIFACT_DIR
+    max_bytes = (ARTIFACT_STORE_MB if max_mb is None else max_mb) * 2**20
+    max_age = (ARTIFACT_MAX_AGE_DAYS if max_age_days is None else max_age_days) * 86400
+    now = time.time()
+    files = _artifact_files(root)
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        expired = max_age and mtime < now - max_age
+        if not expired and (not max_bytes or total <= max_bytes):
+            break # Oldest first: nothing after this one is due either
+        if mtime >= now - IN_USE_SECONDS or (keep and os.path.dirname(path) == keep):
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    _remove_empty_dirs(root, before=now - IN_USE_SECONDS)
+    if removed:
+        logging.info(f"Evicted {removed} artifacts (store now {total / 2**20:.0f} MB)")
+    return removed
+
+def prune(max_age_days, root=None):
+    """Deletes artifacts not used for max_age_days and empty media directories."""
+    root = root or ARTIFACT_DIR
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for entry in os.scandir(root) if os.path.isdir(root) else []:
+        if not entry.is_dir():
+            continue
+        for artifact in os.scandir(entry.path):
+            if artifact.stat().st_mtime < cutoff:
+                os.remove(artifact.path)
+                removed += 1
+        if not os.listdir(entry.path):
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect or prune the pipeline artifact store.')
+    parser.add_argument('--root', default=ARTIFACT_DIR)
+    parser.add_argument('--prune-days', type=float, help='Delete artifacts unused for this many days.')
+    args = parser.parse_args()
+    if args.prune_days is not None:
+        print(f"Removed {prune(args.prune_days, args.root)} artifacts", file=sys.stderr)
+    print(json.dumps(store_stats(args.root), indent=2))
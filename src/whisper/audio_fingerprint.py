@@ -0,0 +1,294 @@
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# Acoustic fingerprints for re-encoded / trimmed / overlapping duplicate media.
+#
+# A byte hash (artifact_store.media_hash) misses a recording that was
+# re-encoded, trimmed, or uploaded once as the meeting video and once as its
+# audio track. Fingerprints are computed from the decoded 16 kHz PCM instead:
+#
+#   - spectrogram (1024-point FFT, 32 ms hop), local spectral peaks
+#   - landmark hashes: each peak paired with the next FAN_OUT peaks,
+#     hash = (anchor freq, target freq, frame delta) packed into 24 bits
+#
+# Hashes are stored in a SQLite index (FINGERPRINT_DB) together with each
+# media file's transcript segments. A new file's hashes are looked up there; hits
+# that agree on one time offset against one indexed file form a matched
+# range. Transcript segments of the matched ranges are reused (shifted to the
+# new timeline) and only the remaining audio is transcribed.
+#
+#   python audio_fingerprint.py --match new.mp4         # what would be reused
+#   python audio_fingerprint.py --stats
+
+SAMPLE_RATE = 16000
+N_FFT = 1024
+HOP = 512
+FRAME_SECONDS = HOP / SAMPLE_RATE
+MAX_BIN = 384              # ~6 kHz; above that re-encoding (low-pass) destroys peaks
+PEAK_NEIGHBORHOOD = (7, 15) # frames x bins around a peak that it must dominate
+PEAKS_PER_SECOND = 30
+FAN_OUT = 5
+MAX_DELTA = 63             # frames (6 bits)
+BLOCK_FRAMES = 2048        # spectrogram computed in blocks (~65 s) to bound memory
+
+MIN_MATCHES = 20           # hashes agreeing on one offset before a file counts as a match
+MIN_RANGE_SECONDS = 2.0
+RANGE_GAP_SECONDS = 3.0    # hits further apart than this split a matched range
+MIN_NEW_SECONDS = 1.0      # unmatched gaps shorter than this are not transcribed
+FINGERPRINT_DB = os.environ.get("FINGERPRINT_DB") or os.path.join(os.path.expanduser("~"), ".cache", "sonicseeker", "fingerprints.sqlite")
+
+
+def dedupe_enabled():
+    return os.environ.get("WHISPER_DEDUPE", "0").lower() in ("1", "true", "yes")
+
+
+# --- Fingerprinting ---
+
+def _sliding_max(values, size, axis):
+    """Max filter of odd `size` along one axis (edges padded with -inf)."""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (size // 2, size // 2)
+    padded = np.pad(values, pad, constant_values=-np.inf)
+    return np.lib.stride_tricks.sliding_window_view(padded, size, axis=axis).max(axis=-1)
+
+def _block_peaks(spectrum):
+    """(frame, bin) of the dominant local maxima of a log-magnitude block."""
+    local_max = _sliding_max(_sliding_max(spectrum, PEAK_NEIGHBORHOOD[0], 0), PEAK_NEIGHBORHOOD[1], 1)
+    candidates = (spectrum == local_max) & (spectrum > spectrum.mean() + spectrum.std())
+    frames, bins = np.nonzero(candidates)
+    budget = int(PEAKS_PER_SECOND * len(spectrum) * FRAME_SECONDS)
+    if len(frames) > budget:
+        strongest = np.argsort(spectrum[frames, bins])[::-1][:budget]
+        frames, bins = frames[strongest], bins[strongest]
+    return frames, bins
+
+def spectral_peaks(audio):
+    """All spectral peaks of 16 kHz float32 audio as (frames, bins), sorted by time."""
+    window = np.hanning(N_FFT).astype(np.float32)
+    n_frames = max(0, 1 + (len(audio) - N_FFT) // HOP)
+    all_frames, all_bins = [], []
+    margin = PEAK_NEIGHBORHOOD[0] // 2
+    for block_start in range(0, n_frames, BLOCK_FRAMES):
+        # Blocks overlap by the neighborhood so peaks at block edges are judged correctly
+        first = max(0, block_start - margin)
+        last = min(n_frames, block_start + BLOCK_FRAMES + margin)
+        frames = np.lib.stride_tricks.sliding_window_view(audio[first * HOP:(last - 1) * HOP + N_FFT], N_FFT)[::HOP]
+        spectrum = np.log(np.abs(np.fft.rfft(frames * window, axis=1))[:, :MAX_BIN] + 1e-6)
+        peak_frames, peak_bins = _block_peaks(spectrum)
+        peak_frames = peak_frames + first
+        keep = (peak_frames >= block_start) & (peak_frames < block_start + BLOCK_FRAMES)
+        all_frames.append(peak_frames[keep])
+        all_bins.append(peak_bins[keep])
+    if not all_frames:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    frames, bins = np.concatenate(all_frames), np.concatenate(all_bins)
+    order = np.lexsort((bins, frames))
+    return frames[order], bins[order]
+
+def fingerprint(audio):
+    """Landmark hashes of the audio: (uint32 hashes, int32 anchor frames)."""
+    frames, bins = spectral_peaks(audio)
+    hashes, anchors = [], []
+    for k in range(1, FAN_OUT + 1):
+        delta = frames[k:] - frames[:-k]
+        valid = (delta >= 1) & (delta <= MAX_DELTA)
+        hashes.append((bins[:-k][valid] << 15) | (bins[k:][valid] << 6) | delta[valid])
+        anchors.append(frames[:-k][valid])
+    if not hashes:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(hashes).astype(np.uint32), np.concatenate(anchors).astype(np.int32)
+
+
+# --- Index ---
+
+class FingerprintIndex:
+    """SQLite lookup of hash -> (media, frame), plus each media file's transcript segments."""
+
+    def __init__(self, path=None):
+        self.path = path or FINGERPRINT_DB
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS media (id TEXT PRIMARY KEY, duration REAL, segments TEXT, added REAL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS hashes (hash INTEGER, media TEXT, frame INTEGER)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS hashes_hash ON hashes (hash)")
+
+    def contains(self, media):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM media WHERE id = ?", (media,)).fetchone() is not None
+
+    def add(self, media, hashes, frames, duration, segments):
+        rows = {(int(h), int(f)) for h, f in zip(hashes, frames)}
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM hashes WHERE media = ?", (media,))
+            self._db.execute("INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?)",
+                             (media, duration, json.dumps(segments, ensure_ascii=False), time.time()))
+            self._db.executemany("INSERT INTO hashes VALUES (?, ?, ?)", ((h, media, f) for h, f in rows))
+
+    def segments(self, media):
+        with self._lock:
+            row = self._db.execute("SELECT segments FROM media WHERE id = ?", (media,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lookup(self, hashes, exclude=None):
+        """Yields (hash, media, frame) for every indexed occurrence of the given hashes."""
+        unique = [int(h) for h in np.unique(hashes)]
+        for start in range(0, len(unique), 900): # SQLite's bound-parameter limit
+            chunk = unique[start:start + 900]
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT hash, media, frame FROM hashes WHERE hash IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            for row in rows:
+                if row[1] != exclude:
+                    yield row
+
+    def stats(self):
+        with self._lock:
+            media, = self._db.execute("SELECT COUNT(*) FROM media").fetchone()
+            hashes, = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()
+        return {"path": self.path, "media": media, "hashes": hashes,
+                "size_mb": round(os.path.getsize(self.path) / 2**20, 1) if os.path.exists(self.path) else 0.0}
+
+
+# --- Matching ---
+
+def find_matches(index, hashes, frames, exclude=None):
+    """
+    Matched ranges [{media, start, end, offset, hits}] (seconds on the new file's
+    timeline; indexed time = new time + offset), non-overlapping, strongest first.
+    """
+    query_frames = defaultdict(list)
+    for h, f in zip(hashes.tolist(), frames.tolist()):
+        query_frames[h].append(f)
+    hits = defaultdict(list) # (media, offset in frames) -> query frames that agree on it
+    for h, media, frame in index.lookup(hashes, exclude):
+        for query_frame in query_frames[h]:
+            hits[(media, frame - query_frame)].append(query_frame)
+
+    # Re-encoding jitters peaks by a frame: fold each offset's neighbours into it
+    candidates = []
+    for (media, offset), agreeing in hits.items():
+        merged = agreeing + hits.get((media, offset - 1), []) + hits.get((media, offset + 1), [])
+        if len(merged) >= MIN_MATCHES:
+            candidates.append((len(merged), media, offset, merged))
+    candidates.sort(key=lambda c: c[0], reverse=True)
+
+    ranges = []
+    gap = RANGE_GAP_SECONDS / FRAME_SECONDS
+    for _, media, offset, agreeing in candidates:
+        points = np.unique(agreeing)
+        splits = np.nonzero(np.diff(points) > gap)[0] + 1
+        for run in np.split(points, splits):
+            start, end = float(run[0]) * FRAME_SECONDS, float(run[-1] + MAX_DELTA) * FRAME_SECONDS
+            if end - start < MIN_RANGE_SECONDS or len(run) < MIN_MATCHES // 2:
+                continue
+            if any(start < r["end"] and r["start"] < end for r in ranges):
+                continue # Already covered by a stronger match
+            ranges.append({"media": media, "start": round(start, 3), "end": round(end, 3),
+                           "offset": round(offset * FRAME_SECONDS, 3), "hits": len(run)})
+    return sorted(ranges, key=lambda r: r["start"])
+
+def reuse_segments(index, matches):
+    """Transcript segments of the matched ranges, shifted onto the new timeline."""
+    reused = []
+    for match in matches:
+        segments = index.segments(match["media"]) or []
+        offset = match["offset"]
+        for segment in segments:
+            middle = (segment["start"] + segment["end"]) / 2 - offset
+            if not match["start"] <= middle <= match["end"]:
+                continue
+            shifted = dict(segment, start=round(max(0.0, segment["start"] - offset), 3),
+                           end=round(max(0.0, segment["end"] - offset), 3))
+            shifted["words"] = [dict(w, start=round(w["start"] - offset, 3), end=round(w["end"] - offset, 3))
+                                for w in segment.get("words") or []]
+            reused.append(shifted)
+    return reused
+
+def uncovered_ranges(duration, covered):
+    """Gaps of at least MIN_NEW_SECONDS in [0, duration] not covered by the (start, end) spans."""
+    gaps = []
+    position = 0.0
+    for start, end in sorted(covered):
+        if start - position >= MIN_NEW_SECONDS:
+            gaps.append({"start": round(position, 3), "end": round(start, 3)})
+        position = max(position, end)
+    if duration - position >= MIN_NEW_SECONDS:
+        gaps.append({"start": round(position, 3), "end": round(duration, 3)})
+    return gaps
+
+
+def transcribe_with_reuse(audio, media, transcribe_ranges, index=None):
+    """
+    Transcribes 16 kHz audio, reusing indexed transcripts for duplicate ranges.
+    `transcribe_ranges(ranges)` transcribes only [{start, end}] (seconds) and
+    returns raw segments (or None on failure). Returns (segments, stats) and
+    indexes this file for later uploads.
+    """
+    index = index or FingerprintIndex()
+    duration = len(audio) / SAMPLE_RATE
+    started = time.perf_counter()
+    hashes, frames = fingerprint(audio)
+    matches = find_matches(index, hashes, frames, exclude=media)
+    for match in matches:
+        match["end"] = min(match["end"], round(duration, 3))
+    fingerprint_seconds = time.perf_counter() - started
+
+    reused = reuse_segments(index, matches)
+    # Only reused segments cover audio: speech inside a matched range whose indexed
+    # segment was not taken over (midpoint outside the range) is transcribed anew
+    covered = [(s["start"], s["end"]) for s in reused]
+    new_ranges = uncovered_ranges(duration, covered) if matches else [{"start": 0.0, "end": round(duration, 3)}]
+    transcribed = []
+    if new_ranges:
+        transcribed = transcribe_ranges(new_ranges if matches else None)
+        if transcribed is None:
+            return None, None
+        if matches:
+            transcribed = [s for s in transcribed
+                           if any(r["start"] <= (s["start"] + s["end"]) / 2 <= r["end"] for r in new_ranges)]
+    segments = sorted(reused + transcribed, key=lambda s: s["start"])
+    index.add(media, hashes, frames, duration, segments)
+
+    stats = {
+        "matches": matches,
+        "reused_segments": len(reused),
+        "reused_seconds": round(sum(m["end"] - m["start"] for m in matches), 3),
+        "transcribed_seconds": round(sum(r["end"] - r["start"] for r in new_ranges), 3),
+        "fingerprint_seconds": round(fingerprint_seconds, 3),
+    }
+    if matches:
+        logging.info(f"Fingerprint matches: reusing {stats['reused_segments']} segments "
+                     f"({stats['reused_seconds']:.1f}s), transcribing {stats['transcribed_seconds']:.1f}s")
+    return segments, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Audio fingerprint index for duplicate media.')
+    parser.add_argument('--match', help='Media file to look up (nothing is indexed).')
+    parser.add_argument('--stats', action='store_true', help='Show index size.')
+    args = parser.parse_args()
+
+    index = FingerprintIndex()
+    if args.match:
+        if not os.path.exists(args.match):
+            print(json.dumps({"error": f"File not found: {args.match}"}))
+            sys.exit(1)
+        from faster_whisper import decode_audio
+        from artifact_store import media_hash
+        audio = decode_audio(args.match, sampling_rate=SAMPLE_RATE)
+        hashes, frames = fingerprint(audio)
+        print(json.dumps({"duration": round(len(audio) / SAMPLE_RATE, 3), "hashes": len(hashes),
+                          "matches": find_matches(index, hashes, frames, exclude=media_hash(args.match))}, indent=2))
+    if args.stats or not args.match:
+        print(json.dumps(index.stats(), indent=2))
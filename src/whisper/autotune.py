@@ -0,0 +1,248 @@
+import argparse
+import datetime
+import gc
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from compare_transcripts import compare
+from model_loader import PROFILE_PATH, hardware_fingerprint, load_whisper_model, unload_models
+from worker_pool import memory_usage
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Hardware-aware autotuner for faster-whisper.
+#
+# Runs a short calibration clip through the model under different settings and
+# writes a profile that model_loader.whisper_config() / whisper_beam_size()
+# pick up automatically (explicit WHISPER_* env vars still win):
+#
+#   1. compute type   - fastest type whose transcript stays within --max-wer of
+#                       the most precise type (beam 5 reference)
+#   2. cpu_threads    - fastest thread count for a single transcription
+#   3. workers        - replica count / threads split with the best throughput
+#                       for concurrent jobs (used by worker_pool.py)
+#   4. beam size      - smallest beam whose transcript stays within --max-wer
+#
+# Each stage keeps the winners of the previous ones (a coordinate search), so
+# the run takes a few minutes instead of the full grid. Real-time factor (RTF)
+# is processing time / audio time; lower is faster.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_AUDIO = os.path.join(SCRIPT_DIR, "..", "..", "public", "samples", "demo.mp3")
+SAMPLE_RATE = 16000
+PROFILE_VERSION = 1
+# Most precise first: the first supported type is the quality reference
+COMPUTE_PREFERENCE = ("float32", "float16", "bfloat16", "int8_float32", "int8_float16", "int8_bfloat16", "int8")
+
+
+# --- Candidates ---
+
+def supported_compute_types(device):
+    try:
+        import ctranslate2
+        supported = set(ctranslate2.get_supported_compute_types(device))
+    except (ImportError, AttributeError):
+        supported = {"int8", "float32"}
+    return [c for c in COMPUTE_PREFERENCE if c in supported]
+
+def thread_candidates(cpu_count):
+    candidates = {cpu_count}
+    threads = 1
+    while threads < cpu_count:
+        candidates.add(threads)
+        threads *= 2
+    return sorted(candidates)
+
+
+# --- Measurement ---
+
+def load_calibration_audio(path, seconds):
+    from faster_whisper import decode_audio
+    audio = decode_audio(path, sampling_rate=SAMPLE_RATE)
+    return audio[:int(seconds * SAMPLE_RATE)] if seconds else audio
+
+def _transcribe_text(model, audio, beam_size):
+    segments, _ = model.transcribe(audio, beam_size=beam_size)
+    return " ".join(segment.text.strip() for segment in segments)
+
+def measure(audio, model_size, device, compute_type, cpu_threads, num_workers=1, beam_size=5, concurrency=1):
+    """Loads a fresh model with the given settings and times `concurrency` parallel transcriptions."""
+    unload_models()
+    gc.collect()
+    rss_before = (memory_usage(os.getpid()) or {}).get("rss_mb")
+
+    started = time.perf_counter()
+    model = load_whisper_model(model_size, device, compute_type, cpu_threads, num_workers)
+    load_seconds = time.perf_counter() - started
+    _transcribe_text(model, audio[:SAMPLE_RATE * 2], 1) # Warm-up (allocators, kernels)
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        texts = [_transcribe_text(model, audio, beam_size)]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            texts = list(executor.map(lambda _: _transcribe_text(model, audio, beam_size), range(concurrency)))
+    wall = time.perf_counter() - started
+
+    rss_after = (memory_usage(os.getpid()) or {}).get("rss_mb")
+    audio_seconds = len(audio) / SAMPLE_RATE
+    result = {
+        "compute_type": compute_type,
+        "cpu_threads": cpu_threads,
+        "num_workers": num_workers,
+        "beam_size": beam_size,
+        "concurrency": concurrency,
+        "load_seconds": round(load_seconds, 2),
+        "wall_seconds": round(wall, 2),
+        # Per stream RTF for a single job, aggregate RTF (wall / total audio) for concurrent jobs
+        "rtf": round(wall / (audio_seconds * concurrency), 4),
+        "memory_mb": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+        "text": texts[0],
+    }
+    logging.info(f"{compute_type:>13} threads={cpu_threads:<3} workers={num_workers} beam={beam_size} "
+                 f"concurrency={concurrency}: RTF {result['rtf']:.3f}, memory {result['memory_mb']} MB")
+    return result
+
+def word_error_rate(reference_text, hypothesis_text):
+    return compare(reference_text, hypothesis_text, mode="wer")["wer"]
+
+
+# --- Search ---
+
+def autotune(audio, model_size="base", device="cpu", compute_types=None, threads=None, workers=None,
+             beam_sizes=(5, 3, 2, 1), max_wer=0.05, max_memory_mb=None):
+    cpu_count = os.cpu_count() or 1
+    compute_types = compute_types or supported_compute_types(device)
+    threads = threads or thread_candidates(cpu_count)
+    workers = workers or [w for w in (1, 2, 4) if w <= cpu_count]
+    measurements = []
+
+    def run(**settings):
+        result = measure(audio, model_size, device, **settings)
+        measurements.append(result)
+        return result
+
+    def fits(result):
+        return max_memory_mb is None or result["memory_mb"] is None or result["memory_mb"] <= max_memory_mb
+
+    # 1. Compute type (all threads, beam 5); the most precise type is the quality reference
+    reference = None
+    best = None
+    for compute_type in compute_types:
+        try:
+            result = run(compute_type=compute_type, cpu_threads=cpu_count, beam_size=5)
+        except Exception as e:
+            logging.warning(f"Skipping compute type {compute_type}: {e}")
+            continue
+        if reference is None:
+            reference = result
+        result["wer_vs_reference"] = round(word_error_rate(reference["text"], result["text"]), 4)
+        if result["wer_vs_reference"] <= max_wer and fits(result) and (best is None or result["rtf"] < best["rtf"]):
+            best = result
+    if best is None:
+        raise RuntimeError("No compute type could be measured within the quality/memory limits")
+    compute_type = best["compute_type"]
+
+    # 2. Threads for a single transcription
+    best_threads = best
+    for cpu_threads in threads:
+        if cpu_threads == cpu_count:
+            continue
+        result = run(compute_type=compute_type, cpu_threads=cpu_threads, beam_size=5)
+        if fits(result) and result["rtf"] < best_threads["rtf"]:
+            best_threads = result
+    cpu_threads = best_threads["cpu_threads"]
+
+    # 3. Replicas for concurrent jobs: split the cores between them
+    best_pool = best_threads
+    for count in workers:
+        if count == 1:
+            continue
+        result = run(compute_type=compute_type, cpu_threads=max(1, cpu_count // count),
+                     num_workers=count, beam_size=5, concurrency=count)
+        if fits(result) and result["rtf"] < best_pool["rtf"]:
+            best_pool = result
+
+    # 4. Smallest beam that keeps the transcript within max_wer of the reference
+    beam_size = 5
+    for beam in sorted(beam_sizes):
+        if beam >= 5:
+            break
+        result = run(compute_type=compute_type, cpu_threads=cpu_threads, beam_size=beam)
+        result["wer_vs_reference"] = round(word_error_rate(reference["text"], result["text"]), 4)
+        if result["wer_vs_reference"] <= max_wer and result["rtf"] < best_threads["rtf"]:
+            beam_size = beam
+            break
+
+    unload_models()
+    for result in measurements:
+        result.pop("text", None)
+    return {
+        "version": PROFILE_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "hardware": hardware_fingerprint(),
+        "model_size": model_size,
+        "device": device,
+        "settings": {
+            "compute_type": compute_type,
+            "cpu_threads": cpu_threads,
+            "num_workers": 1,
+            "beam_size": beam_size,
+        },
+        "pool": {
+            "workers": best_pool["num_workers"],
+            "threads_per_worker": best_pool["cpu_threads"],
+            "rtf": best_pool["rtf"],
+        },
+        "limits": {"max_wer": max_wer, "max_memory_mb": max_memory_mb},
+        "measurements": measurements,
+    }
+
+def write_profile(profile, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(temp_path, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Calibrate faster-whisper settings for this machine and write a tuned profile.')
+    parser.add_argument('--audio', default=DEFAULT_AUDIO, help='Calibration audio (default: bundled demo clip).')
+    parser.add_argument('--seconds', type=float, default=30, help='Seconds of audio to use (0 = whole file).')
+    parser.add_argument('--model-size', default=os.environ.get("WHISPER_MODEL_SIZE", "base"))
+    parser.add_argument('--device', default=os.environ.get("WHISPER_DEVICE_TYPE", "cpu"))
+    parser.add_argument('--compute-types', nargs='+', help='Compute types to try (default: all supported, most precise first).')
+    parser.add_argument('--threads', nargs='+', type=int, help='cpu_threads values to try.')
+    parser.add_argument('--workers', nargs='+', type=int, help='Replica counts to try for concurrent jobs.')
+    parser.add_argument('--beam-sizes', nargs='+', type=int, default=[5, 3, 2, 1])
+    parser.add_argument('--max-wer', type=float, default=0.05, help='Allowed WER against the most precise beam-5 transcript.')
+    parser.add_argument('--max-memory-mb', type=float, help='Reject settings whose model + decode memory exceeds this.')
+    parser.add_argument('--output', default=PROFILE_PATH, help='Profile path (default: WHISPER_PROFILE or ~/.cache/sonicseeker/whisper_profile.json).')
+    parser.add_argument('--dry-run', action='store_true', help='Print the profile without writing it.')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.audio):
+        print(f"ERROR: Calibration audio not found: {args.audio}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        audio = load_calibration_audio(args.audio, args.seconds)
+        logging.info(f"Calibrating on {len(audio) / SAMPLE_RATE:.1f}s of {args.audio}")
+        profile = autotune(audio, args.model_size, args.device, args.compute_types, args.threads, args.workers,
+                           args.beam_sizes, args.max_wer, args.max_memory_mb)
+        profile["calibration"] = {"audio": os.path.basename(args.audio), "seconds": round(len(audio) / SAMPLE_RATE, 1)}
+    except ImportError as e:
+        print(f"ERROR: {e}. Install faster-whisper to run the autotuner.", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"ERROR: Autotuning failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not args.dry_run:
+        write_profile(profile, args.output)
+        logging.info(f"Profile written to {args.output}")
+    print(json.dumps({k: profile[k] for k in ("model_size", "device", "settings", "pool")}, indent=2))
@@ -0,0 +1,411 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+# Transcript comparison (WER / CER / alignment) for /api/compare-transcripts.
+#
+# Words are mapped to integer ids. The exact edit distance is computed first with
+# the bit-parallel algorithm of Myers/Hyyrö, using Python integers as bit vectors
+# (one pass over the hypothesis, a few big-int operations per token). That
+# distance bounds how far the optimal path can leave the diagonal, so the
+# alignment itself is then recovered with a banded DP whose band is exactly wide
+# enough: each row is computed with a handful of NumPy operations (the in-row
+# insertion chain is a cumulative minimum) and only 1-byte backpointers inside
+# the band are kept. Very long, very different inputs are split Hirschberg-style
+# before the band would exceed MAX_BAND_CELLS.
+#
+# CER is computed on characters between the aligned (matching) words, which keeps
+# hour-long transcripts to many small problems instead of one huge one.
+
+MATCH, SUBSTITUTION, DELETION, INSERTION = 0, 1, 2, 3
+MAX_BAND_CELLS = 64 * 1024 * 1024 # Backpointer budget (bytes) for one banded alignment
+_INF = 1 << 29
+
+_PUNCTUATION = re.compile(r"[^\w\s']|(?<!\w)'|'(?!\w)", re.UNICODE)
+
+
+# --- Input handling ---
+
+def extract_segments(content):
+    """
+    Returns a list of (text, start_seconds, end_seconds) from transcript JSON in any
+    of the layouts the app produces, or a single untimed segment for plain text.
+    """
+    try:
+        data = json.loads(content)
+    except (json.JSONDecodeError, ValueError):
+        return [(content, None, None)]
+
+    if isinstance(data, dict):
+        for key in ("transcription", "segments"):
+            if isinstance(data.get(key), list):
+                data = data[key]
+                break
+        else:
+            if isinstance(data.get("text"), str):
+                return [(data["text"], None, None)]
+            return [(content, None, None)]
+    if isinstance(data, list) and all(isinstance(s, dict) and isinstance(s.get("text"), str) for s in data):
+        return [(s["text"], s.get("start_seconds"), s.get("end_seconds")) for s in data]
+    if isinstance(data, str):
+        return [(data, None, None)]
+    return [(content, None, None)]
+
+def normalize_words(text, normalize=True):
+    """Lowercases and strips punctuation (keeping in-word apostrophes) before splitting."""
+    if normalize:
+        text = _PUNCTUATION.sub(" ", text.lower())
+    return text.split()
+
+def tokenize(segments, vocabulary, normalize=True):
+    """Maps segment words to int ids; returns (ids, segment index per word, words)."""
+    words = []
+    owners = []
+    for index, (text, _, _) in enumerate(segments):
+        segment_words = normalize_words(text, normalize)
+        words.extend(segment_words)
+        owners.extend([index] * len(segment_words))
+    ids = np.fromiter((vocabulary.setdefault(w, len(vocabulary)) for w in words), dtype=np.int64, count=len(words))
+    return ids, np.asarray(owners, dtype=np.int64), words
+
+
+# --- Edit distance ---
+
+def bit_parallel_distance(reference, hypothesis):
+    """Exact Levenshtein distance between two token sequences (Myers/Hyyrö bit-vector)."""
+    m = len(reference)
+    if m == 0:
+        return len(hypothesis)
+    if len(hypothesis) == 0:
+        return m
+
+    peq = {}
+    for position, token in enumerate(reference):
+        peq[token] = peq.get(token, 0) | (1 << position)
+
+    mask = (1 << m) - 1
+    high_bit = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for token in hypothesis:
+        eq = peq.get(token, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high_bit:
+            score += 1
+        elif mh & high_bit:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+def _band_costs(reference, hypothesis, below, above, back=None):
+    """
+    Runs the DP over the diagonal band -below <= j - i <= above and returns the last
+    row in band coordinates (column k holds j = len(reference) + k - below).
+    When `back` is given, per-cell moves are written into it.
+    """
+    m = len(hypothesis)
+    width = below + above + 1
+    ks = np.arange(width, dtype=np.int64)
+    offsets = ks - below # j - i for each band column
+
+    # Row 0: D[0][j] = j (insertions)
+    j = offsets
+    prev = np.where((j >= 0) & (j <= m), j, _INF).astype(np.int64)
+    if back is not None:
+        back[0] = INSERTION
+
+    padded = np.concatenate([hypothesis, [-1]]) if m else np.array([-1], dtype=np.int64)
+    for i in range(1, len(reference) + 1):
+        j = i + offsets
+        valid = (j >= 0) & (j <= m)
+        cost = (padded[np.clip(j - 1, -1, m)] != reference[i - 1]).astype(np.int64)
+
+        diag = prev + cost # D[i-1][j-1] -> same band column
+        diag[j < 1] = _INF
+        up = np.empty(width, dtype=np.int64) # D[i-1][j] -> band column k+1
+        up[:-1] = prev[1:] + 1
+        up[-1] = _INF
+        best = np.minimum(diag, up)
+        best[~valid] = _INF
+        # Insertions chain left to right: D[i][j] = min_k best[k] + (j - k)
+        current = np.minimum.accumulate(best - ks) + ks
+        current[~valid] = _INF
+
+        if back is not None:
+            moves = np.full(width, INSERTION, dtype=np.uint8)
+            moves[current == up] = DELETION
+            on_diag = current == diag
+            moves[on_diag] = np.where(cost[on_diag] == 0, MATCH, SUBSTITUTION)
+            back[i] = moves
+        prev = current
+    return prev
+
+def _band_limits(n, m, distance):
+    """Band that any alignment of cost <= distance must stay in."""
+    delta = m - n
+    return (distance - delta) // 2, (distance + delta) // 2 # max deletions, max insertions
+
+def _banded_alignment(reference, hypothesis, distance):
+    """Backtraced alignment restricted to the diagonal band implied by `distance`."""
+    n, m = len(reference), len(hypothesis)
+    below, above = _band_limits(n, m, distance)
+    offsets = np.arange(below + above + 1, dtype=np.int64) - below
+    back = np.empty((n + 1, below + above + 1), dtype=np.uint8)
+    _band_costs(reference, hypothesis, below, above, back)
+
+    # Walk back from (n, m)
+    ops = []
+    i, k = n, m - n + below
+    while i > 0 or i + offsets[k] > 0:
+        move = back[i, k]
+        ops.append(int(move))
+        if move == INSERTION:
+            k -= 1
+        elif move == DELETION:
+            i -= 1
+            k += 1
+        else:
+            i -= 1
+    ops.reverse()
+    return ops
+
+def align(reference, hypothesis, distance=None):
+    """Returns the list of alignment ops turning `reference` into `hypothesis`."""
+    n, m = len(reference), len(hypothesis)
+    if n == 0:
+        return [INSERTION] * m
+    if m == 0:
+        return [DELETION] * n
+    if distance is None:
+        distance = bit_parallel_distance(reference.tolist(), hypothesis.tolist())
+    if (n + 1) * (distance + 1) <= MAX_BAND_CELLS or n < 2:
+        return _banded_alignment(reference, hypothesis, distance)
+
+    # Hirschberg split at the middle reference row; both halves stay inside the band
+    middle = n // 2
+    below, above = _band_limits(n, m, distance)
+    delta = m - n
+    forward = _band_costs(reference[:middle], hypothesis, below, above)
+    backward = _band_costs(reference[middle:][::-1], hypothesis[::-1], above - delta, below + delta)
+
+    totals = np.full(m + 1, _INF, dtype=np.int64)
+    forward_at = np.full(m + 1, _INF, dtype=np.int64)
+    backward_at = np.full(m + 1, _INF, dtype=np.int64)
+    j = middle + np.arange(len(forward)) - below
+    keep = (j >= 0) & (j <= m)
+    forward_at[j[keep]] = forward[keep]
+    j_rev = m - ((n - middle) + np.arange(len(backward)) - (above - delta))
+    keep = (j_rev >= 0) & (j_rev <= m)
+    backward_at[j_rev[keep]] = backward[keep]
+    totals = np.minimum(forward_at + backward_at, _INF)
+    cut = int(np.argmin(totals))
+    return (align(reference[:middle], hypothesis[:cut], int(forward_at[cut]))
+            + align(reference[middle:], hypothesis[cut:], int(backward_at[cut])))
+
+
+# --- Metrics ---
+
+def _char_distance(ref_text, hyp_text):
+    if not ref_text or not hyp_text:
+        return len(ref_text) + len(hyp_text)
+    return bit_parallel_distance(ref_text, hyp_text)
+
+def character_errors(ops, ref_words, hyp_words):
+    """Character edits between matched word anchors (exact inside each gap)."""
+    errors = 0
+    i = j = 0
+    gap_ref, gap_hyp = [], []
+    matched = False
+
+    def flush(before_match):
+        nonlocal errors
+        if gap_ref or gap_hyp:
+            ref_text, hyp_text = " ".join(gap_ref), " ".join(gap_hyp)
+            errors += _char_distance(ref_text, hyp_text)
+            # A gap that vanished on one side also loses the space separating it from a matched word
+            if bool(ref_text) != bool(hyp_text) and (matched or before_match):
+                errors += 1
+            gap_ref.clear()
+            gap_hyp.clear()
+
+    for op in ops:
+        if op == MATCH:
+            flush(True)
+            matched = True
+            i += 1
+            j += 1
+        elif op == SUBSTITUTION:
+            gap_ref.append(ref_words[i])
+            gap_hyp.append(hyp_words[j])
+            i += 1
+            j += 1
+        elif op == DELETION:
+            gap_ref.append(ref_words[i])
+            i += 1
+        else:
+            gap_hyp.append(hyp_words[j])
+            j += 1
+    flush(False)
+    return errors
+
+def summarize(ops, reference_length, hypothesis_length):
+    counts = np.bincount(np.asarray(ops, dtype=np.int64), minlength=4) if ops else np.zeros(4, dtype=np.int64)
+    hits, substitutions, deletions, insertions = (int(c) for c in counts)
+    errors = substitutions + deletions + insertions
+    wip = (hits / reference_length) * (hits / hypothesis_length) if reference_length and hypothesis_length else 0.0
+    return {
+        "wer": errors / reference_length if reference_length else float(hypothesis_length > 0),
+        "mer": errors / (hits + errors) if hits + errors else 0.0,
+        "wil": 1.0 - wip,
+        "wip": wip,
+        "hits": hits,
+        "substitutions": substitutions,
+        "deletions": deletions,
+        "insertions": insertions,
+        "reference_length_words": reference_length,
+        "hypothesis_length_words": hypothesis_length,
+    }
+
+def segment_alignment(ops, ref_segments, ref_owners, ref_words, hyp_words):
+    """Per reference segment: error counts, WER and the hypothesis words aligned to it."""
+    rows = [{"ref": [], "hyp": [], "counts": [0, 0, 0, 0]} for _ in ref_segments]
+    i = j = 0
+    current = 0
+    for op in ops:
+        if op != INSERTION and i < len(ref_owners):
+            current = int(ref_owners[i])
+        row = rows[current] if rows else None
+        if row is None:
+            break
+        row["counts"][op] += 1
+        if op in (MATCH, SUBSTITUTION):
+            row["ref"].append(ref_words[i])
+            row["hyp"].append(hyp_words[j])
+            i += 1
+            j += 1
+        elif op == DELETION:
+            row["ref"].append(ref_words[i])
+            i += 1
+        else:
+            row["hyp"].append(hyp_words[j])
+            j += 1
+
+    result = []
+    for index, ((_, start, end), row) in enumerate(zip(ref_segments, rows)):
+        hits, substitutions, deletions, insertions = row["counts"]
+        reference_length = hits + substitutions + deletions
+        errors = substitutions + deletions + insertions
+        result.append({
+            "index": index,
+            "start_seconds": start,
+            "end_seconds": end,
+            "reference": " ".join(row["ref"]),
+            "hypothesis": " ".join(row["hyp"]),
+            "hits": hits,
+            "substitutions": substitutions,
+            "deletions": deletions,
+            "insertions": insertions,
+            "wer": errors / reference_length if reference_length else float(insertions > 0),
+        })
+    return result
+
+def compare(reference_content, hypothesis_content, mode="metrics", normalize=True):
+    """Compares two transcripts (JSON or plain text) and returns the metrics dict."""
+    ref_segments = extract_segments(reference_content)
+    hyp_segments = extract_segments(hypothesis_content)
+
+    vocabulary = {}
+    ref_ids, ref_owners, ref_words = tokenize(ref_segments, vocabulary, normalize)
+    hyp_ids, _, hyp_words = tokenize(hyp_segments, vocabulary, normalize)
+
+    distance = bit_parallel_distance(ref_ids.tolist(), hyp_ids.tolist())
+    ops = align(ref_ids, hyp_ids, distance)
+
+    result = summarize(ops, len(ref_ids), len(hyp_ids))
+    reference_chars = len(" ".join(ref_words))
+    char_errors = character_errors(ops, ref_words, hyp_words)
+    result["cer"] = char_errors / reference_chars if reference_chars else float(char_errors > 0)
+    result["reference_length_chars"] = reference_chars
+    result["character_errors"] = char_errors
+    # Per-segment alignment only makes sense when the reference has real segments
+    if mode == "metrics" and len(ref_segments) > 1:
+        result["segments"] = segment_alignment(ops, ref_segments, ref_owners, ref_words, hyp_words)
+    return result
+
+
+# --- Benchmark ---
+
+def run_benchmark(word_counts, error_rate=0.15, seed=0):
+    """Times comparisons of synthetic transcripts of the given lengths."""
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    for count in word_counts:
+        reference = [rng.choice(vocabulary) for _ in range(count)]
+        hypothesis = []
+        for word in reference:
+            roll = rng.random()
+            if roll < error_rate / 3:
+                hypothesis.append(rng.choice(vocabulary)) # substitution
+            elif roll < 2 * error_rate / 3:
+                continue # deletion
+            elif roll < error_rate:
+                hypothesis.extend([word, rng.choice(vocabulary)]) # insertion
+            else:
+                hypothesis.append(word)
+        # ~150 words per minute of speech
+        ref_json = json.dumps([{"text": " ".join(reference[k:k + 20])} for k in range(0, count, 20)])
+        started = time.perf_counter()
+        result = compare(ref_json, " ".join(hypothesis))
+        elapsed = time.perf_counter() - started
+        print(f"{count:>7} words (~{count / 150:.0f} min): {elapsed:6.2f}s  "
+              f"WER={result['wer']:.3f} CER={result['cer']:.3f} "
+              f"S={result['substitutions']} D={result['deletions']} I={result['insertions']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare a reference and hypothesis transcript (WER/CER/alignment).')
+    parser.add_argument('--file1', help='Reference transcript (JSON or plain text).')
+    parser.add_argument('--file2', help='Hypothesis transcript (JSON or plain text).')
+    parser.add_argument('--output-json', help='Path to save the metrics JSON.')
+    parser.add_argument('--mode', choices=['metrics', 'wer'], default='metrics', help="'metrics' adds per-segment alignment.")
+    parser.add_argument('--no-normalize', action='store_true', help='Compare words as-is (no lowercasing/punctuation removal).')
+    parser.add_argument('--benchmark', type=int, nargs='*', help='Run a benchmark on synthetic transcripts of these word counts.')
+    args = parser.parse_args()
+
+    if args.benchmark is not None:
+        run_benchmark(args.benchmark or [1000, 10000, 30000])
+        sys.exit(0)
+
+    if not (args.file1 and args.file2 and args.output_json):
+        parser.error("--file1, --file2 and --output-json are required")
+
+    try:
+        for path in (args.file1, args.file2):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"File not found: {path}")
+        with open(args.file1, 'r', encoding='utf-8') as f:
+            reference_content = f.read()
+        with open(args.file2, 'r', encoding='utf-8') as f:
+            hypothesis_content = f.read()
+        started = time.perf_counter()
+        result = compare(reference_content, hypothesis_content, mode=args.mode, normalize=not args.no_normalize)
+        print(f"Comparison finished in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    except Exception as e:
+        print(f"Error comparing transcripts: {e}", file=sys.stderr)
+        result = {"error": str(e)}
+
+    with open(args.output_json, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False)
+    if "error" in result:
+        sys.exit(1)
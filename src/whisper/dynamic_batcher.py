@@ -0,0 +1,336 @@
+import argparse
+import collections
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Cross-request dynamic batching for Whisper.
+#
+# model.transcribe() decodes one file at a time, so concurrent short clips
+# (mic recordings, short uploads) each run a batch of one. The batcher sits in
+# front of the faster-whisper model instead:
+#
+#   - every job's audio is cut into <= 30 s windows (speech regions from the
+#     Silero VAD, merged up to 30 s, like faster-whisper's BatchedInferencePipeline;
+#     fixed 30 s windows if the VAD is unavailable)
+#   - a single batching thread collects windows from all in-flight jobs until
+#     WHISPER_BATCH_SIZE windows are waiting or the oldest has waited
+#     WHISPER_BATCH_WAIT_MS, then encodes and decodes them in one batched
+#     CTranslate2 call
+#   - the segments of each window are routed back to their job's future
+#
+# Batched windows are decoded independently (no previous-text conditioning)
+# and without word timestamps; words can be added on demand (word_alignment.py).
+#
+# metrics() reports batch sizes, queue wait (latency added by batching) and
+# throughput in audio seconds per second.
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+MAX_BATCH = int(os.environ.get("WHISPER_BATCH_SIZE", 8))
+MAX_WAIT_MS = float(os.environ.get("WHISPER_BATCH_WAIT_MS", 50))
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+MAX_LENGTH = 448 # Whisper's decoder context
+
+
+# --- Windows ---
+
+def speech_windows(audio, max_seconds=WINDOW_SECONDS):
+    """[(start, end)] sample ranges of at most max_seconds covering the speech in `audio`."""
+    max_samples = int(max_seconds * SAMPLE_RATE)
+    try:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+        regions = get_speech_timestamps(audio, VadOptions(max_speech_duration_s=max_seconds))
+    except Exception as e:
+        logging.debug(f"VAD unavailable, using fixed windows: {e}")
+        return [(start, min(start + max_samples, len(audio))) for start in range(0, len(audio), max_samples)]
+    windows = []
+    for region in regions:
+        if windows and region["end"] - windows[-1][0] <= max_samples:
+            windows[-1] = (windows[-1][0], region["end"])
+        else:
+            windows.append((region["start"], region["end"]))
+    return windows
+
+def split_by_timestamps(tokenizer, tokens, offset, duration):
+    """Cuts a decoded token sequence at its timestamp tokens into raw segments."""
+    segments = []
+    text_tokens = []
+    start = None
+    last_time = 0.0
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            last_time = (token - tokenizer.timestamp_begin) * 0.02
+            if start is not None and text_tokens:
+                segments.append((start, last_time, text_tokens))
+                text_tokens, start = [], None
+            else:
+                start = last_time
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens:
+        # Unterminated tail (decoding hit the window end): it runs to the end of the window
+        segments.append((last_time if start is None else start, duration, text_tokens))
+    result = []
+    for start, end, text_tokens in segments:
+        text = tokenizer.decode(text_tokens).strip()
+        if text:
+            result.append({"start": round(offset + min(start, duration), 3), "end": round(offset + min(end, duration), 3),
+                           "text": text, "words": []})
+    return result
+
+
+# --- Batcher ---
+
+class _Window:
+    def __init__(self, audio, offset, language):
+        self.audio = audio
+        self.offset = offset
+        self.language = language
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class DynamicBatcher:
+    """Batches 30 s windows from concurrent jobs into single encoder/decoder calls."""
+
+    def __init__(self, model=None, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, beam_size=None):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.beam_size = beam_size
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._tokenizers = {}
+        self._batch_sizes = collections.deque(maxlen=1000)
+        self._waits = collections.deque(maxlen=1000)
+        self._audio_seconds = 0.0
+        self._busy_seconds = 0.0
+        self._started = None
+
+    def start(self):
+        from model_loader import load_whisper_model, whisper_beam_size
+        self.model = self.model or load_whisper_model()
+        self.beam_size = self.beam_size or whisper_beam_size()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._loop, name="whisper-batcher", daemon=True)
+        self._thread.start()
+        return self
+
+    # --- Submission ---
+
+    def submit(self, audio, language=None):
+        """Queues a job (16 kHz float32 audio); returns a Future of its raw segments."""
+        windows = [_Window(audio[start:end], start / SAMPLE_RATE, language) for start, end in speech_windows(audio)]
+        job = Future()
+        if not windows:
+            job.set_result([])
+            return job
+        remaining = [len(windows)]
+        lock = threading.Lock()
+
+        def window_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            errors = [w.future.exception() for w in windows if w.future.exception() is not None]
+            if errors:
+                job.set_exception(errors[0])
+            else:
+                job.set_result([segment for w in windows for segment in w.future.result()])
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("batcher is closed")
+            self._queue.extend(windows)
+            self._condition.notify()
+        for window in windows:
+            window.future.add_done_callback(window_done)
+        return job
+
+    def transcribe(self, input_path, language=None):
+        from faster_whisper import decode_audio
+        return self.submit(decode_audio(input_path, sampling_rate=SAMPLE_RATE), language).result()
+
+    # --- Batching loop ---
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return None
+            # Wait for more windows until the batch is full or the oldest window's budget is spent
+            deadline = self._queue[0].enqueued + self.max_wait
+            while len(self._queue) < self.max_batch and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            for window in batch:
+                self._waits.append(started - window.enqueued)
+            try:
+                results = self._run_batch(batch)
+            except Exception as e:
+                logging.error(f"Batched decoding of {len(batch)} windows failed: {e}")
+                for window in batch:
+                    window.future.set_exception(e)
+                continue
+            self._busy_seconds += time.perf_counter() - started
+            self._batch_sizes.append(len(batch))
+            self._audio_seconds += sum(len(w.audio) for w in batch) / SAMPLE_RATE
+            for window, segments in zip(batch, results):
+                window.future.set_result(segments)
+
+    def _tokenizer(self, language):
+        from faster_whisper.tokenizer import Tokenizer
+        if language not in self._tokenizers:
+            self._tokenizers[language] = Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual,
+                                                   task="transcribe", language=language)
+        return self._tokenizers[language]
+
+    def _features(self, audio):
+        extractor = self.model.feature_extractor
+        features = extractor(audio)[:, :extractor.nb_max_frames]
+        return np.pad(features, ((0, 0), (0, extractor.nb_max_frames - features.shape[-1])))
+
+    def _run_batch(self, batch):
+        encoder_output = self.model.encode(np.stack([self._features(w.audio) for w in batch]))
+        languages = [w.language for w in batch]
+        if self.model.model.is_multilingual and None in languages:
+            detected = self.model.model.detect_language(encoder_output)
+            languages = [language or detected[i][0][0][2:-2] for i, language in enumerate(languages)]
+        languages = [language or "en" for language in languages]
+        tokenizers = [self._tokenizer(language) for language in languages]
+        results = self.model.model.generate(
+            encoder_output, [tokenizer.sot_sequence for tokenizer in tokenizers],
+            beam_size=self.beam_size, max_length=MAX_LENGTH, return_scores=True,
+            return_no_speech_prob=True, suppress_blank=True, suppress_tokens=[-1])
+        outputs = []
+        for window, tokenizer, result in zip(batch, tokenizers, results):
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.scores[0] < LOGPROB_THRESHOLD:
+                outputs.append([])
+                continue
+            outputs.append(split_by_timestamps(tokenizer, result.sequences_ids[0], window.offset,
+                                               len(window.audio) / SAMPLE_RATE))
+        return outputs
+
+    # --- Metrics ---
+
+    def metrics(self):
+        waits = np.asarray(self._waits) * 1000 if self._waits else np.zeros(1)
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": len(self._batch_sizes),
+            "mean_batch_size": round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else 0.0,
+            "queue_wait_ms_mean": round(float(waits.mean()), 1),
+            "queue_wait_ms_p95": round(float(np.percentile(waits, 95)), 1),
+            "audio_seconds": round(self._audio_seconds, 1),
+            "busy_seconds": round(self._busy_seconds, 3),
+            "throughput_audio_x": round(self._audio_seconds / self._busy_seconds, 2) if self._busy_seconds else 0.0,
+            "utilisation": round(self._busy_seconds / elapsed, 3) if elapsed else 0.0,
+        }
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def transcribe_file_batched(batcher, input_path, output_json_file):
+    """transcribe.transcribe_file for the batched path (no diarization): writes the transcript JSON."""
+    from faster_whisper import decode_audio
+    from language_id import identify_media_language, language_of
+    from transcript_output import write_transcript
+    started = time.perf_counter()
+    audio = decode_audio(input_path, sampling_rate=SAMPLE_RATE)
+    # One language for the whole file instead of a detection per window
+    language_id = identify_media_language(audio, batcher.model)
+    segments = batcher.submit(audio, language_of(language_id)).result()
+    extra = {"language_id": language_id} if language_id else {}
+    write_transcript(output_json_file, segments, source="whisper", language=language_of(language_id), metrics=[],
+                     batching={"seconds": round(time.perf_counter() - started, 3)}, **extra)
+    return True
+
+
+# --- Benchmark ---
+
+def run_benchmark(inputs, concurrency, max_batch, max_wait_ms):
+    """Transcribes `inputs` one after another with model.transcribe, then concurrently through the batcher."""
+    from faster_whisper import decode_audio
+    from model_loader import load_whisper_model, whisper_beam_size
+
+    model = load_whisper_model()
+    beam_size = whisper_beam_size()
+    audios = [decode_audio(path, sampling_rate=SAMPLE_RATE) for path in inputs]
+    audio_seconds = sum(len(a) for a in audios) / SAMPLE_RATE
+
+    started = time.perf_counter()
+    for audio in audios:
+        segments, _ = model.transcribe(audio, beam_size=beam_size)
+        list(segments)
+    sequential = time.perf_counter() - started
+
+    batcher = DynamicBatcher(model, max_batch, max_wait_ms, beam_size).start()
+    latencies = []
+
+    def job(audio):
+        job_started = time.perf_counter()
+        batcher.submit(audio).result()
+        latencies.append(time.perf_counter() - job_started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(job, audios))
+    batched = time.perf_counter() - started
+    batcher.close()
+    return {
+        "files": len(inputs),
+        "audio_seconds": round(audio_seconds, 1),
+        "concurrency": concurrency,
+        "sequential_seconds": round(sequential, 3),
+        "batched_seconds": round(batched, 3),
+        "speedup": round(sequential / batched, 2) if batched else None,
+        "job_latency_s_mean": round(float(np.mean(latencies)), 3),
+        "job_latency_s_max": round(float(np.max(latencies)), 3),
+        "batcher": batcher.metrics(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark cross-request dynamic batching of Whisper windows.')
+    parser.add_argument('--inputs', nargs='+', required=True, help='Media files transcribed as concurrent jobs.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Jobs in flight at once.')
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH)
+    parser.add_argument('--wait-ms', type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    missing = [path for path in args.inputs if not os.path.exists(path)]
+    if missing:
+        print(f"ERROR: Input file not found: {missing[0]}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(run_benchmark(args.inputs, args.concurrency, args.batch_size, args.wait_ms), indent=2))
@@ -0,0 +1,348 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Local job scheduler for the Python entry points.
+#
+# Instead of every API request starting its own transcribe.py / translate.py
+# process that grabs every core, requests are submitted to one scheduler:
+#
+#   - a priority queue: "interactive" jobs (uploads, mic clips) before "backfill"
+#   - at most `max_jobs` jobs run at once; the machine's threads are split
+#     between them (OMP_NUM_THREADS / WHISPER_CPU_THREADS / JOB_CPU_THREADS,
+#     which the scripts apply via model_loader.apply_thread_budget)
+#   - admission control: submissions beyond `max_queue` waiting jobs are rejected
+#   - clients get queue-position updates while waiting and can cancel; a client
+#     that disconnects cancels its job
+#   - a job is forgotten once its final event has been delivered (its output
+#     lives only in that event), so a long-running scheduler does not grow
+#
+# Only the scripts in ALLOWED_SCRIPTS (next to this file) can be run.
+#
+# Protocol (JSON lines over a local TCP socket):
+#   -> {"op": "submit", "script": "transcribe.py", "args": [...], "priority": "interactive", "profile": false}
+#   <- {"event": "queued", "job_id": 3, "position": 1}
+#   <- {"event": "started", "job_id": 3, "threads": 4, "queued_seconds": 1.2}
+#   <- {"event": "finished", "job_id": 3, "returncode": 0, "stdout": "...", "stderr": "..."}
+#   -> {"op": "cancel", "job_id": 3}      -> {"op": "status"}
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ALLOWED_SCRIPTS = ("transcribe.py", "transcribe_api.py", "translate.py", "youtubeapi.py", "compare_transcripts.py")
+PROFILED_SCRIPTS = ("transcribe.py", "transcribe_api.py", "translate.py") # Scripts accepting --profile (profiling.py)
+PRIORITIES = {"interactive": 0, "backfill": 1}
+DEFAULT_PORT = 8766
+
+
+class QueueFull(Exception):
+    """Raised when a submission is rejected by admission control."""
+
+
+class Job:
+    def __init__(self, job_id, script, args, priority):
+        self.id = job_id
+        self.script = script
+        self.args = list(args)
+        self.priority = priority
+        self.submitted = time.monotonic()
+        self.started = None
+        self.state = "queued"    # queued -> running -> finished | cancelled
+        self.threads = None
+        self.process = None
+        self.result = None
+        self.listeners = []      # async callables receiving event dicts
+        self.done = asyncio.Event()
+
+    async def emit(self, event):
+        event = dict(event, job_id=self.id)
+        for listener in list(self.listeners):
+            try:
+                await listener(event)
+            except Exception as e:
+                logging.warning(f"Dropping listener for job {self.id}: {e}")
+                self.listeners.remove(listener)
+
+
+class JobScheduler:
+    """Priority queue + concurrency cap + per-job CPU thread split."""
+
+    def __init__(self, max_jobs=2, max_queue=32, total_threads=None):
+        self.max_jobs = max(1, max_jobs)
+        self.max_queue = max_queue
+        self.total_threads = total_threads or os.cpu_count() or 1
+        self.queue = []          # heap of (priority, sequence, job)
+        self.running = {}
+        self.jobs = {}
+        self._tasks = set()      # running _run tasks, referenced until done
+        self._ids = itertools.count(1)
+        self._sequence = itertools.count()
+
+    @property
+    def threads_per_job(self):
+        return max(1, self.total_threads // self.max_jobs)
+
+    def _waiting(self):
+        return [job for _, _, job in sorted(self.queue) if job.state == "queued"]
+
+    def position(self, job):
+        """1-based position among waiting jobs, or 0 when not waiting."""
+        waiting = self._waiting()
+        return waiting.index(job) + 1 if job in waiting else 0
+
+    async def submit(self, script, args=(), priority="interactive", listener=None, profile=False):
+        if script not in ALLOWED_SCRIPTS:
+            raise ValueError(f"Script not allowed: {script}")
+        if profile:
+            if script not in PROFILED_SCRIPTS:
+                raise ValueError(f"Profiling not supported for: {script}")
+            args = list(args) + ([] if "--profile" in args else ["--profile"])
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if len(self._waiting()) >= self.max_queue:
+            raise QueueFull(f"Queue is full ({self.max_queue} jobs waiting)")
+
+        job = Job(next(self._ids), script, args, priority)
+        if listener is not None:
+            job.listeners.append(listener)
+        self.jobs[job.id] = job
+        heapq.heappush(self.queue, (PRIORITIES[priority], next(self._sequence), job))
+        await job.emit({"event": "queued", "position": self.position(job)})
+        await self._dispatch()
+        return job
+
+    async def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.state in ("finished", "cancelled"):
+            return False
+        if job.state == "queued":
+            job.state = "cancelled"
+            self.queue = [entry for entry in self.queue if entry[2] is not job]
+            heapq.heapify(self.queue)
+            job.done.set()
+            await job.emit({"event": "cancelled"})
+            self._forget(job)
+            await self._report_positions()
+        else:
+            # Also before the process exists: _run sees the state once it has spawned it
+            job.state = "cancelled"
+            if job.process is not None and job.process.returncode is None:
+                job.process.terminate()
+        return True
+
+    async def shutdown(self):
+        """Cancels every queued and running job and waits for the running ones to finish."""
+        for job_id in list(self.jobs):
+            await self.cancel(job_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _forget(self, job):
+        """Drops a finished or cancelled job after its final event (output included) went out."""
+        self.jobs.pop(job.id, None)
+        job.result = None
+        job.listeners.clear()
+
+    def status(self):
+        return {
+            "max_jobs": self.max_jobs,
+            "threads_per_job": self.threads_per_job,
+            "running": [{"job_id": j.id, "script": j.script, "priority": j.priority, "threads": j.threads} for j in self.running.values()],
+            "waiting": [{"job_id": j.id, "script": j.script, "priority": j.priority, "position": i + 1} for i, j in enumerate(self._waiting())],
+        }
+
+    async def _report_positions(self):
+        for index, job in enumerate(self._waiting()):
+            await job.emit({"event": "queued", "position": index + 1})
+
+    async def _dispatch(self):
+        started_any = False
+        while self.queue and len(self.running) < self.max_jobs:
+            _, _, job = heapq.heappop(self.queue)
+            if job.state != "queued":
+                continue
+            self.running[job.id] = job
+            job.state = "running"
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            started_any = True
+        if started_any:
+            await self._report_positions()
+
+    def _environment(self, threads):
+        env = dict(os.environ)
+        for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "WHISPER_CPU_THREADS", "JOB_CPU_THREADS"):
+            env[name] = str(threads)
+        return env
+
+    async def _run(self, job):
+        job.started = time.monotonic()
+        job.threads = self.threads_per_job
+        await job.emit({"event": "started", "threads": job.threads,
+                        "queued_seconds": round(job.started - job.submitted, 3)})
+        try:
+            job.process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.join(SCRIPT_DIR, job.script), *job.args,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                env=self._environment(job.threads), cwd=os.getcwd(),
+            )
+            if job.state == "cancelled": # Cancelled while the process was starting
+                job.process.terminate()
+            stdout, stderr = await job.process.communicate()
+            job.result = {
+                "returncode": job.process.returncode,
+                "stdout": stdout.decode("utf-8", errors="replace"),
+                "stderr": stderr.decode("utf-8", errors="replace"),
+                "run_seconds": round(time.monotonic() - job.started, 3),
+            }
+        except Exception as e:
+            job.result = {"returncode": -1, "stdout": "", "stderr": f"Failed to start job: {e}"}
+        finally:
+            self.running.pop(job.id, None)
+            cancelled = job.state == "cancelled"
+            job.state = "cancelled" if cancelled else "finished"
+            job.done.set()
+            await job.emit(dict(job.result or {}, event="cancelled" if cancelled else "finished"))
+            self._forget(job)
+            await self._dispatch()
+
+
+# --- Socket server ---
+
+async def serve(scheduler, host, port):
+    async def handler(reader, writer):
+        async def send(event):
+            writer.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+
+        owned = []
+        try:
+            async for line in reader:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    await send({"event": "error", "error": "Invalid JSON"})
+                    continue
+                op = request.get("op")
+                if op == "submit":
+                    try:
+                        job = await scheduler.submit(request.get("script"), request.get("args", []),
+                                                     request.get("priority", "interactive"), listener=send,
+                                                     profile=bool(request.get("profile")))
+                        owned = [j for j in owned if not j.done.is_set()] + [job]
+                    except (QueueFull, ValueError) as e:
+                        await send({"event": "rejected", "error": str(e)})
+                elif op == "cancel":
+                    await send({"event": "cancel", "job_id": request.get("job_id"),
+                                "ok": await scheduler.cancel(request.get("job_id"))})
+                elif op == "status":
+                    await send(dict(scheduler.status(), event="status"))
+                else:
+                    await send({"event": "error", "error": f"Unknown op: {op}"})
+            # Client closed its side: wait for its jobs so their results can be sent
+            for job in owned:
+                await job.done.wait()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            # A vanished client no longer wants its jobs
+            for job in owned:
+                if job.state in ("queued", "running"):
+                    logging.info(f"Client gone, cancelling job {job.id}")
+                    await scheduler.cancel(job.id)
+            writer.close()
+
+    server = await asyncio.start_server(handler, host, port)
+    logging.info(f"Job scheduler on {host}:{port} ({scheduler.max_jobs} concurrent jobs, "
+                 f"{scheduler.threads_per_job} threads each, queue limit {scheduler.max_queue})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await scheduler.shutdown()
+
+
+# --- Client ---
+
+async def submit_and_wait(host, port, script, args, priority, profile=False):
+    """Submits one job, relays progress to stderr and the job's stdout to stdout."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps({"op": "submit", "script": script, "args": args, "priority": priority,
+                             "profile": profile}).encode("utf-8") + b"\n")
+    await writer.drain()
+    writer.write_eof()
+    returncode = 1
+    async for line in reader:
+        event = json.loads(line)
+        kind = event.get("event")
+        if kind == "queued":
+            print(f"Queued (position {event['position']})", file=sys.stderr)
+        elif kind == "started":
+            print(f"Started with {event['threads']} threads after {event['queued_seconds']}s in queue", file=sys.stderr)
+        elif kind in ("finished", "cancelled"):
+            sys.stderr.write(event.get("stderr", ""))
+            sys.stdout.write(event.get("stdout", ""))
+            returncode = event.get("returncode", 1) if kind == "finished" else 1
+            break
+        elif kind == "rejected":
+            print(f"ERROR: Job rejected: {event['error']}", file=sys.stderr)
+            returncode = 75 # EX_TEMPFAIL: caller may retry later
+            break
+    writer.close()
+    return returncode
+
+async def query(host, port, request):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(json.dumps(request).encode("utf-8") + b"\n")
+    await writer.drain()
+    line = await reader.readline()
+    writer.close()
+    return json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local job scheduler for transcription/translation scripts.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=int(os.environ.get("JOB_SCHEDULER_PORT", DEFAULT_PORT)))
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help='Run the scheduler.')
+    serve_parser.add_argument('--max-jobs', type=int, default=int(os.environ.get("JOB_MAX_CONCURRENT", 2)), help='Jobs running at once.')
+    serve_parser.add_argument('--max-queue', type=int, default=32, help='Waiting jobs before submissions are rejected.')
+    serve_parser.add_argument('--threads', type=int, help='Total CPU threads to split between running jobs (default: all cores).')
+
+    submit_parser = sub.add_parser('submit', help='Submit a job and wait for it (prints the job stdout).')
+    submit_parser.add_argument('--priority', choices=sorted(PRIORITIES), default='interactive')
+    submit_parser.add_argument('--profile', action='store_true', help='Profile the job (see profiling.py).')
+    submit_parser.add_argument('script', choices=ALLOWED_SCRIPTS)
+    submit_parser.add_argument('script_args', nargs=argparse.REMAINDER, help='Arguments passed to the script.')
+
+    cancel_parser = sub.add_parser('cancel', help='Cancel a queued or running job.')
+    cancel_parser.add_argument('job_id', type=int)
+    sub.add_parser('status', help='Show running and waiting jobs.')
+
+    args = parser.parse_args()
+    try:
+        if args.command == 'serve':
+            scheduler = JobScheduler(max_jobs=args.max_jobs, max_queue=args.max_queue, total_threads=args.threads)
+            asyncio.run(serve(scheduler, args.host, args.port))
+        elif args.command == 'submit':
+            script_args = args.script_args[1:] if args.script_args[:1] == ['--'] else args.script_args
+            sys.exit(asyncio.run(submit_and_wait(args.host, args.port, args.script, script_args, args.priority,
+                                                 args.profile)))
+        elif args.command == 'cancel':
+            print(json.dumps(asyncio.run(query(args.host, args.port, {"op": "cancel", "job_id": args.job_id}))))
+        else:
+            print(json.dumps(asyncio.run(query(args.host, args.port, {"op": "status"})), indent=2))
+    except ConnectionRefusedError:
+        print(f"ERROR: No job scheduler listening on {args.host}:{args.port}", file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,234 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import wave
+from collections import defaultdict
+
+import numpy as np
+
+# One-shot spoken language identification per media file.
+#
+# model.transcribe() detects the language from the first 30 s only, and every
+# pass (preview, checkpoint resume, batched windows, re-decoding, translation)
+# used to decide again or not at all. Instead the language is identified once,
+# up front, from a few speech windows spread over the file:
+#
+#   - up to LANGUAGE_ID_WINDOWS VAD speech windows (<= 30 s) evenly spaced
+#   - one batched encoder pass + the model's language head over all of them
+#   - per-language probabilities averaged, weighted by window speech length
+#
+# For a media path only those windows are decoded: taken from the stage's VAD
+# map when there is one, otherwise from PROBE_SECONDS stretches spread over the
+# file (VAD runs on each stretch only). The parts are read straight from a
+# 16 kHz PCM WAV (windowed_diarization.read_window) or cut with ffmpeg -ss/-t,
+# so a multi-hour file costs a few minutes of audio, not a full decode.
+#
+# The result {"language", "probability", "windows", "method"} is kept as the
+# "language" artifact (transcribe.py), written to the transcript document
+# ("language" + "language_id") and handed to every later stage: forced
+# language for all decoding passes, the NLLB source code for translate.py
+# (nllb_code) and, with WHISPER_ENGLISH_ONLY=1, the English-only model for
+# English audio. WHISPER_LANGUAGE forces a language and skips detection.
+#
+#   python language_id.py --input talk.mp4
+
+SAMPLE_RATE = 16000
+LANGUAGE_ID_WINDOWS = int(os.environ.get("LANGUAGE_ID_WINDOWS", 3))
+MIN_WINDOW_SECONDS = 3.0 # Shorter speech windows are only used when there is nothing longer
+WINDOW_SECONDS = 30.0 # One encoder input
+PROBE_SECONDS = 60.0 # Audio decoded per window of a media path without a VAD map
+ENGLISH_ONLY_MIN_PROBABILITY = 0.8
+ENGLISH_ONLY_SIZES = ("tiny", "base", "small", "medium")
+
+# Whisper (ISO 639-1) codes -> NLLB-200 codes for the languages translate.py offers
+NLLB_CODES = {
+    "en": "eng_Latn", "hi": "hin_Deva", "es": "spa_Latn", "fr": "fra_Latn", "de": "deu_Latn", "zh": "zho_Hans",
+    "ja": "jpn_Jpan", "ru": "rus_Cyrl", "ar": "ara_Arab", "kn": "kan_Knda", "it": "ita_Latn", "pt": "por_Latn",
+    "nl": "nld_Latn", "ko": "kor_Hang", "ta": "tam_Taml", "te": "tel_Telu", "mr": "mar_Deva", "bn": "ben_Beng",
+    "ur": "urd_Arab", "tr": "tur_Latn", "pl": "pol_Latn", "uk": "ukr_Cyrl",
+}
+
+
+def forced_language():
+    return os.environ.get("WHISPER_LANGUAGE") or None
+
+def language_config(model_size):
+    """Settings that change the result (part of the "language" artifact key)."""
+    return {"method": "sampled-windows", "windows": LANGUAGE_ID_WINDOWS, "model": model_size, "forced": forced_language()}
+
+
+# --- Windows ---
+
+def _pick(windows, count, min_length):
+    """Up to `count` of the windows, evenly spread, preferring those at least min_length long."""
+    long_enough = [w for w in windows if w[1] - w[0] >= min_length]
+    windows = long_enough or windows
+    if len(windows) <= count:
+        return windows
+    picks = np.linspace(0, len(windows) - 1, count).round().astype(int)
+    return [windows[i] for i in sorted(set(picks.tolist()))]
+
+def _map_windows(vad_map):
+    """Speech windows [(start, end)] in seconds (<= WINDOW_SECONDS) from a VAD map [{start, end}]."""
+    windows = []
+    for region in vad_map:
+        if windows and region["end"] - windows[-1][0] <= WINDOW_SECONDS:
+            windows[-1] = (windows[-1][0], region["end"])
+        else:
+            windows.append((region["start"], min(region["end"], region["start"] + WINDOW_SECONDS)))
+    return windows
+
+def sample_windows(audio, count=None, vad_map=None):
+    """
+    Up to `count` speech windows [(start, end)] in samples, evenly spread over
+    the audio. From vad_map ({start, end} seconds) when given, else VAD runs here.
+    """
+    count = count or LANGUAGE_ID_WINDOWS
+    if vad_map:
+        windows = [(int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)) for start, end in _map_windows(vad_map)]
+    else:
+        from dynamic_batcher import speech_windows
+        windows = speech_windows(audio)
+    return _pick(windows, count, MIN_WINDOW_SECONDS * SAMPLE_RATE)
+
+
+# --- Partial decoding ---
+
+def _is_pcm_wav(path):
+    """Whether `path` is a 16 kHz mono 16-bit WAV (the pipeline's decoded PCM)."""
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getframerate() == SAMPLE_RATE and f.getnchannels() == 1 and f.getsampwidth() == 2
+    except (wave.Error, EOFError, OSError):
+        return False
+
+def media_duration(path):
+    if _is_pcm_wav(path):
+        from windowed_diarization import wav_duration
+        return wav_duration(path)
+    result = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+                            capture_output=True, text=True, check=True)
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+def read_span(path, start, end):
+    """16 kHz float32 samples of [start, end) seconds of a media file, decoding only that part."""
+    if _is_pcm_wav(path):
+        from windowed_diarization import read_window
+        return read_window(path, start, end)[0]
+    result = subprocess.run(["ffmpeg", "-nostdin", "-v", "error", "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+                             "-i", path, "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"],
+                            capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+def media_windows(path, vad_map=None, count=None):
+    """16 kHz samples of up to `count` speech windows of a media file; only those parts are decoded."""
+    count = count or LANGUAGE_ID_WINDOWS
+    if vad_map:
+        spans = _pick(_map_windows(vad_map), count, MIN_WINDOW_SECONDS)
+        return [read_span(path, start, end) for start, end in spans]
+    duration = media_duration(path)
+    if duration <= PROBE_SECONDS * count:
+        audio = read_span(path, 0.0, duration)
+        return [audio[start:end] for start, end in sample_windows(audio, count)]
+    # No VAD map: the longest speech window of each of `count` evenly spaced stretches
+    from dynamic_batcher import speech_windows
+    clips = []
+    for start in np.linspace(0.0, duration - PROBE_SECONDS, count):
+        audio = read_span(path, start, start + PROBE_SECONDS)
+        windows = speech_windows(audio)
+        if windows:
+            window_start, window_end = max(windows, key=lambda w: w[1] - w[0])
+            clips.append(audio[window_start:window_end])
+    return clips
+
+
+# --- Detection ---
+
+def _features(model, audio):
+    extractor = model.feature_extractor
+    features = extractor(audio)[:, :extractor.nb_max_frames]
+    return np.pad(features, ((0, 0), (0, extractor.nb_max_frames - features.shape[-1])))
+
+def _identify(clips, model):
+    """Language of the speech clips returned by clips() (only called when detection is needed)."""
+    forced = forced_language()
+    if forced:
+        return {"language": forced, "probability": 1.0, "windows": 0, "method": "forced"}
+    if model is None:
+        from model_loader import load_whisper_model
+        model = load_whisper_model()
+    if not model.model.is_multilingual:
+        return {"language": "en", "probability": 1.0, "windows": 0, "method": "english-only model"}
+    clips = [clip for clip in clips() if len(clip)]
+    if not clips:
+        return None
+    encoder_output = model.encode(np.stack([_features(model, clip) for clip in clips]))
+    scores = defaultdict(float)
+    for clip, result in zip(clips, model.model.detect_language(encoder_output)):
+        for token, probability in result:
+            scores[token[2:-2]] += probability * len(clip) # "<|en|>" -> "en"
+    total = sum(scores.values()) or 1.0
+    language, score = max(scores.items(), key=lambda item: item[1])
+    logging.info(f"Language identified from {len(clips)} windows: {language} ({score / total:.2f})")
+    return {"language": language, "probability": round(score / total, 4), "windows": len(clips), "method": "sampled-windows"}
+
+def identify_language(audio, model=None, vad_map=None):
+    """{"language", "probability", "windows", "method"} for 16 kHz float32 audio."""
+    return _identify(lambda: [audio[start:end] for start, end in sample_windows(audio, vad_map=vad_map)], model)
+
+def identify_media_language(media, model=None, vad_map=None):
+    """
+    identify_language for a media path (only the sampled windows are decoded)
+    or 16 kHz samples, using vad_map's speech regions when given; None on failure.
+    """
+    try:
+        if isinstance(media, str):
+            return _identify(lambda: media_windows(media, vad_map), model)
+        return identify_language(media, model, vad_map)
+    except Exception as e:
+        # Stages fall back to Whisper's own detection
+        logging.warning(f"Language identification failed: {e}")
+        return None
+
+
+# --- Consumers ---
+
+def language_of(language_id):
+    return language_id["language"] if language_id else None
+
+def model_size_for(language_id, model_size):
+    """The English-only variant of model_size for confidently English audio (WHISPER_ENGLISH_ONLY=1), else model_size."""
+    if (os.environ.get("WHISPER_ENGLISH_ONLY", "0").lower() in ("1", "true", "yes")
+            and language_id and language_id["language"] == "en"
+            and language_id["probability"] >= ENGLISH_ONLY_MIN_PROBABILITY and model_size in ENGLISH_ONLY_SIZES):
+        return f"{model_size}.en"
+    return model_size
+
+def nllb_code(language, default=None):
+    """NLLB code for a Whisper code ("hi"), an NLLB code ("hin_Deva") or None."""
+    if not language:
+        return default
+    return NLLB_CODES.get(language.lower(), language)
+
+def transcript_language(transcript_path):
+    """The language stored in a transcript document, or None."""
+    with open(transcript_path, encoding="utf-8") as f:
+        language = json.load(f).get("language")
+    return language if language not in (None, "unknown") else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Identify the spoken language of a media file.')
+    parser.add_argument('--input', required=True, help='Media file.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if not os.path.exists(args.input):
+        print(json.dumps({"error": f"File not found: {args.input}"}))
+        sys.exit(1)
+    result = identify_media_language(args.input)
+    print(json.dumps(result or {"error": "Language identification failed"}, indent=2))
+    sys.exit(0 if result else 1)
@@ -0,0 +1,303 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import string
+import sys
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError: # Windows
+    RESOURCE_AVAILABLE = False
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Load generator for the Python entry points.
+#
+# Replays a seeded random mix of API-style jobs with Poisson arrivals at
+# --rate requests per second:
+#
+#   mic        short microphone clip (5-15 s)          -> transcribe_file
+#   upload     long upload (--long-seconds)            -> transcribe_file
+#   translate  200-2000 characters, random target       -> translate_text
+#   youtube    transcript fetch                         -> youtubeapi.fetch_transcript
+#
+# Targets:
+#   direct   the entry functions on a thread pool of --concurrency (one process,
+#            like a long-lived API worker)
+#   worker   worker_pool.WorkerPool (forked translation workers + Whisper
+#            replicas); YouTube fetches run on the harness's own thread pool
+#
+# Unless --real-models is given, the models are replaced by the deterministic
+# stubs in stub_models.py, so runs are CPU-only, repeatable and need no
+# downloads. YouTube fetches always use the stub API (no network in load tests).
+# Reported: p50/p95/p99 latency, queueing time (latency minus service time)
+# and service time per job type, throughput, errors, and peak memory (RSS of
+# this process, PSS including worker processes).
+#
+#   python load_test.py --rate 4 --requests 200 --target worker --workers 4
+
+JOB_MIX = {"mic": 0.4, "upload": 0.1, "translate": 0.35, "youtube": 0.15}
+TARGET_LANGUAGES = ("hindi", "french", "spanish", "german")
+WORDS = ("the", "meeting", "starts", "at", "nine", "please", "review", "notes", "before", "call", "thanks", "team")
+
+
+# --- Workload ---
+
+def build_schedule(requests, rate, seed, mix=JOB_MIX, long_seconds=300):
+    """[(arrival offset in seconds, job dict)], the same for the same arguments."""
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    schedule = []
+    at = 0.0
+    for index in range(requests):
+        at += rng.expovariate(rate)
+        kind = rng.choices(kinds, weights)[0]
+        job = {"id": index, "kind": kind}
+        if kind == "mic":
+            job["seconds"] = rng.randint(5, 15)
+        elif kind == "upload":
+            job["seconds"] = int(long_seconds * rng.uniform(0.5, 1.0))
+        elif kind == "translate":
+            job["text"] = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 400)))
+            job["target"] = rng.choice(TARGET_LANGUAGES)
+        else:
+            job["video_id"] = "".join(rng.choice(string.ascii_letters) for _ in range(11))
+        schedule.append((at, job))
+    return schedule
+
+class AudioFiles:
+    """Synthetic 16 kHz mono WAV files, one per duration, in a scratch workspace."""
+
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def get(self, seconds):
+        with self._lock:
+            if seconds not in self._paths:
+                path = self.workspace.path(f"clip-{seconds}s.wav", reserve=seconds * 32000)
+                samples = (np.random.default_rng(seconds).normal(0, 300, seconds * 16000)).astype(np.int16)
+                with contextlib.closing(wave.open(path, "wb")) as f:
+                    f.setnchannels(1)
+                    f.setsampwidth(2)
+                    f.setframerate(16000)
+                    f.writeframes(samples.tobytes())
+                self._paths[seconds] = path
+            return self._paths[seconds]
+
+
+# --- Targets ---
+
+class DirectTarget:
+    """Entry functions on a thread pool, as one long-lived API process would run them."""
+
+    def __init__(self, concurrency, workspace, audio):
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load")
+        self.workspace = workspace
+        self.audio = audio
+        self.processes = []
+
+    def submit(self, job):
+        submitted = time.perf_counter()
+        return self.executor.submit(self._run, job, submitted)
+
+    def _run(self, job, submitted):
+        started = time.perf_counter()
+        ok = True
+        if job["kind"] in ("mic", "upload"):
+            import transcribe
+            ok = transcribe.transcribe_file(self.audio.get(job["seconds"]), self.workspace.path(f"out-{job['id']}.json"),
+                                            metrics=[], artifacts=False, resume=False)
+        elif job["kind"] == "translate":
+            import translate
+            ok = bool(translate.translate_text(job["text"], job["target"], "english"))
+        else:
+            ok = run_youtube(job)
+        service = time.perf_counter() - started
+        return {"queue": started - submitted, "service": service, "error": None if ok else "failed"}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+class WorkerTarget:
+    """worker_pool.WorkerPool; YouTube fetches (not a pool op) run on a local thread pool."""
+
+    def __init__(self, workers, threads, workspace, audio):
+        from worker_pool import WorkerPool
+        self.pool = WorkerPool(workers, threads=threads).start()
+        self.processes = self.pool.processes
+        self.local = ThreadPoolExecutor(max_workers=8, thread_name_prefix="load-youtube")
+        self.workspace = workspace
+        self.audio = audio
+
+    def submit(self, job):
+        from concurrent.futures import Future
+        submitted = time.perf_counter()
+        if job["kind"] == "youtube":
+            def fetch():
+                started = time.perf_counter()
+                ok = run_youtube(job)
+                return {"queue": started - submitted, "service": time.perf_counter() - started,
+                        "error": None if ok else "failed"}
+            return self.local.submit(fetch)
+        if job["kind"] == "translate":
+            inner = self.pool.translate(job["text"], job["target"], "english")
+        else:
+            inner = self.pool.transcribe(self.audio.get(job["seconds"]), self.workspace.path(f"out-{job['id']}.json"))
+        outer = Future()
+
+        def done(future):
+            latency = time.perf_counter() - submitted
+            response = future.result() if future.exception() is None else {"error": str(future.exception())}
+            service = response.get("seconds", latency)
+            outer.set_result({"queue": max(0.0, latency - service), "service": service, "error": response.get("error")})
+        inner.add_done_callback(done)
+        return outer
+
+    def close(self):
+        self.local.shutdown(wait=True)
+        self.pool.close()
+
+def run_youtube(job):
+    import youtubeapi
+    from stub_models import StubYouTubeApi
+    return youtubeapi.fetch_transcript(job["video_id"], api=StubYouTubeApi) is not None
+
+
+# --- Measurement ---
+
+class MemorySampler:
+    """Peak RSS of this process and peak total PSS including the target's worker processes."""
+
+    def __init__(self, processes, interval=0.25):
+        self.processes = processes
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_total_pss_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        from worker_pool import memory_usage
+        while not self._stop.is_set():
+            own = memory_usage(os.getpid())
+            if own:
+                self.peak_rss_mb = max(self.peak_rss_mb, own["rss_mb"])
+                total = own["pss_mb"] + sum((memory_usage(p.pid) or {}).get("pss_mb", 0.0)
+                                            for p in self.processes if p.is_alive())
+                self.peak_total_pss_mb = max(self.peak_total_pss_mb, total)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def report(self):
+        # ru_maxrss is in KB on Linux; the fallback when /proc is unavailable
+        max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if RESOURCE_AVAILABLE else 0.0
+        return {"peak_rss_mb": round(max(self.peak_rss_mb, max_rss_mb), 1),
+                "peak_total_pss_mb": round(self.peak_total_pss_mb, 1) or None}
+
+def percentiles(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+def summarize(results, wall_seconds):
+    report = {}
+    for kind in sorted({job["kind"] for job, _ in results}) + ["all"]:
+        selected = [(job, r) for job, r in results if kind == "all" or job["kind"] == kind]
+        ok = [r for _, r in selected if not r["error"]]
+        report[kind] = {
+            "requests": len(selected),
+            "errors": len(selected) - len(ok),
+            "latency_s": percentiles([r["queue"] + r["service"] for r in ok]),
+            "queue_s": percentiles([r["queue"] for r in ok]),
+            "service_s": percentiles([r["service"] for r in ok]),
+        }
+    completed = sum(1 for _, r in results if not r["error"])
+    report["all"]["throughput_rps"] = round(completed / wall_seconds, 3) if wall_seconds else None
+    return report
+
+
+def run_load(schedule, target):
+    """Submits each job at its arrival time and waits for all of them; returns (results, wall seconds)."""
+    futures = []
+    started = time.perf_counter()
+    for at, job in schedule:
+        delay = started + at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        futures.append((job, target.submit(job)))
+    results = []
+    for job, future in futures:
+        try:
+            results.append((job, future.result()))
+        except Exception as e:
+            results.append((job, {"queue": 0.0, "service": 0.0, "error": str(e)}))
+    return results, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Concurrent load test of the transcription/translation entry points.')
+    parser.add_argument('--target', choices=("direct", "worker"), default="direct")
+    parser.add_argument('--rate', type=float, default=2.0, help='Mean arrivals per second (Poisson).')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4, help='Threads for the direct target.')
+    parser.add_argument('--workers', type=int, default=2, help='Workers for the worker target.')
+    parser.add_argument('--threads', type=int, help='Threads per worker (worker target).')
+    parser.add_argument('--long-seconds', type=int, default=300, help='Upper bound of long upload durations.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--real-models', action='store_true', help='Use the real models instead of the stubs.')
+    parser.add_argument('--whisper-rtf', type=float, help='Stub Whisper seconds of compute per audio second.')
+    args = parser.parse_args()
+
+    if not args.real_models:
+        import stub_models
+        stub_models.install(args.whisper_rtf or stub_models.STUB_WHISPER_RTF)
+    import transcribe
+    transcribe.detach_log_capture()
+
+    from scratch import scratch_workspace
+    schedule = build_schedule(args.requests, args.rate, args.seed, long_seconds=args.long_seconds)
+    with scratch_workspace("load-test") as workspace:
+        audio = AudioFiles(workspace)
+        for _, job in schedule: # Generate the clips up front, outside the measured window
+            if "seconds" in job:
+                audio.get(job["seconds"])
+        target = (DirectTarget(args.concurrency, workspace, audio) if args.target == "direct"
+                  else WorkerTarget(args.workers, args.threads, workspace, audio))
+        try:
+            with MemorySampler(target.processes) as memory:
+                results, wall_seconds = run_load(schedule, target)
+        finally:
+            target.close()
+
+    report = {
+        "target": args.target,
+        "models": "real" if args.real_models else "stub",
+        "rate": args.rate,
+        "requests": args.requests,
+        "seed": args.seed,
+        "wall_seconds": round(wall_seconds, 3),
+        "jobs": summarize(results, wall_seconds),
+        "memory": memory.report(),
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["jobs"]["all"]["errors"] else 0)
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import threading
+
+# Process-wide cache of loaded models (faster-whisper and the NLLB translator).
+#
+# Loading a model takes seconds and hundreds of MB, so long-running processes
+# (streaming server, worker pool, batch tools) load each configuration once and
+# share it. One-shot scripts get the same env-driven defaults as before.
+
+NLLB_MODEL = "facebook/nllb-200-distilled-600M"
+
+# Tuned settings written by autotune.py; used when no explicit argument or env var is set
+PROFILE_PATH = os.environ.get("WHISPER_PROFILE") or os.path.join(os.path.expanduser("~"), ".cache", "sonicseeker", "whisper_profile.json")
+DEFAULT_BEAM_SIZE = 5
+
+# Converted CTranslate2 models (see load_ct2_translator)
+CT2_CACHE_DIR = os.environ.get("TRANSLATE_CT2_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "sonicseeker", "ct2")
+
+_profiles = {}
+
+_models = {}
+_lock = threading.Lock()
+
+# --- Tuned profile ---
+
+def hardware_fingerprint():
+    """Identifies the machine a profile was tuned on (CPU model and core count)."""
+    cpu_model = None
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    cpu_model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        import platform
+        cpu_model = platform.processor() or None
+    return {"cpu_model": cpu_model, "cpu_count": os.cpu_count()}
+
+def load_profile(path=None):
+    """
+    Returns the tuned profile written by autotune.py, or {} when it is missing,
+    unreadable or was tuned on different hardware.
+    """
+    path = path or PROFILE_PATH
+    if path in _profiles:
+        return _profiles[path]
+    profile = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            profile = json.load(f)
+        if profile.get("hardware") != hardware_fingerprint():
+            logging.warning(f"Ignoring Whisper profile {path}: tuned on different hardware. Re-run autotune.py.")
+            profile = {}
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable Whisper profile {path}: {e}")
+    _profiles[path] = profile
+    return profile
+
+def _tuned(model_size, device):
+    """Tuned settings for this model size and device, if the profile has them."""
+    profile = load_profile()
+    if profile.get("model_size") == model_size and profile.get("device") == device:
+        return profile.get("settings", {})
+    return {}
+
+def whisper_config(model_size=None, device=None, compute_type=None, cpu_threads=None, num_workers=None):
+    """Resolves model settings: explicit arguments, then WHISPER_* env vars, then the tuned profile, then defaults."""
+    model_size = model_size or os.environ.get("WHISPER_MODEL_SIZE", "base")
+    device = device or os.environ.get("WHISPER_DEVICE_TYPE", "cpu")
+    tuned = _tuned(model_size, device)
+    if cpu_threads is None:
+        cpu_threads = os.environ.get("WHISPER_CPU_THREADS", os.environ.get("JOB_CPU_THREADS", tuned.get("cpu_threads", 0)))
+    if num_workers is None:
+        num_workers = os.environ.get("WHISPER_NUM_WORKERS", tuned.get("num_workers", 1))
+    return {
+        "model_size": model_size,
+        "device": device,
+        "compute_type": compute_type or os.environ.get("WHISPER_COMPUTE_TYPE", tuned.get("compute_type", "int8")),
+        "cpu_threads": int(cpu_threads),
+        "num_workers": int(num_workers),
+    }
+
+def word_timestamps_enabled():
+    """
+    Whether transcription computes word timestamps for the whole file
+    (WHISPER_WORD_TIMESTAMPS=1). Off by default: word_alignment.py computes
+    them on demand for the segments that need them.
+    """
+    return os.environ.get("WHISPER_WORD_TIMESTAMPS", "0").lower() in ("1", "true", "yes")
+
+def whisper_beam_size(model_size=None, device=None):
+    """Beam size for file transcription: WHISPER_BEAM_SIZE, then the tuned profile, then 5."""
+    config = whisper_config(model_size, device)
+    tuned = _tuned(config["model_size"], config["device"])
+    return int(os.environ.get("WHISPER_BEAM_SIZE", tuned.get("beam_size", DEFAULT_BEAM_SIZE)))
+
+def apply_thread_budget():
+    """
+    Applies the per-job CPU thread share set by job_scheduler.py (JOB_CPU_THREADS)
+    to torch; CTranslate2 picks it up through whisper_config(). No-op when unset.
+    """
+    threads = int(os.environ.get("JOB_CPU_THREADS", 0))
+    if threads <= 0:
+        return None
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    return threads
+
+def load_whisper_model(model_size=None, device=None, compute_type=None, cpu_threads=None, num_workers=None):
+    """Returns a cached WhisperModel for the resolved configuration, loading it on first use."""
+    from faster_whisper import WhisperModel
+
+    config = whisper_config(model_size, device, compute_type, cpu_threads, num_workers)
+    key = tuple(sorted(config.items()))
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            logging.info(f"Loading Whisper model '{config['model_size']}' on {config['device']} ({config['compute_type']})...")
+            model = WhisperModel(
+                config["model_size"],
+                device=config["device"],
+                compute_type=config["compute_type"],
+                cpu_threads=config["cpu_threads"],
+                num_workers=config["num_workers"],
+            )
+            _models[key] = model
+        return model
+
+def load_translation_model(model_name=NLLB_MODEL, device=None):
+    """Returns a cached (tokenizer, model) pair for an NLLB checkpoint, loading it on first use."""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+    device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    key = ("nllb", model_name, str(device))
+    with _lock:
+        loaded = _models.get(key)
+        if loaded is None:
+            logging.info(f"Loading translation model: {model_name} to {device}")
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            if device.type == "cuda":
+                # Use half-precision for better GPU memory efficiency
+                model = AutoModelForSeq2SeqLM.from_pretrained(
+                    model_name,
+                    torch_dtype=torch.float16,
+                    low_cpu_mem_usage=True
+                ).to(device)
+                torch.cuda.empty_cache()
+            else:
+                model = AutoModelForSeq2SeqLM.from_pretrained(model_name, low_cpu_mem_usage=True).to(device)
+            model.eval()
+            loaded = (tokenizer, model)
+            _models[key] = loaded
+        return loaded
+
+def convert_to_ct2(model_name=NLLB_MODEL, quantization="int8", cache_dir=None):
+    """
+    Converts a Hugging Face seq2seq checkpoint to CTranslate2 once and returns the
+    directory. Conversion goes to a temporary directory that is renamed into
+    place, so concurrent processes never see a half-written model.
+    """
+    import shutil
+    import tempfile
+    import ctranslate2
+
+    cache_dir = cache_dir or CT2_CACHE_DIR
+    output_dir = os.path.join(cache_dir, f"{model_name.replace('/', '--')}-{quantization}")
+    if os.path.exists(os.path.join(output_dir, "model.bin")):
+        return output_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(prefix=".converting-", dir=cache_dir)
+    logging.info(f"Converting {model_name} to CTranslate2 ({quantization}) in {output_dir} (one-time)...")
+    try:
+        converter = ctranslate2.converters.TransformersConverter(model_name)
+        converter.convert(os.path.join(temp_dir, "model"), quantization=quantization)
+        try:
+            os.replace(os.path.join(temp_dir, "model"), output_dir)
+        except OSError:
+            # Another process finished the same conversion first
+            if not os.path.exists(os.path.join(output_dir, "model.bin")):
+                raise
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return output_dir
+
+def load_ct2_translator(model_name=NLLB_MODEL, device=None, compute_type="int8"):
+    """Returns a cached (tokenizer, ctranslate2.Translator) pair, converting the model on first use."""
+    import ctranslate2
+    from transformers import AutoTokenizer
+
+    device = device or ("cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu")
+    threads = int(os.environ.get("JOB_CPU_THREADS", 0))
+    key = ("nllb-ct2", model_name, device, compute_type)
+    with _lock:
+        loaded = _models.get(key)
+        if loaded is None:
+            model_dir = convert_to_ct2(model_name, quantization="int8")
+            logging.info(f"Loading CTranslate2 translation model from {model_dir} on {device} ({compute_type})")
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            translator = ctranslate2.Translator(model_dir, device=device, compute_type=compute_type, intra_threads=threads)
+            loaded = (tokenizer, translator)
+            _models[key] = loaded
+        return loaded
+
+def unload_models():
+    """Drops all cached models (frees memory in long-running processes)."""
+    with _lock:
+        _models.clear()
@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Asyncio pipeline runner for many transcription jobs in one process.
+#
+# transcribe.py runs ffprobe, ffmpeg and the models one after another with
+# blocking subprocess.run calls. Here every job is a coroutine instead:
+#
+#   probe   ffprobe via asyncio.create_subprocess_exec (duration, streams)
+#   decode  ffmpeg streams 16 kHz mono PCM from its stdout straight into memory
+#           (no temp file); with diarization the WAV goes to a scratch workspace
+#   language  language_id.identify_media_language in the model executor (once per job)
+#   asr     transcribe.run_whisper in the model executor, with that language forced
+#   diarize transcribe.run_diarization in the model executor, concurrently with asr
+#   write   transcript JSON (shared output layer)
+#
+# While one job's ffmpeg is decoding, the model executor is busy with another
+# job's audio, so I/O-bound and compute-bound work overlap. Media subprocesses
+# are limited by a semaphore (PIPELINE_MEDIA_CONCURRENCY), model stages by the
+# executor size (the Whisper model's num_workers replicas).
+#
+# Every stage has a timeout (PIPELINE_<STAGE>_TIMEOUT seconds). On timeout or
+# cancellation, subprocesses are killed. Model stages already running in a
+# thread cannot be interrupted: their result is discarded and the job fails
+# right away.
+#
+#   python pipeline_runner.py --inputs a.mp3 b.mp4 --output-dir out/ [--diarize]
+
+SAMPLE_RATE = 16000
+STAGE_TIMEOUTS = {
+    stage: float(os.environ.get(f"PIPELINE_{stage.upper()}_TIMEOUT", default))
+    for stage, default in (("probe", 30), ("decode", 600), ("language", 300), ("asr", 3600), ("diarize", 3600),
+                           ("write", 60))
+}
+MEDIA_CONCURRENCY = int(os.environ.get("PIPELINE_MEDIA_CONCURRENCY", 4))
+
+
+class StageError(Exception):
+    """A pipeline stage failed, timed out or was cancelled."""
+
+    def __init__(self, stage, message):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+
+
+# --- Media subprocesses ---
+
+async def run_process(args, on_stderr_line=None):
+    """
+    Runs a subprocess and returns (returncode, stdout bytes, stderr text).
+    stderr is streamed line by line to `on_stderr_line` (ffmpeg progress).
+    The process is killed if the awaiting task is cancelled or times out.
+    """
+    process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+    stderr_lines = []
+
+    async def read_stderr():
+        async for line in process.stderr:
+            text = line.decode("utf-8", errors="replace").rstrip()
+            stderr_lines.append(text)
+            if on_stderr_line is not None:
+                on_stderr_line(text)
+
+    async def read_stdout():
+        chunks = []
+        while True:
+            chunk = await process.stdout.read(1 << 16)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    try:
+        stdout, _ = await asyncio.gather(read_stdout(), read_stderr())
+        await process.wait()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    return process.returncode, stdout, "\n".join(stderr_lines[-50:])
+
+async def probe(path):
+    """ffprobe: {"duration": seconds, "has_video": bool, "has_audio": bool}."""
+    code, stdout, stderr = await run_process(["ffprobe", "-v", "error", "-show_entries", "format=duration:stream=codec_type",
+                                              "-of", "json", path])
+    if code != 0:
+        raise StageError("probe", stderr or f"ffprobe exited with {code}")
+    data = json.loads(stdout)
+    types = {stream.get("codec_type") for stream in data.get("streams", [])}
+    return {"duration": float(data.get("format", {}).get("duration") or 0.0),
+            "has_video": "video" in types, "has_audio": "audio" in types}
+
+def _ffmpeg_pcm_args(path, output):
+    return ["ffmpeg", "-nostdin", "-v", "error", "-i", path, "-vn", "-acodec", "pcm_s16le",
+            "-ar", str(SAMPLE_RATE), "-ac", "1"] + (["-f", "s16le", "-"] if output is None else ["-y", output])
+
+async def decode_pcm(path):
+    """Decodes a media file to 16 kHz mono float32 samples, streamed from ffmpeg's stdout."""
+    code, stdout, stderr = await run_process(_ffmpeg_pcm_args(path, None))
+    if code != 0:
+        raise StageError("decode", stderr or f"ffmpeg exited with {code}")
+    return np.frombuffer(stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+async def convert_to_wav(path, output_path):
+    code, _, stderr = await run_process(_ffmpeg_pcm_args(path, output_path))
+    if code != 0 or not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        raise StageError("decode", stderr or f"ffmpeg exited with {code}")
+    return output_path
+
+
+# --- Runner ---
+
+class PipelineRunner:
+    """Runs transcription jobs as coroutines over a shared model executor."""
+
+    def __init__(self, model_workers=None, media_concurrency=MEDIA_CONCURRENCY, timeouts=None):
+        from model_loader import whisper_config
+        self.model_workers = model_workers or whisper_config()["num_workers"]
+        self.executor = ThreadPoolExecutor(max_workers=self.model_workers, thread_name_prefix="pipeline-model")
+        self.media_slots = asyncio.Semaphore(media_concurrency)
+        self.timeouts = dict(STAGE_TIMEOUTS, **(timeouts or {}))
+
+    async def stage(self, name, timings, awaitable):
+        """Awaits one stage with its timeout and records its wall time in `timings`."""
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(awaitable, self.timeouts[name])
+        except asyncio.TimeoutError:
+            raise StageError(name, f"timed out after {self.timeouts[name]:.0f}s")
+        finally:
+            timings[name] = round(time.perf_counter() - started, 3)
+
+    async def media(self, coroutine):
+        async with self.media_slots:
+            return await coroutine
+
+    def model(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def transcribe_job(self, input_path, output_json, diarize=False, hf_token=None):
+        import transcribe
+        timings = {}
+        started = time.perf_counter()
+        info = await self.stage("probe", timings, self.media(probe(input_path)))
+        if not info["has_audio"]:
+            raise StageError("probe", "no audio stream")
+
+        workspace = None
+        try:
+            if diarize:
+                # pyannote reads a file: decode once into the job's scratch workspace
+                from scratch import estimate_pcm_bytes, scratch_workspace
+                workspace = scratch_workspace("pipeline")
+                wav_path = workspace.path("audio.wav", reserve=int(info["duration"] * SAMPLE_RATE * 2) or estimate_pcm_bytes(input_path))
+                await self.stage("decode", timings, self.media(convert_to_wav(input_path, wav_path)))
+                audio = wav_path
+            else:
+                audio = await self.stage("decode", timings, self.media(decode_pcm(input_path)))
+
+            from language_id import identify_media_language, language_of
+
+            async def asr():
+                language_id = await self.stage("language", timings, self.model(identify_media_language, audio))
+                segments = await self.stage("asr", timings, self.model(
+                    partial(transcribe.run_whisper, audio, language=language_of(language_id))))
+                return segments, language_id
+
+            if diarize:
+                (segments, language_id), speaker_turns = await asyncio.gather(
+                    asr(), self.stage("diarize", timings, self.model(transcribe.run_diarization, wav_path, hf_token)))
+            else:
+                (segments, language_id), speaker_turns = await asr(), None
+            if segments is None:
+                raise StageError("asr", "Whisper transcription failed")
+        finally:
+            if workspace is not None:
+                workspace.close()
+
+        segments = transcribe.align_transcription_diarization(segments, speaker_turns)
+        from transcript_output import write_transcript
+        Path(output_json).parent.mkdir(parents=True, exist_ok=True)
+        await self.stage("write", timings, self.model(
+            lambda: write_transcript(output_json, segments, source="whisper", language=language_of(language_id), metrics=[],
+                                     pipeline={"stages": timings}, **({"language_id": language_id} if language_id else {}))))
+        return {"input": input_path, "output_json": output_json, "audio_seconds": round(info["duration"], 3),
+                "stages": timings, "seconds": round(time.perf_counter() - started, 3)}
+
+    async def run(self, jobs):
+        """Runs [(input, output_json, diarize, hf_token)] concurrently; failures are reported per job."""
+        async def guarded(job):
+            try:
+                return await self.transcribe_job(*job)
+            except StageError as e:
+                return {"input": job[0], "error": str(e), "stage": e.stage}
+            except Exception as e:
+                return {"input": job[0], "error": str(e)}
+        return await asyncio.gather(*(guarded(job) for job in jobs))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def main(args):
+    import transcribe
+    transcribe.detach_log_capture()
+    from model_loader import apply_thread_budget, load_whisper_model
+    apply_thread_budget()
+    load_whisper_model() # Load before the clock starts so the first job doesn't pay for it
+
+    output_dir = Path(args.output_dir)
+    jobs = [(path, str(output_dir / f"{Path(path).stem}-{index}.json"), args.diarize,
+             args.hf_token or os.environ.get('HUGGING_FACE_TOKEN')) for index, path in enumerate(args.inputs)]
+    runner = PipelineRunner(args.model_workers, args.media_concurrency)
+    started = time.perf_counter()
+    try:
+        results = await runner.run(jobs)
+    finally:
+        runner.close()
+    wall = time.perf_counter() - started
+    stage_total = sum(sum(r.get("stages", {}).values()) for r in results)
+    return {"jobs": results, "wall_seconds": round(wall, 3), "sum_of_stage_seconds": round(stage_total, 3),
+            "overlap": round(stage_total / wall, 2) if wall else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Transcribe many files concurrently with an asyncio pipeline.')
+    parser.add_argument('--inputs', nargs='+', required=True, help='Media files to transcribe.')
+    parser.add_argument('--output-dir', required=True, help='Directory for the transcript JSON files.')
+    parser.add_argument('--diarize', action='store_true', help='Perform speaker diarization.')
+    parser.add_argument('--hf-token', help='Hugging Face token for pyannote.audio.')
+    parser.add_argument('--model-workers', type=int, help='Concurrent model stages (default: Whisper num_workers).')
+    parser.add_argument('--media-concurrency', type=int, default=MEDIA_CONCURRENCY, help='Concurrent ffmpeg/ffprobe processes.')
+    args = parser.parse_args()
+
+    missing = [path for path in args.inputs if not os.path.exists(path)]
+    if missing:
+        print(json.dumps({"error": f"File not found: {missing[0]}"}))
+        sys.exit(1)
+    report = asyncio.run(main(args))
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if any("error" in job for job in report["jobs"]) else 0)
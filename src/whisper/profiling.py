@@ -0,0 +1,120 @@
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+# Opt-in profiling of a single run (--profile on transcribe.py, transcribe_api.py
+# and translate.py, or PROFILE_REQUESTS=1 for runs started by a service).
+#
+# The run is executed under cProfile with tracemalloc tracing, and three files
+# are written next to the output:
+#
+#   <base>.prof          cProfile stats (snakeviz / python -m pstats)
+#   <base>.alloc.txt     tracemalloc top allocations with their tracebacks
+#   <base>.profile.json  hot-spot summary: wall time, time per pipeline phase
+#                        (ffmpeg, model load, segment decoding, alignment,
+#                        JSON output, ...), top functions and peak memory
+#
+# The summary is also printed to stderr.
+
+TOP_N = 20
+TRACE_FRAMES = 10
+
+# Pipeline phases, identified by the functions that implement them: the phase
+# time is the largest cumulative time of any matching function, so nested calls
+# are not counted twice.
+PHASES = {
+    "ffmpeg": ("subprocess.py:run", "subprocess.py:communicate", "convert_to_wav", "extract_audio_from_video",
+               "check_file_type", "decode_audio"),
+    "model_load": ("load_whisper_model", "load_translation_model", "load_ct2_translator", "WhisperModel.__init__",
+                   "from_pretrained", "load_model"),
+    "segments_decode": ("generate_segments", "run_whisper", "transcribe_segments", "translate_batch", "translate_text",
+                        "translate_multi"),
+    "diarization": ("run_diarization",),
+    "alignment": ("align_transcription_diarization", "align_segments", "find_alignment"),
+    "json_output": ("write_transcript", "build_document", "dumps", "json.dump", "print_transcript"),
+}
+
+
+def profiling_requested(flag=False):
+    return flag or os.environ.get("PROFILE_REQUESTS", "0").lower() in ("1", "true", "yes")
+
+def profile_base(output_path=None, fallback_dir=None):
+    """`<output without extension>` or a timestamped name in fallback_dir (or the working directory)."""
+    if output_path:
+        return os.path.splitext(output_path)[0]
+    return os.path.join(fallback_dir or os.getcwd(), f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+
+def _function_label(key):
+    filename, line, name = key
+    return f"{os.path.basename(filename)}:{name}" if filename != "~" else name
+
+def summarize(stats, wall_seconds, snapshot, peak_bytes):
+    entries = []
+    for key, (_, calls, tottime, cumtime, _) in stats.stats.items():
+        entries.append((_function_label(key), calls, tottime, cumtime))
+    phases = {}
+    for phase, patterns in PHASES.items():
+        times = [cumtime for label, _, _, cumtime in entries if any(p in label for p in patterns)]
+        if times:
+            phases[phase] = round(max(times), 3)
+    by_self = sorted(entries, key=lambda e: e[2], reverse=True)[:TOP_N]
+    allocations = snapshot.statistics("lineno")[:TOP_N]
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "phases": phases,
+        "top_self_time": [{"function": label, "calls": calls, "self_s": round(tottime, 3), "cumulative_s": round(cumtime, 3)}
+                          for label, calls, tottime, cumtime in by_self],
+        "peak_traced_mb": round(peak_bytes / 2**20, 1),
+        "top_allocations": [{"location": str(stat.traceback[0]), "size_mb": round(stat.size / 2**20, 2), "count": stat.count}
+                            for stat in allocations],
+    }
+
+@contextlib.contextmanager
+def profile_run(base, enabled=True):
+    """Profiles the enclosed block (if enabled) and writes <base>.prof/.alloc.txt/.profile.json."""
+    if not enabled:
+        yield None
+        return
+    tracemalloc.start(TRACE_FRAMES)
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        wall_seconds = time.perf_counter() - started
+        snapshot = tracemalloc.take_snapshot()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        try:
+            _write_profile(base, profiler, wall_seconds, snapshot, peak_bytes)
+        except Exception as e:
+            print(f"Could not write profile: {e}", file=sys.stderr)
+
+def _write_profile(base, profiler, wall_seconds, snapshot, peak_bytes):
+    directory = os.path.dirname(base)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(f"{base}.prof")
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    with open(f"{base}.alloc.txt", "w", encoding="utf-8") as f:
+        for stat in snapshot.statistics("traceback")[:TOP_N]:
+            f.write(f"{stat.size / 2**20:.2f} MB in {stat.count} blocks\n")
+            f.write("\n".join(f"    {line}" for line in stat.traceback.format()) + "\n")
+    summary = summarize(stats, wall_seconds, snapshot, peak_bytes)
+    with open(f"{base}.profile.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in summary["phases"].items()) or "n/a"
+    print(f"Profile: {summary['wall_seconds']:.2f}s wall, peak traced memory {summary['peak_traced_mb']} MB", file=sys.stderr)
+    print(f"Profile phases: {phases}", file=sys.stderr)
+    for entry in summary["top_self_time"][:5]:
+        print(f"  {entry['self_s']:8.3f}s self  {entry['cumulative_s']:8.3f}s cum  {entry['function']}", file=sys.stderr)
+    print(f"Profile written to {base}.prof / .alloc.txt / .profile.json", file=sys.stderr)
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from transcript_output import build_segments, write_transcript
+
+# Two-pass "preview then refine" transcription.
+#
+# Pass 1 runs a small int8 model greedily (WHISPER_PREVIEW_MODEL, default
+# "tiny", beam 1, no word timestamps) so a rough transcript is available
+# within seconds. Pass 2 runs the configured model (run_whisper in
+# transcribe.py) and each refined segment replaces the preview segments it
+# covers as soon as it is decoded.
+#
+# Every segment carries an `id` and a `revision` (0 = preview, 1 = refined).
+# Changes are emitted as patch events a client can apply in place:
+#
+#   {"event": "segment", "segment": {...id, revision 0...}}            preview segment
+#   {"event": "patch", "segment": {...id, revision 1...}, "remove": [ids]}
+#   {"event": "patch", "remove": [ids]}                               leftover preview
+#   {"event": "final", "segments": N, "preview_seconds": 3.1, "total_seconds": 40.2}
+#
+# A run served from a stored result (artifact_store.py) replays its segments
+# as patches, followed by a "final" event with "cached": true.
+#
+# A refined segment takes over the id of the first preview segment it
+# replaces, so a client replaces that row and deletes the other listed ids.
+
+PREVIEW_MODEL = os.environ.get("WHISPER_PREVIEW_MODEL", "tiny")
+
+
+class ProgressiveTranscript:
+    """Current segments of a two-pass transcription and the patches that produced them."""
+
+    def __init__(self, emit=None):
+        self.segments = [] # sorted by start, each a raw segment with id/revision
+        self.emit = emit or (lambda event: None)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id - 1
+
+    def _public(self, segment):
+        return build_segments([segment])[0]
+
+    def add_preview(self, raw_segment):
+        with self._lock:
+            segment = dict(raw_segment, id=self._new_id(), revision=0)
+            self.segments.append(segment)
+            self.emit({"event": "segment", "segment": self._public(segment)})
+
+    def add_refined(self, raw_segment):
+        """Replaces every preview segment whose midpoint falls before the refined segment's end."""
+        with self._lock:
+            replaced = [s for s in self.segments
+                        if s["revision"] == 0 and (s["start"] + s["end"]) / 2 <= raw_segment["end"]]
+            replaced_ids = {s["id"] for s in replaced}
+            segment = dict(raw_segment,
+                           id=replaced[0]["id"] if replaced else self._new_id(),
+                           revision=max((s["revision"] for s in replaced), default=0) + 1)
+            self.segments = [s for s in self.segments if s["id"] not in replaced_ids]
+            self.segments.append(segment)
+            self.segments.sort(key=lambda s: (s["start"], s["revision"]))
+            self.emit({"event": "patch", "segment": self._public(segment),
+                       "remove": sorted(replaced_ids - {segment["id"]})})
+
+    def finish(self):
+        """Drops preview segments the refined pass did not reach (e.g. trailing noise)."""
+        with self._lock:
+            leftover = [s["id"] for s in self.segments if s["revision"] == 0]
+            if leftover:
+                self.segments = [s for s in self.segments if s["revision"] > 0]
+                self.emit({"event": "patch", "remove": leftover})
+            return [dict(s) for s in self.segments]
+
+
+def run_preview(input_path, on_segment, language=None):
+    """Greedy pass with the small preview model; calls on_segment for each raw segment."""
+    from model_loader import load_whisper_model
+    model = load_whisper_model(model_size=PREVIEW_MODEL, compute_type="int8")
+    logging.info(f"Starting preview pass with '{PREVIEW_MODEL}' for '{input_path}'...")
+    segments_gen, info = model.transcribe(input_path, beam_size=1, word_timestamps=False,
+                                          condition_on_previous_text=False, language=language)
+    count = 0
+    for segment in segments_gen:
+        on_segment({"start": segment.start, "end": segment.end, "text": segment.text.strip(), "words": []})
+        count += 1
+    logging.info(f"Preview pass finished: {count} segments (language: {info.language})")
+    return info.language
+
+def print_event(event):
+    """Default event sink: JSON lines on stdout."""
+    sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+def transcribe_progressive(input_path, run_refined, emit=print_event, preview_output=None, language=None):
+    """
+    Runs the preview and refine passes. `run_refined(input_path, on_segment)` is the
+    full-quality transcription (transcribe.run_whisper); its raw segments are
+    patched in as they arrive. When `preview_output` is set, the preview
+    transcript is written there as soon as pass 1 is done. Returns the final
+    raw segments (with id/revision) or None if the refine pass failed.
+    `language` (language_id.py) is forced in the preview pass.
+    """
+    started = time.perf_counter()
+    transcript = ProgressiveTranscript(emit)
+    try:
+        language = run_preview(input_path, transcript.add_preview, language)
+    except Exception as e:
+        # The preview is an optimisation only; the refine pass still runs
+        logging.warning(f"Preview pass failed, continuing with the full pass: {e}")
+    preview_seconds = time.perf_counter() - started
+    if preview_output:
+        try:
+            write_transcript(preview_output, transcript.segments, source="whisper", language=language, status="preview")
+        except Exception as e:
+            logging.warning(f"Could not write preview transcript: {e}")
+
+    if run_refined(input_path, transcript.add_refined) is None:
+        return None
+    segments = transcript.finish()
+    emit({"event": "final", "segments": len(segments), "preview_seconds": round(preview_seconds, 3),
+          "total_seconds": round(time.perf_counter() - started, 3)})
+    return segments
+
+def replay_progressive(segments, emit=print_event):
+    """Emits stored final segments (with id/revision) as patches plus the "final" event."""
+    for segment in segments:
+        emit({"event": "patch", "segment": build_segments([segment])[0], "remove": []})
+    emit({"event": "final", "segments": len(segments), "preview_seconds": 0.0, "total_seconds": 0.0, "cached": True})
@@ -0,0 +1,268 @@
+import argparse
+import atexit
+import contextlib
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError: # Windows
+    FCNTL_AVAILABLE = False
+
+# Scratch space for intermediate audio files.
+#
+# Every job gets its own workspace directory (unique name, so two uploads
+# called "meeting.mp4" never overwrite each other's audio) under SCRATCH_DIR.
+# With SCRATCH_TMPFS=1 the root defaults to /dev/shm, so the WAV files that
+# are written once and read straight back never touch the disk.
+#
+# Each live workspace holds an flock on its ".lock" file. The lock is released
+# by the kernel when the process dies, even from SIGKILL or OOM, so an unlocked
+# workspace is by definition garbage (or was kept on purpose as a warm cache).
+# Before space is handed out, the total size under the root is checked
+# against SCRATCH_QUOTA_MB and unlocked workspaces are reclaimed least
+# recently used first. A granted reservation is recorded in the workspace's
+# ".reserved" file and counts as used until the file it was made for has
+# grown to that size, so concurrent jobs cannot all be granted the same free
+# space; the check-and-record step holds an flock on the root's ".ensure.lock"
+# across processes. Workspaces are also removed on normal exit, exceptions
+# and SIGTERM.
+#
+#   with scratch_workspace("transcribe") as workspace:
+#       wav_path = workspace.path("audio.wav", reserve=estimate_pcm_bytes(input))
+
+SCRATCH_TMPFS = os.environ.get("SCRATCH_TMPFS", "0").lower() in ("1", "true", "yes")
+SCRATCH_DIR = os.environ.get("SCRATCH_DIR") or os.path.join(
+    "/dev/shm" if SCRATCH_TMPFS and os.path.isdir("/dev/shm") else tempfile.gettempdir(), "sonicseeker-scratch")
+SCRATCH_QUOTA_MB = float(os.environ.get("SCRATCH_QUOTA_MB", 4096))
+RESERVED_FILE = ".reserved"
+STALE_SECONDS = 6 * 3600 # Without flock (Windows), unlocked means "untouched for this long"
+PCM_BYTES_PER_SECOND = 16000 * 2 # 16 kHz mono s16le
+
+
+class ScratchFull(Exception):
+    """Raised when a reservation does not fit in the quota even after reclaiming."""
+
+
+def _tree_size(path):
+    size = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return size
+
+def _reserved_bytes(directory):
+    """Reserved bytes of a workspace not yet taken up by the files they were reserved for."""
+    try:
+        with open(os.path.join(directory, RESERVED_FILE), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return 0
+    pending = 0
+    for line in lines:
+        name, _, nbytes = line.rpartition(" ")
+        try:
+            written = os.path.getsize(os.path.join(directory, name))
+        except OSError:
+            written = 0
+        pending += max(0, int(nbytes) - written)
+    return pending
+
+
+class Workspace:
+    """A job's private scratch directory, removed on close() unless kept."""
+
+    def __init__(self, scratch, prefix):
+        self.scratch = scratch
+        self.directory = tempfile.mkdtemp(prefix=f"{prefix}-", dir=scratch.root)
+        self._lock_file = open(os.path.join(self.directory, ".lock"), "w")
+        if FCNTL_AVAILABLE:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._lock_file.write(str(os.getpid()))
+        self._lock_file.flush()
+        self.closed = False
+
+    def path(self, name, reserve=0):
+        """Path for a new file in this workspace; `reserve` bytes are made available under the quota first."""
+        if reserve:
+            self.reserve(name, reserve)
+        os.utime(self.directory)
+        return os.path.join(self.directory, os.path.basename(name))
+
+    def reserve(self, name, nbytes):
+        """Claims `nbytes` under the quota for the file `name` of this workspace (ScratchFull if they do not fit)."""
+        self.scratch.ensure(nbytes, workspace=self, name=os.path.basename(name))
+
+    def close(self, keep=False):
+        """Removes the workspace; with `keep`, leaves it as a reclaimable cache entry instead."""
+        if self.closed:
+            return
+        self.closed = True
+        self.scratch._forget(self)
+        self._lock_file.close() # Releases the flock
+        if not keep:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ScratchSpace:
+    """Quota-managed root of all workspaces of this machine."""
+
+    def __init__(self, root=None, quota_mb=None):
+        self.root = root or SCRATCH_DIR
+        self.quota_bytes = int((quota_mb if quota_mb is not None else SCRATCH_QUOTA_MB) * 2**20)
+        os.makedirs(self.root, exist_ok=True)
+        self._live = set()
+        self._lock = threading.Lock()
+
+    def workspace(self, prefix="job"):
+        workspace = Workspace(self, prefix)
+        with self._lock:
+            self._live.add(workspace)
+        return workspace
+
+    def _forget(self, workspace):
+        with self._lock:
+            self._live.discard(workspace)
+
+    def _reclaimable(self, directory):
+        lock_path = os.path.join(directory, ".lock")
+        try:
+            if time.time() - os.path.getmtime(directory) < 60:
+                return False # May be between mkdtemp() and taking its lock
+        except OSError:
+            return False
+        if not FCNTL_AVAILABLE:
+            try:
+                return time.time() - os.path.getmtime(directory) > STALE_SECONDS
+            except OSError:
+                return False
+        try:
+            with open(lock_path, "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(f, fcntl.LOCK_UN)
+            return True
+        except BlockingIOError:
+            return False # Held by a live job
+        except OSError:
+            return True
+
+    def usage(self):
+        """[(last used, size incl. pending reservations, path, reclaimable)] for every workspace under the root."""
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                size = _tree_size(entry.path) + _reserved_bytes(entry.path)
+                entries.append((entry.stat().st_mtime, size, entry.path, self._reclaimable(entry.path)))
+        return entries
+
+    @contextlib.contextmanager
+    def _root_lock(self):
+        """Serializes quota checks of all processes sharing the root."""
+        with open(os.path.join(self.root, ".ensure.lock"), "a") as f:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def ensure(self, nbytes, workspace=None, name=None):
+        """
+        Reclaims unlocked workspaces (least recently used first) until `nbytes`
+        more fit under the quota. With a workspace and file name, the granted
+        bytes are recorded there and count as used until the file exists.
+        """
+        with self._lock, self._root_lock():
+            entries = self.usage()
+            used = sum(size for _, size, _, _ in entries)
+            for mtime, size, path, reclaimable in sorted(entries):
+                if used + nbytes <= self.quota_bytes:
+                    break
+                if reclaimable:
+                    shutil.rmtree(path, ignore_errors=True)
+                    used -= size
+                    logging.info(f"Reclaimed scratch workspace {os.path.basename(path)} ({size / 2**20:.1f} MB)")
+            if used + nbytes > self.quota_bytes:
+                raise ScratchFull(f"scratch quota of {self.quota_bytes / 2**20:.0f} MB exceeded "
+                                  f"({used / 2**20:.1f} MB in use, {nbytes / 2**20:.1f} MB requested)")
+            if workspace is not None and name:
+                with open(os.path.join(workspace.directory, RESERVED_FILE), "a", encoding="utf-8") as f:
+                    f.write(f"{name} {int(nbytes)}\n")
+
+    def sweep(self):
+        """Removes every reclaimable workspace (crash leftovers); returns how many."""
+        removed = 0
+        for _, _, path, reclaimable in self.usage():
+            if reclaimable:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def close_all(self):
+        with self._lock:
+            live = list(self._live)
+        for workspace in live:
+            workspace.close()
+
+    def stats(self):
+        entries = self.usage()
+        return {"root": self.root, "quota_mb": round(self.quota_bytes / 2**20, 1), "workspaces": len(entries),
+                "live": sum(not reclaimable for *_, reclaimable in entries),
+                "used_mb": round(sum(size for _, size, _, _ in entries) / 2**20, 1)}
+
+
+# --- Process-wide instance ---
+
+_scratch = None
+_scratch_lock = threading.Lock()
+
+def _on_sigterm(signum, frame):
+    # Turn SIGTERM into SystemExit so finally blocks and atexit run
+    sys.exit(128 + signum)
+
+def get_scratch():
+    global _scratch
+    with _scratch_lock:
+        if _scratch is None:
+            _scratch = ScratchSpace()
+            atexit.register(_scratch.close_all)
+            if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+                signal.signal(signal.SIGTERM, _on_sigterm)
+        return _scratch
+
+def scratch_workspace(prefix="job"):
+    return get_scratch().workspace(prefix)
+
+def estimate_pcm_bytes(media_path):
+    """Size of the 16 kHz mono PCM decode of a media file (ffprobe duration; file size as a fallback)."""
+    try:
+        result = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", media_path],
+                                capture_output=True, text=True, check=True)
+        return int(float(json.loads(result.stdout)["format"]["duration"]) * PCM_BYTES_PER_SECOND) + 4096
+    except Exception:
+        return os.path.getsize(media_path) if os.path.exists(media_path) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect or clean the scratch space.')
+    parser.add_argument('--sweep', action='store_true', help='Remove workspaces no live job holds.')
+    args = parser.parse_args()
+    scratch = ScratchSpace()
+    if args.sweep:
+        print(f"Removed {scratch.sweep()} workspaces", file=sys.stderr)
+    print(json.dumps(scratch.stats(), indent=2))
@@ -0,0 +1,367 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import wave
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from artifact_store import cached_pcm, media_hash
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Audio clips of single transcript segments.
+#
+# Playing or sharing one segment should not need the whole media file. A clip
+# [start_seconds, end_seconds] of a segment is cut from the cheapest source:
+#
+#   - the decoded 16 kHz WAV in the artifact store (kept by transcribe.py):
+#     WAV clips are a plain byte-range copy, other formats encode from it
+#   - otherwise the original media, with ffmpeg's input-side seeking (-ss before
+#     -i jumps to the nearest keyframe through the container index instead of
+#     decoding from the start)
+#
+# Clips are cached on disk (CLIP_CACHE_DIR) with LRU eviction beyond
+# CLIP_CACHE_MB, keyed by media content hash, range and format, so clicking
+# back and forth through segments only cuts each clip once.
+#
+# The HTTP server answers GET/HEAD with Range support (206 partial content),
+# which the browser's <audio> element needs for seeking:
+#
+#   python segment_clips.py --serve --media-dir uploads/ --port 8765
+#   GET /clip?file=talk.mp4&start=12.5&end=17.2&format=mp3
+#   GET /clip?file=talk.mp4&transcript=talk.json&segment=3
+#
+#   python segment_clips.py --input talk.mp4 --start 12.5 --end 17.2 --output clip.wav
+
+CLIP_CACHE_DIR = os.environ.get("CLIP_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "sonicseeker", "clips")
+CLIP_CACHE_MB = int(os.environ.get("CLIP_CACHE_MB", 512))
+MAX_CLIP_SECONDS = 600
+FORMATS = {
+    "wav": ("audio/wav", ["-acodec", "pcm_s16le"]),
+    "mp3": ("audio/mpeg", ["-acodec", "libmp3lame", "-q:a", "4"]),
+    "ogg": ("audio/ogg", ["-acodec", "libopus", "-b:a", "64k"]),
+}
+
+
+class ClipError(Exception):
+    """The clip request is invalid or the clip could not be cut."""
+
+
+# --- Cutting ---
+
+def slice_wav(wav_path, start, end, output_path):
+    """Copies the frames of [start, end) of a PCM WAV into a new WAV (no decoding)."""
+    with contextlib.closing(wave.open(wav_path, "rb")) as source:
+        rate = source.getframerate()
+        first = min(source.getnframes(), int(start * rate))
+        last = min(source.getnframes(), int(round(end * rate)))
+        source.setpos(first)
+        frames = source.readframes(last - first)
+        with contextlib.closing(wave.open(output_path, "wb")) as target:
+            target.setnchannels(source.getnchannels())
+            target.setsampwidth(source.getsampwidth())
+            target.setframerate(rate)
+            target.writeframes(frames)
+    return True
+
+def ffmpeg_clip(source_path, start, end, output_path, fmt):
+    """Cuts [start, end) with input-side seeking and encodes it as `fmt`."""
+    args = ["ffmpeg", "-nostdin", "-v", "error", "-ss", f"{start:.3f}", "-i", source_path,
+            "-t", f"{end - start:.3f}", "-vn"] + FORMATS[fmt][1] + ["-y", output_path]
+    result = subprocess.run(args, capture_output=True, text=True)
+    if result.returncode != 0 or not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        logging.error(f"ffmpeg clip failed: {result.stderr.strip()[-500:]}")
+        return False
+    return True
+
+def cut_clip(media_path, start, end, output_path, fmt="wav", media=None):
+    """Writes the clip to output_path from the cached PCM when there is one, else from the media."""
+    pcm = cached_pcm(media) if media else None
+    if pcm and fmt == "wav":
+        return slice_wav(pcm, start, end, output_path)
+    return ffmpeg_clip(pcm or media_path, start, end, output_path, fmt)
+
+
+# --- Cache ---
+
+class ClipCache:
+    """Clip files on disk, least recently used evicted beyond max_bytes."""
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CLIP_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else CLIP_CACHE_MB * 2**20
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._producing = {}
+        # Existing clips, oldest use first
+        entries = sorted(os.scandir(self.directory), key=lambda e: e.stat().st_mtime)
+        self._sizes = OrderedDict((e.name, e.stat().st_size) for e in entries if e.is_file() and ".tmp" not in e.name)
+        with self._lock: # The limit may have shrunk since the clips were written
+            self._evict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, produce):
+        """Path of the cached clip `name`, calling produce(path) -> bool on a miss (once per name)."""
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if name in self._sizes and os.path.exists(path):
+                self._sizes.move_to_end(name)
+                self.hits += 1
+                return path
+            self.misses += 1
+            producing = self._producing.setdefault(name, threading.Lock())
+        with producing: # Concurrent requests for the same clip wait for one cut
+            temp_path = f"{path}.{threading.get_ident()}.tmp.{name.rsplit('.', 1)[-1]}"
+            try:
+                if not os.path.exists(path):
+                    if not produce(temp_path):
+                        raise ClipError("Could not cut the clip")
+                    os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                with self._lock:
+                    self._producing.pop(name, None)
+            with self._lock:
+                self._sizes[name] = os.path.getsize(path)
+                self._sizes.move_to_end(name)
+                self._evict()
+        return path
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        while total > self.max_bytes and len(self._sizes) > 1:
+            name, size = self._sizes.popitem(last=False)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            return {"directory": self.directory, "clips": len(self._sizes), "size_mb": round(sum(self._sizes.values()) / 2**20, 1),
+                    "max_mb": round(self.max_bytes / 2**20, 1), "hits": self.hits, "misses": self.misses}
+
+
+class ClipService:
+    """Resolves clip requests to cached clip files."""
+
+    def __init__(self, cache=None):
+        self.cache = cache or ClipCache()
+        self._hashes = {} # (path, size, mtime) -> content hash, so files are hashed once
+        self._lock = threading.Lock()
+
+    def media_id(self, media_path):
+        stat = os.stat(media_path)
+        signature = (os.path.abspath(media_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            media = self._hashes.get(signature)
+        if media is None:
+            media = media_hash(media_path)
+            with self._lock:
+                self._hashes[signature] = media
+        return media
+
+    def clip(self, media_path, start, end, fmt="wav"):
+        """Path of the clip [start, end) of media_path as `fmt`."""
+        if fmt not in FORMATS:
+            raise ClipError(f"Unsupported format: {fmt}")
+        if not 0 <= start < end or end - start > MAX_CLIP_SECONDS:
+            raise ClipError(f"Invalid clip range: {start}-{end}")
+        media = self.media_id(media_path)
+        name = f"{media}-{int(round(start * 1000))}-{int(round(end * 1000))}.{fmt}"
+        return self.cache.get(name, lambda path: cut_clip(media_path, start, end, path, fmt, media))
+
+def segment_range(transcript_path, index):
+    """(start_seconds, end_seconds) of segment `index` of a transcript document."""
+    with open(transcript_path, encoding="utf-8") as f:
+        document = json.load(f)
+    segments = document.get("transcription") or document.get("segments") or []
+    if not 0 <= index < len(segments):
+        raise ClipError(f"No segment {index} in {transcript_path}")
+    segment = segments[index]
+    return float(segment.get("start_seconds", segment.get("start"))), float(segment.get("end_seconds", segment.get("end")))
+
+
+# --- HTTP ---
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+def parse_range(header, size):
+    """(first, last) byte positions of a single-range Range header, None for the whole file; ValueError if unsatisfiable."""
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if not match.group(1): # Suffix range: the last N bytes
+        length = int(match.group(2))
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    first = int(match.group(1))
+    last = min(size - 1, int(match.group(2))) if match.group(2) else size - 1
+    if first >= size or last < first:
+        raise ValueError(header)
+    return first, last
+
+class ClipHandler(BaseHTTPRequestHandler):
+    service = None
+    media_dir = None
+
+    def _resolve(self, name):
+        """A file under media_dir (requests can't escape it)."""
+        root = os.path.realpath(self.media_dir)
+        path = os.path.realpath(os.path.join(root, name or ""))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            raise ClipError(f"File not found: {name}")
+        return path
+
+    def _clip_path(self):
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            return None, self.service.cache.stats()
+        if url.path != "/clip":
+            raise ClipError("Unknown path")
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        media_path = self._resolve(query.get("file"))
+        try:
+            if "transcript" in query:
+                start, end = segment_range(self._resolve(query["transcript"]), int(query.get("segment", -1)))
+            else:
+                start, end = float(query["start"]), float(query["end"])
+        except (KeyError, ValueError):
+            raise ClipError("Expected start/end or transcript/segment")
+        fmt = query.get("format", "wav")
+        return self.service.clip(media_path, start, end, fmt), FORMATS[fmt][0]
+
+    def _open_clip(self):
+        """(path, content_type, open file) of the clip; re-cut once if it was evicted before the open."""
+        for attempt in range(2):
+            path, content_type = self._clip_path()
+            if path is None:
+                return None, content_type, None
+            try:
+                return path, content_type, open(path, "rb")
+            except FileNotFoundError:
+                if attempt:
+                    raise
+
+    def _respond(self, send_body):
+        try:
+            path, content_type, f = self._open_clip()
+        except ClipError as e:
+            return self._send_json(404 if "not found" in str(e) else 400, {"error": str(e)}, send_body)
+        except Exception as e:
+            logging.error(f"Clip request failed: {e}", exc_info=True)
+            return self._send_json(500, {"error": str(e)}, send_body)
+        if path is None:
+            return self._send_json(200, content_type, send_body)
+        # Served from the open file: eviction may unlink the path, the data stays readable
+        with f:
+            self._send_clip(f, path, content_type, send_body)
+
+    def _send_clip(self, f, path, content_type, send_body):
+        size = os.fstat(f.fileno()).st_size
+        try:
+            byte_range = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.end_headers()
+            return
+        first, last = byte_range or (0, size - 1)
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(last - first + 1))
+        self.send_header("ETag", f'"{os.path.basename(path)}"')
+        self.send_header("Cache-Control", "public, max-age=86400")
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {first}-{last}/{size}")
+        self.end_headers()
+        if send_body and size:
+            f.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 16))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _send_json(self, status, body, send_body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(payload)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+def serve(media_dir, host="127.0.0.1", port=8765, service=None):
+    handler = type("Handler", (ClipHandler,), {"service": service or ClipService(), "media_dir": media_dir})
+    server = ThreadingHTTPServer((host, port), handler)
+    logging.info(f"Serving clips of {media_dir} on http://{host}:{port}/clip")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Cut and serve audio clips of transcript segments.')
+    parser.add_argument('--serve', action='store_true', help='Run the clip HTTP server.')
+    parser.add_argument('--media-dir', help='Directory the server may read media and transcripts from.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--input', help='Media file (one-shot mode).')
+    parser.add_argument('--start', type=float)
+    parser.add_argument('--end', type=float)
+    parser.add_argument('--transcript', help='Transcript JSON to take the range from (with --segment).')
+    parser.add_argument('--segment', type=int)
+    parser.add_argument('--format', choices=sorted(FORMATS), default='wav')
+    parser.add_argument('--output', help='Where to copy the clip (one-shot mode).')
+    args = parser.parse_args()
+
+    if args.serve:
+        if not args.media_dir or not os.path.isdir(args.media_dir):
+            parser.error("--serve needs an existing --media-dir")
+        serve(args.media_dir, args.host, args.port)
+        sys.exit(0)
+
+    if not args.input or not os.path.exists(args.input):
+        print(json.dumps({"error": f"File not found: {args.input}"}))
+        sys.exit(1)
+    try:
+        if args.transcript:
+            start, end = segment_range(args.transcript, args.segment if args.segment is not None else -1)
+        elif args.start is not None and args.end is not None:
+            start, end = args.start, args.end
+        else:
+            parser.error("Give --start/--end or --transcript/--segment")
+        service = ClipService()
+        path = service.clip(args.input, start, end, args.format)
+    except ClipError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    if args.output:
+        shutil.copyfile(path, args.output)
+    print(json.dumps({"clip": args.output or path, "start": start, "end": end, "cache": service.cache.stats()}, indent=2))
@@ -0,0 +1,209 @@
+import logging
+import os
+import time
+
+import numpy as np
+
+# Confidence-guided selective re-decoding.
+#
+# Pass 1 transcribes the whole file cheaply (configured model, greedy). Segments
+# whose word probabilities look unreliable are grouped into audio spans and
+# only those spans are decoded again with a larger model and beam
+# (WHISPER_REDECODE_MODEL / WHISPER_REDECODE_BEAM). A re-decoded span replaces
+# the original segments only if its mean word probability is higher, so a bad
+# second pass can never make the transcript worse.
+#
+# The stats returned with the segments say how much audio was re-decoded.
+
+SAMPLE_RATE = 16000
+REDECODE_MODEL = os.environ.get("WHISPER_REDECODE_MODEL", "small")
+REDECODE_BEAM = int(os.environ.get("WHISPER_REDECODE_BEAM", 5))
+FIRST_PASS_BEAM = int(os.environ.get("WHISPER_FIRST_PASS_BEAM", 1))
+
+MEAN_THRESHOLD = 0.6    # Segment mean word probability below this is re-decoded
+WORD_THRESHOLD = 0.4    # A word below this counts as "low"
+LOW_FRACTION = 0.3      # ...and a segment with more low words than this is re-decoded
+SPAN_PADDING = 0.3      # Seconds of context added on each side of a span
+SPAN_GAP = 1.0          # Flagged segments closer than this are decoded together
+
+
+# --- Confidence ---
+
+def segment_confidence(segment):
+    """Returns (mean word probability, fraction of low words) or (None, None) without words."""
+    probabilities = [w["probability"] for w in segment.get("words") or [] if w.get("probability") is not None]
+    if not probabilities:
+        return None, None
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    return float(probabilities.mean()), float((probabilities < WORD_THRESHOLD).mean())
+
+def is_low_confidence(segment, mean_threshold=MEAN_THRESHOLD, low_fraction=LOW_FRACTION):
+    mean, low = segment_confidence(segment)
+    if mean is None:
+        return bool(segment["text"].strip()) # Text without word timings cannot be trusted either
+    return mean < mean_threshold or low > low_fraction
+
+def mean_probability(segments):
+    probabilities = [w["probability"] for s in segments for w in s.get("words") or [] if w.get("probability") is not None]
+    return float(np.mean(probabilities)) if probabilities else 0.0
+
+def flagged_spans(segments, flags, gap=SPAN_GAP):
+    """Groups flagged segments into spans: [(start, end, [segment indices])]."""
+    spans = []
+    for index, flagged in enumerate(flags):
+        if not flagged:
+            continue
+        segment = segments[index]
+        if spans and segment["start"] - spans[-1][1] <= gap and spans[-1][2][-1] == index - 1:
+            spans[-1] = (spans[-1][0], segment["end"], spans[-1][2] + [index])
+        else:
+            spans.append((segment["start"], segment["end"], [index]))
+    return spans
+
+
+# --- Decoding ---
+
+def transcribe_segments(model, audio, beam_size, language=None, offset=0.0, **options):
+    """Runs a faster-whisper model and returns (raw segments with words, info)."""
+    segments_gen, info = model.transcribe(audio, beam_size=beam_size, word_timestamps=True, language=language, **options)
+    segments = []
+    for segment in segments_gen:
+        segments.append({
+            "start": segment.start + offset,
+            "end": segment.end + offset,
+            "text": segment.text.strip(),
+            "words": [{"word": w.word.strip(), "start": w.start + offset, "end": w.end + offset,
+                       "probability": w.probability} for w in segment.words or []],
+        })
+    return segments, info
+
+def _redecode_span(model, audio, span_start, span_end, language, prompt, beam_size):
+    clip_start = max(0.0, span_start - SPAN_PADDING)
+    clip_end = min(len(audio) / SAMPLE_RATE, span_end + SPAN_PADDING)
+    clip = audio[int(clip_start * SAMPLE_RATE):int(clip_end * SAMPLE_RATE)]
+    segments, _ = transcribe_segments(model, clip, beam_size, language=language, offset=clip_start,
+                                      initial_prompt=prompt or None, condition_on_previous_text=False,
+                                      vad_filter=False)
+    # Keep only what belongs to the span itself (the padding is context), clamped to it
+    kept = []
+    for segment in segments:
+        if not span_start <= (segment["start"] + segment["end"]) / 2 <= span_end:
+            continue
+        segment["start"] = max(segment["start"], span_start)
+        segment["end"] = min(segment["end"], span_end)
+        segment["words"] = [w for w in segment["words"] if span_start <= (w["start"] + w["end"]) / 2 <= span_end]
+        if segment["text"]:
+            kept.append(segment)
+    return kept
+
+def selective_transcribe(input_path, mean_threshold=MEAN_THRESHOLD, low_fraction=LOW_FRACTION,
+                         redecode_model=REDECODE_MODEL, redecode_beam=REDECODE_BEAM, first_pass_beam=FIRST_PASS_BEAM,
+                         language=None, model_size=None):
+    """
+    Cheap full pass + re-decoding of low-confidence spans. Returns (segments, stats);
+    segments are raw segments in run_whisper's format. `language` (language_id.py)
+    is forced in both passes; `model_size` picks the first-pass model.
+    """
+    from faster_whisper import decode_audio
+    from model_loader import load_whisper_model
+
+    started = time.perf_counter()
+    audio = decode_audio(input_path, sampling_rate=SAMPLE_RATE)
+    duration = len(audio) / SAMPLE_RATE
+
+    model = load_whisper_model(model_size=model_size)
+    logging.info(f"Selective decoding: first pass (beam {first_pass_beam}) over {duration:.1f}s of audio...")
+    segments, info = transcribe_segments(model, audio, first_pass_beam, language=language)
+    language = language or info.language
+    first_pass_seconds = time.perf_counter() - started
+
+    flags = [is_low_confidence(s, mean_threshold, low_fraction) for s in segments]
+    spans = flagged_spans(segments, flags)
+    stats = {
+        "audio_seconds": round(duration, 3),
+        "segments": len(segments),
+        "flagged_segments": sum(flags),
+        "spans": len(spans),
+        "redecoded_seconds": round(sum(end - start for start, end, _ in spans), 3),
+        "accepted_spans": 0,
+        "first_pass_seconds": round(first_pass_seconds, 3),
+        "redecode_seconds": 0.0,
+        "redecode_model": redecode_model,
+        "redecode_beam": redecode_beam,
+    }
+    stats["redecoded_fraction"] = round(stats["redecoded_seconds"] / duration, 4) if duration else 0.0
+
+    if spans:
+        redecode_started = time.perf_counter()
+        logging.info(f"Re-decoding {len(spans)} low-confidence spans ({stats['redecoded_seconds']:.1f}s, "
+                     f"{stats['redecoded_fraction']:.1%} of the audio) with '{redecode_model}' beam {redecode_beam}...")
+        strong_model = load_whisper_model(model_size=redecode_model)
+        replacements = {}
+        for span_start, span_end, indices in spans:
+            # The text just before the span is a cheap, reliable prompt
+            prompt = segments[indices[0] - 1]["text"] if indices[0] > 0 else ""
+            try:
+                candidate = _redecode_span(strong_model, audio, span_start, span_end, language, prompt, redecode_beam)
+            except Exception as e:
+                logging.warning(f"Re-decoding {span_start:.1f}-{span_end:.1f}s failed, keeping first pass: {e}")
+                continue
+            original = [segments[i] for i in indices]
+            if candidate and mean_probability(candidate) > mean_probability(original):
+                replacements[indices[0]] = (indices, candidate)
+        stats["accepted_spans"] = len(replacements)
+        stats["redecode_seconds"] = round(time.perf_counter() - redecode_started, 3)
+
+        merged = []
+        skip = set()
+        for index, segment in enumerate(segments):
+            if index in skip:
+                continue
+            if index in replacements:
+                indices, candidate = replacements[index]
+                merged.extend(candidate)
+                skip.update(indices)
+            else:
+                merged.append(segment)
+        segments = merged
+
+    stats["total_seconds"] = round(time.perf_counter() - started, 3)
+    stats["mean_probability"] = round(mean_probability(segments), 4)
+    logging.info(f"Selective decoding finished: {stats['accepted_spans']}/{stats['spans']} spans replaced, "
+                 f"{stats['redecoded_fraction']:.1%} of the audio re-decoded, {stats['total_seconds']:.1f}s total. "
+                 f"Language: {language}")
+    return segments, stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description='Cheap transcription with selective re-decoding of low-confidence spans.')
+    parser.add_argument('--input', required=True, help='Path to the input media file.')
+    parser.add_argument('--mean-threshold', type=float, default=MEAN_THRESHOLD)
+    parser.add_argument('--low-fraction', type=float, default=LOW_FRACTION)
+    parser.add_argument('--model-size', default=None, help='First-pass model (default: WHISPER_MODEL_SIZE).')
+    parser.add_argument('--redecode-model', default=REDECODE_MODEL)
+    parser.add_argument('--redecode-beam', type=int, default=REDECODE_BEAM)
+    parser.add_argument('--compare-full', action='store_true',
+                        help='Also transcribe everything with the re-decode model and report WER/time against it.')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"ERROR: Input file not found: {args.input}", file=sys.stderr)
+        sys.exit(1)
+    segments, stats = selective_transcribe(args.input, args.mean_threshold, args.low_fraction,
+                                           args.redecode_model, args.redecode_beam, model_size=args.model_size)
+    if args.compare_full:
+        from compare_transcripts import compare
+        from faster_whisper import decode_audio
+        from model_loader import load_whisper_model
+        started = time.perf_counter()
+        full, _ = transcribe_segments(load_whisper_model(model_size=args.redecode_model),
+                                      decode_audio(args.input, sampling_rate=SAMPLE_RATE), args.redecode_beam)
+        stats["full_pass_seconds"] = round(time.perf_counter() - started, 3)
+        stats["wer_vs_full"] = round(compare(" ".join(s["text"] for s in full),
+                                             " ".join(s["text"] for s in segments), mode="wer")["wer"], 4)
+        stats["compute_fraction_of_full"] = round(stats["total_seconds"] / stats["full_pass_seconds"], 3)
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,410 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+from transcript_output import build_segments, dumps
+
+# Optional WebSocket transport
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    websockets = None
+    WEBSOCKETS_AVAILABLE = False
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Live streaming transcription on top of the resident faster-whisper model.
+#
+# Clients send 16 kHz mono PCM (s16le) as it is recorded. Audio accumulates in a
+# rolling buffer that is re-decoded every `min_chunk_seconds`; words are only
+# committed once two consecutive decodes agree on them (local agreement), the
+# rest is reported as tentative text. Committed audio is trimmed from the buffer
+# so each decode stays short, and the committed text tail is passed as prompt.
+#
+# Events are JSON objects:
+#   {"event": "commit", "segments": [<transcript_output segment>]}
+#   {"event": "tentative", "text": "...", "start": 12.3, "end": 13.1}
+#   {"event": "final", "segments": [...], "duration": 63.2}
+
+SAMPLE_RATE = 16000
+
+
+def pcm16_to_float(data):
+    """Converts s16le bytes to float32 samples in [-1, 1]."""
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+def _normalize(word):
+    return word.strip().lower().strip(".,!?;:\"'")
+
+
+class OnlineTranscriber:
+    """Rolling-buffer decoder with a committed/tentative split (LocalAgreement-2)."""
+
+    def __init__(self, model, language=None, beam_size=1, min_chunk_seconds=0.5,
+                 max_buffer_seconds=15.0, prompt_chars=200):
+        self.model = model
+        self.language = language
+        self.beam_size = beam_size
+        self.min_chunk_samples = int(min_chunk_seconds * SAMPLE_RATE)
+        self.max_buffer_seconds = max_buffer_seconds
+        self.prompt_chars = prompt_chars
+
+        # Audio is appended from the event loop while decodes run in an executor
+        self.lock = threading.Lock()
+        self.audio = np.zeros(0, dtype=np.float32)
+        self.buffer_offset = 0.0     # Absolute time of self.audio[0]
+        self.total_samples = 0
+        self.unprocessed_samples = 0
+        self.committed = []          # All committed words (absolute times)
+        self.hypothesis = []         # Uncommitted words from the previous decode
+        self.last_committed_end = 0.0
+
+    @property
+    def duration(self):
+        return self.total_samples / SAMPLE_RATE
+
+    def insert_audio(self, chunk):
+        """Appends PCM (s16le bytes or float32 samples) to the rolling buffer."""
+        samples = pcm16_to_float(chunk) if isinstance(chunk, (bytes, bytearray, memoryview)) else np.asarray(chunk, dtype=np.float32)
+        with self.lock:
+            self.audio = np.concatenate([self.audio, samples])
+            self.total_samples += len(samples)
+            self.unprocessed_samples += len(samples)
+
+    def ready(self):
+        return self.unprocessed_samples >= self.min_chunk_samples
+
+    def _prompt(self):
+        text = " ".join(w["word"] for w in self.committed)
+        return text[-self.prompt_chars:] or None
+
+    def _decode(self):
+        with self.lock:
+            audio, buffer_offset = self.audio, self.buffer_offset
+            self.unprocessed_samples = 0
+        segments, _ = self.model.transcribe(
+            audio,
+            language=self.language,
+            beam_size=self.beam_size,
+            word_timestamps=True,
+            initial_prompt=self._prompt(),
+            condition_on_previous_text=False,
+        )
+        words = []
+        for segment in segments:
+            for word in segment.words or []:
+                start = buffer_offset + word.start
+                # Skip words that belong to audio we already committed
+                if start < self.last_committed_end - 0.05:
+                    continue
+                words.append({
+                    "word": word.word.strip(),
+                    "start": start,
+                    "end": buffer_offset + word.end,
+                    "probability": word.probability,
+                })
+        return words
+
+    def _commit(self, words):
+        if not words:
+            return []
+        self.committed.extend(words)
+        self.last_committed_end = words[-1]["end"]
+        return [{"event": "commit", "segments": build_segments([{
+            "start": words[0]["start"],
+            "end": words[-1]["end"],
+            "text": " ".join(w["word"] for w in words),
+            "words": words,
+        }])}]
+
+    def _trim(self):
+        """Drops committed audio once the buffer grows past max_buffer_seconds."""
+        with self.lock:
+            buffered = len(self.audio) / SAMPLE_RATE
+            if buffered <= self.max_buffer_seconds:
+                return
+            cut = min(int((self.last_committed_end - self.buffer_offset) * SAMPLE_RATE), len(self.audio))
+            if cut <= 0:
+                return
+            self.audio = self.audio[cut:]
+            self.buffer_offset += cut / SAMPLE_RATE
+
+    def process(self):
+        """Decodes the buffer and returns the resulting events."""
+        words = self._decode()
+
+        # Commit the longest prefix on which this and the previous decode agree
+        agreed = 0
+        for previous, current in zip(self.hypothesis, words):
+            if _normalize(previous["word"]) != _normalize(current["word"]):
+                break
+            agreed += 1
+        events = self._commit(words[:agreed])
+        self.hypothesis = words[agreed:]
+
+        # Never let the buffer grow without bound when nothing agrees (e.g. noise)
+        if len(self.audio) / SAMPLE_RATE > 2 * self.max_buffer_seconds and self.hypothesis:
+            events += self._commit(self.hypothesis)
+            self.hypothesis = []
+        self._trim()
+
+        if self.hypothesis:
+            events.append({
+                "event": "tentative",
+                "text": " ".join(w["word"] for w in self.hypothesis),
+                "start": round(self.hypothesis[0]["start"], 3),
+                "end": round(self.hypothesis[-1]["end"], 3),
+            })
+        return events
+
+    def finish(self):
+        """Flushes remaining audio and returns the final events."""
+        events = []
+        if self.unprocessed_samples or self.hypothesis:
+            events += [e for e in self.process() if e["event"] == "commit"]
+            events += self._commit(self.hypothesis)
+            self.hypothesis = []
+        events.append({
+            "event": "final",
+            "segments": _group_segments(self.committed),
+            "duration": round(self.duration, 3),
+        })
+        return events
+
+
+def _group_segments(words, max_gap=0.8, max_words=30):
+    """Groups committed words into transcript segments at pauses."""
+    raw_segments = []
+    current = []
+    for word in words:
+        if current and (word["start"] - current[-1]["end"] > max_gap or len(current) >= max_words):
+            raw_segments.append(current)
+            current = []
+        current.append(word)
+    if current:
+        raw_segments.append(current)
+    return build_segments([{
+        "start": group[0]["start"],
+        "end": group[-1]["end"],
+        "text": " ".join(w["word"] for w in group),
+        "words": group,
+    } for group in raw_segments])
+
+
+# --- Transports ---
+
+async def run_session(transcriber, receive, send):
+    """
+    Drives one stream: `receive` is an async iterator of PCM chunks, `send`
+    an async callable taking an event dict. Audio keeps arriving while a decode
+    runs in the executor, so each decode covers everything received so far.
+    """
+    loop = asyncio.get_running_loop()
+    new_audio = asyncio.Event()
+    finished = False
+
+    async def reader():
+        nonlocal finished
+        async for chunk in receive:
+            transcriber.insert_audio(chunk)
+            new_audio.set()
+        finished = True
+        new_audio.set()
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        while True:
+            await new_audio.wait()
+            new_audio.clear()
+            if finished:
+                break
+            if transcriber.ready():
+                for event in await loop.run_in_executor(None, transcriber.process):
+                    await send(event)
+        for event in await loop.run_in_executor(None, transcriber.finish):
+            await send(event)
+    finally:
+        reader_task.cancel()
+
+async def _tcp_chunks(reader, size=8192):
+    leftover = b""
+    while True:
+        data = await reader.read(size)
+        if not data:
+            break
+        # Keep chunks aligned to whole 16-bit samples
+        data = leftover + data
+        cut = len(data) - len(data) % 2
+        leftover = data[cut:]
+        if cut:
+            yield data[:cut]
+
+def make_transcriber(model, args):
+    return OnlineTranscriber(model, language=args.language, beam_size=args.beam_size,
+                             min_chunk_seconds=args.min_chunk, max_buffer_seconds=args.max_buffer)
+
+async def serve(args, model):
+    """Serves streaming sessions over TCP (JSON lines out) or WebSocket (JSON text frames out)."""
+    if args.websocket:
+        if not WEBSOCKETS_AVAILABLE:
+            logging.error("WebSocket mode requires the 'websockets' package: pip install websockets")
+            sys.exit(1)
+
+        async def ws_handler(ws, *_):
+            async def receive():
+                async for message in ws:
+                    if isinstance(message, bytes):
+                        yield message
+            async def send(event):
+                await ws.send(dumps(event).decode("utf-8"))
+            await run_session(make_transcriber(model, args), receive(), send)
+
+        async with websockets.serve(ws_handler, args.host, args.port, max_size=None):
+            logging.info(f"Streaming transcription WebSocket on ws://{args.host}:{args.port}")
+            await asyncio.Future()
+    else:
+        async def tcp_handler(reader, writer):
+            peer = writer.get_extra_info("peername")
+            logging.info(f"Stream opened from {peer}")
+            async def send(event):
+                writer.write(dumps(event) + b"\n")
+                await writer.drain()
+            try:
+                await run_session(make_transcriber(model, args), _tcp_chunks(reader), send)
+            finally:
+                writer.close()
+                logging.info(f"Stream closed from {peer}")
+
+        server = await asyncio.start_server(tcp_handler, args.host, args.port)
+        logging.info(f"Streaming transcription socket on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+
+# --- Replay harness ---
+
+def load_pcm(path):
+    """Reads a file as 16 kHz mono s16le bytes (WAV directly, anything else via ffmpeg)."""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as f:
+            if f.getframerate() == SAMPLE_RATE and f.getnchannels() == 1 and f.getsampwidth() == 2:
+                return f.readframes(f.getnframes())
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", path, "-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-"],
+        capture_output=True, check=True,
+    )
+    return result.stdout
+
+async def _replay_chunks(pcm, chunk_ms, speed, arrivals):
+    """Yields PCM chunks paced like a live microphone (speed=0: as fast as possible)."""
+    chunk_bytes = int(SAMPLE_RATE * chunk_ms / 1000) * 2
+    started = time.perf_counter()
+    for offset in range(0, len(pcm), chunk_bytes):
+        chunk = pcm[offset:offset + chunk_bytes]
+        audio_time = (offset + len(chunk)) / 2 / SAMPLE_RATE
+        if speed > 0:
+            delay = started + audio_time / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            await asyncio.sleep(0)
+        arrivals.append((audio_time, time.perf_counter()))
+        yield chunk
+
+def _arrival_time(arrivals, audio_time):
+    """Wall-clock time at which audio up to `audio_time` had been delivered."""
+    for delivered, wall in arrivals:
+        if delivered >= audio_time:
+            return wall
+    return arrivals[-1][1] if arrivals else time.perf_counter()
+
+async def replay(args, model=None):
+    """Replays a file as a live stream and reports commit latency."""
+    pcm = load_pcm(args.replay)
+    arrivals = []
+    latencies = []
+    final_event = {}
+
+    async def send(event):
+        nonlocal final_event
+        now = time.perf_counter()
+        if event["event"] == "commit":
+            for segment in event["segments"]:
+                for word in segment["words"]:
+                    latencies.append(now - _arrival_time(arrivals, word["end"]))
+        if event["event"] == "final":
+            final_event = event
+        elif args.print_events:
+            print(dumps(event).decode("utf-8"), flush=True)
+
+    chunks = _replay_chunks(pcm, args.chunk_ms, args.speed, arrivals)
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        reader, writer = await asyncio.open_connection(host, int(port))
+
+        async def pump():
+            async for chunk in chunks:
+                writer.write(chunk)
+                await writer.drain()
+            writer.write_eof()
+        pump_task = asyncio.create_task(pump())
+        async for line in reader:
+            await send(json.loads(line))
+        await pump_task
+        writer.close()
+    else:
+        await run_session(make_transcriber(model, args), chunks, send)
+
+    summary = {
+        "audio_seconds": round(len(pcm) / 2 / SAMPLE_RATE, 3),
+        "committed_words": len(latencies),
+        "commit_latency_p50": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        "commit_latency_p95": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+        "segments": final_event.get("segments", []),
+    }
+    print(dumps(summary).decode("utf-8"))
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Live streaming transcription over a local socket, or replay a file as a live stream.')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind the streaming server to.')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the streaming server.')
+    parser.add_argument('--websocket', action='store_true', help='Serve WebSocket instead of a raw TCP socket.')
+    parser.add_argument('--language', help='Force a language code (skips detection on every decode).')
+    parser.add_argument('--beam-size', type=int, default=1, help='Beam size for streaming decodes.')
+    parser.add_argument('--min-chunk', type=float, default=0.5, help='Seconds of new audio between decodes.')
+    parser.add_argument('--max-buffer', type=float, default=15.0, help='Rolling buffer length before committed audio is trimmed.')
+    parser.add_argument('--replay', help='Replay this media file as a live stream instead of serving.')
+    parser.add_argument('--connect', help='With --replay: stream to a running TCP server at host:port.')
+    parser.add_argument('--chunk-ms', type=int, default=100, help='With --replay: chunk size in milliseconds.')
+    parser.add_argument('--speed', type=float, default=1.0, help='With --replay: playback speed (0 = as fast as possible).')
+    parser.add_argument('--print-events', action='store_true', help='With --replay: print every event as a JSON line.')
+    args = parser.parse_args()
+
+    if args.replay and not os.path.exists(args.replay):
+        print(f"ERROR: File not found: {args.replay}", file=sys.stderr)
+        sys.exit(1)
+
+    model = None
+    if not (args.replay and args.connect):
+        from model_loader import load_whisper_model
+        model = load_whisper_model()
+
+    try:
+        if args.replay:
+            asyncio.run(replay(args, model))
+        else:
+            asyncio.run(serve(args, model))
+    except KeyboardInterrupt:
+        pass
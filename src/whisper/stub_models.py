@@ -0,0 +1,154 @@
+import contextlib
+import os
+import random
+import tempfile
+import time
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+
+# Deterministic stand-ins for the models, for CPU-only load tests (load_test.py).
+#
+# install() swaps them in behind the same entry points the real code calls:
+#
+#   model_loader.load_whisper_model      -> StubWhisperModel
+#   translate.translate_text / _multi    -> stub_translate / stub_translate_multi
+#   youtubeapi.fetch_transcript(api=...)  -> StubYouTubeApi
+#
+# The stubs do real CPU work proportional to the input (NumPy matmuls, which
+# release the GIL like CTranslate2/PyTorch do) plus allocations shaped like the
+# real ones, so queueing, thread contention and memory behave like production
+# while the output stays the same for the same input. Costs are calibrated in
+# "real time factors": STUB_WHISPER_RTF seconds of compute per second of audio.
+
+STUB_WHISPER_RTF = 0.05
+STUB_TRANSLATE_SECONDS_PER_KCHAR = 0.4
+STUB_YOUTUBE_LATENCY = 0.3 # Network wait per fetch (no CPU)
+SEGMENT_SECONDS = 5.0
+
+_unit_seconds = None
+
+
+def _calibrate():
+    """Seconds per work unit (one 128x128 float32 matmul) on this machine."""
+    global _unit_seconds
+    if _unit_seconds is None:
+        a = np.ones((128, 128), dtype=np.float32)
+        started = time.perf_counter()
+        for _ in range(200):
+            a @ a
+        _unit_seconds = (time.perf_counter() - started) / 200
+    return _unit_seconds
+
+def burn(seconds):
+    """Deterministic CPU work worth about `seconds` on an idle core (fixed unit count, not a timer)."""
+    units = int(seconds / _calibrate())
+    a = np.full((128, 128), 0.5, dtype=np.float32)
+    for _ in range(units):
+        a @ a
+
+
+# --- Whisper ---
+
+def audio_seconds(audio):
+    if isinstance(audio, str):
+        with contextlib.closing(wave.open(audio, "rb")) as f:
+            return f.getnframes() / f.getframerate()
+    return len(audio) / 16000
+
+class StubWhisperModel:
+    """Mimics faster_whisper.WhisperModel.transcribe(): lazy segment generator plus info."""
+
+    def __init__(self, rtf=STUB_WHISPER_RTF):
+        self.rtf = rtf
+        self.model = SimpleNamespace(is_multilingual=False) # language_id.py: English-only, no detection pass
+
+    def transcribe(self, audio, beam_size=5, word_timestamps=False, **options):
+        # The decoded audio the real model holds while decoding (float32 @ 16 kHz)
+        samples = np.zeros(int(audio_seconds(audio) * 16000), dtype=np.float32)
+        info = SimpleNamespace(language="en", language_probability=1.0, duration=len(samples) / 16000)
+
+        def segments():
+            duration = len(samples) / 16000
+            start = 0.0
+            index = 0
+            while start < duration:
+                end = min(duration, start + SEGMENT_SECONDS)
+                burn((end - start) * self.rtf * max(1, beam_size) / 5)
+                words = []
+                if word_timestamps:
+                    words = [SimpleNamespace(word=f"w{i}", start=start + i, end=start + i + 0.8, probability=0.9)
+                             for i in range(int(end - start))]
+                yield SimpleNamespace(start=start, end=end, text=f" segment {index}", words=words)
+                start = end
+                index += 1
+        return segments(), info
+
+
+# --- Translation ---
+
+def stub_translate(text, target_language, source_language=None, backend=None):
+    burn(len(text) / 1000 * STUB_TRANSLATE_SECONDS_PER_KCHAR)
+    return f"[{target_language}] " + " ".join(reversed(text.split()))
+
+def stub_translate_multi(text, target_languages, source_language=None, backend=None):
+    # Encoder work is shared, as in the real multi-target path
+    burn(len(text) / 1000 * STUB_TRANSLATE_SECONDS_PER_KCHAR * 0.5)
+    return {target: f"[{target}] " + " ".join(reversed(text.split())) for target in target_languages}
+
+
+# --- YouTube ---
+
+class _StubTranscript:
+    language_code = "en"
+    is_generated = True
+
+    def __init__(self, video_id):
+        self.video_id = video_id
+
+    def fetch(self):
+        time.sleep(STUB_YOUTUBE_LATENCY)
+        rng = random.Random(self.video_id) # Same video, same transcript
+        count = rng.randint(50, 400)
+        return [SimpleNamespace(start=i * 4.0, duration=3.5, text=f"line {i}") for i in range(count)]
+
+class _StubTranscriptList:
+    def __init__(self, video_id):
+        self.video_id = video_id
+
+    def __iter__(self):
+        return iter([_StubTranscript(self.video_id)])
+
+    def find_transcript(self, languages):
+        return _StubTranscript(self.video_id)
+
+    find_generated_transcript = find_transcript
+    find_manually_created_transcript = find_transcript
+
+class StubYouTubeApi:
+    @staticmethod
+    def list_transcripts(video_id):
+        time.sleep(STUB_YOUTUBE_LATENCY / 3)
+        return _StubTranscriptList(video_id)
+
+
+# --- Installation ---
+
+def install(whisper_rtf=STUB_WHISPER_RTF):
+    """Routes the model entry points to the stubs (before forking workers, so they inherit them)."""
+    import model_loader
+    import transcription_checkpoint
+    import translate
+
+    # Stub output must never land in the persistent caches a real run would reuse
+    os.environ["ARTIFACT_STORE"] = "0"
+    transcription_checkpoint.CHECKPOINT_DIR = tempfile.mkdtemp(prefix="stub-checkpoints-")
+
+    whisper_model = StubWhisperModel(whisper_rtf)
+    model_loader.load_whisper_model = lambda *args, **kwargs: whisper_model
+    model_loader.load_translation_model = lambda *args, **kwargs: (None, None)
+    model_loader.load_ct2_translator = lambda *args, **kwargs: (None, None)
+    translate.translate_text = stub_translate
+    translate.translate_multi = stub_translate_multi
+    _calibrate()
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+import audio_fingerprint
+from audio_fingerprint import SAMPLE_RATE, FRAME_SECONDS, FingerprintIndex
+
+# Tests for audio_fingerprint.py on synthetic audio (no decoding, no models).
+#
+#   cd src/whisper && python -m pytest -q test_audio_fingerprint.py
+
+
+# --- Synthetic audio ---
+
+def tones(seed, seconds):
+    """100 ms notes of two random frequencies each: sharp, reproducible spectral peaks."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(0.1 * SAMPLE_RATE)) / SAMPLE_RATE
+    notes = rng.uniform(200, 5000, size=(int(seconds * 10), 2))
+    audio = np.concatenate([np.sin(2 * np.pi * f1 * t) + 0.5 * np.sin(2 * np.pi * f2 * t) for f1, f2 in notes])
+    return (0.3 * audio + rng.normal(0, 0.01, len(audio))).astype(np.float32)
+
+def segments_every(seconds, step, text="old"):
+    return [{"start": float(s), "end": float(min(s + step, seconds)), "text": f"{text} {s}", "words": []}
+            for s in range(0, seconds, step)]
+
+ORIGINAL = tones(1, 60)
+PREFIX_SECONDS = 5.0
+TRIM_SECONDS = 10.37 # Not a multiple of the hop: peaks land on different frames
+# Another 5 s of audio, then the original from 10.37 s on: indexed time = new time + 5.37
+EXCERPT = np.concatenate([tones(2, PREFIX_SECONDS), ORIGINAL[int(TRIM_SECONDS * SAMPLE_RATE):]])
+OFFSET = TRIM_SECONDS - PREFIX_SECONDS
+
+@pytest.fixture
+def index(tmp_path):
+    return FingerprintIndex(str(tmp_path / "fingerprints.sqlite"))
+
+def add_original(index, segments):
+    hashes, frames = audio_fingerprint.fingerprint(ORIGINAL)
+    index.add("original", hashes, frames, len(ORIGINAL) / SAMPLE_RATE, segments)
+
+
+# --- find_matches ---
+
+def test_trimmed_offset_excerpt_is_matched(index):
+    add_original(index, [])
+    hashes, frames = audio_fingerprint.fingerprint(EXCERPT)
+    matches = audio_fingerprint.find_matches(index, hashes, frames)
+    assert len(matches) == 1
+    match = matches[0]
+    assert match["media"] == "original"
+    assert match["offset"] == pytest.approx(OFFSET, abs=2 * FRAME_SECONDS)
+    assert match["start"] == pytest.approx(PREFIX_SECONDS, abs=0.5)
+    assert match["end"] >= len(EXCERPT) / SAMPLE_RATE - 5
+
+def test_unrelated_audio_does_not_match(index):
+    add_original(index, [])
+    hashes, frames = audio_fingerprint.fingerprint(tones(3, 30))
+    assert audio_fingerprint.find_matches(index, hashes, frames) == []
+
+def test_own_media_is_excluded(index):
+    add_original(index, [])
+    hashes, frames = audio_fingerprint.fingerprint(ORIGINAL)
+    assert audio_fingerprint.find_matches(index, hashes, frames, exclude="original") == []
+
+
+# --- uncovered_ranges ---
+
+def test_uncovered_ranges_without_coverage():
+    assert audio_fingerprint.uncovered_ranges(10.0, []) == [{"start": 0.0, "end": 10.0}]
+
+def test_uncovered_ranges_edges():
+    # Gaps at the start, between spans and at the end; overlapping spans merge
+    covered = [(5.0, 8.0), (2.0, 4.0), (3.5, 6.0), (9.5, 12.0)]
+    assert audio_fingerprint.uncovered_ranges(12.0, covered) == [{"start": 0.0, "end": 2.0}, {"start": 8.0, "end": 9.5}]
+    # Gaps shorter than MIN_NEW_SECONDS are skipped, exactly MIN_NEW_SECONDS is kept
+    short = audio_fingerprint.MIN_NEW_SECONDS - 0.1
+    assert audio_fingerprint.uncovered_ranges(10.0, [(short, 10.0)]) == []
+    assert audio_fingerprint.uncovered_ranges(10.0, [(0.0, 9.0)]) == [{"start": 9.0, "end": 10.0}]
+    # Coverage past the end of the file
+    assert audio_fingerprint.uncovered_ranges(10.0, [(0.0, 12.0)]) == []
+
+
+# --- transcribe_with_reuse ---
+
+def fake_transcriber(calls):
+    """One "new" segment per requested range (the whole file for None)."""
+    def transcribe_ranges(ranges):
+        calls.append(ranges)
+        ranges = ranges or [{"start": 0.0, "end": len(EXCERPT) / SAMPLE_RATE}]
+        return [{"start": r["start"], "end": r["end"], "text": "new", "words": []} for r in ranges]
+    return transcribe_ranges
+
+def test_reused_segments_are_shifted_onto_the_new_timeline(index):
+    add_original(index, segments_every(60, 4))
+    calls = []
+    segments, stats = audio_fingerprint.transcribe_with_reuse(EXCERPT, "excerpt", fake_transcriber(calls), index=index)
+
+    reused = [s for s in segments if s["text"] != "new"]
+    assert stats["reused_segments"] == len(reused) > 0
+    by_text = {s["text"]: s for s in reused}
+    assert by_text["old 20"]["start"] == pytest.approx(20 - OFFSET, abs=0.1)
+    assert by_text["old 20"]["end"] == pytest.approx(24 - OFFSET, abs=0.1)
+    # Only the unmatched prefix (and nothing inside the reused span) was transcribed
+    assert calls and calls[0] is not None
+    assert all(r["end"] <= PREFIX_SECONDS + 4 for r in calls[0])
+    assert [s["start"] for s in segments] == sorted(s["start"] for s in segments)
+    assert index.contains("excerpt")
+
+def test_speech_before_the_first_reused_midpoint_is_transcribed(index):
+    # Original segment [8, 12] has its midpoint (4.63 s in the excerpt) before the match
+    # start, so it is not reused; the excerpt's audio from ~5.0 s to 6.63 s must be transcribed
+    add_original(index, [{"start": 0.0, "end": 8.0, "text": "old 0", "words": []},
+                         {"start": 8.0, "end": 12.0, "text": "old 8", "words": []}]
+                        + segments_every(60, 4)[3:])
+    segments, _ = audio_fingerprint.transcribe_with_reuse(EXCERPT, "excerpt", fake_transcriber([]), index=index)
+    first_reused = min(s["start"] for s in segments if s["text"] != "new")
+    assert first_reused == pytest.approx(12 - OFFSET, abs=0.1)
+    new = [s for s in segments if s["text"] == "new"]
+    assert any(s["start"] <= PREFIX_SECONDS and s["end"] >= first_reused - 0.01 for s in new)
+
+def test_no_match_transcribes_everything(index):
+    calls = []
+    segments, stats = audio_fingerprint.transcribe_with_reuse(tones(4, 20), "fresh", fake_transcriber(calls), index=index)
+    assert calls == [None]
+    assert stats["matches"] == [] and stats["reused_segments"] == 0
+    assert [s["text"] for s in segments] == ["new"]
+
+def test_failed_transcription_is_not_indexed(index):
+    add_original(index, [])
+    assert audio_fingerprint.transcribe_with_reuse(EXCERPT, "excerpt", lambda ranges: None, index=index) == (None, None)
+    assert not index.contains("excerpt")
@@ -0,0 +1,141 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+import compare_transcripts
+from compare_transcripts import DELETION, INSERTION, MATCH, SUBSTITUTION
+
+# Tests for compare_transcripts.py against a plain Levenshtein DP.
+#
+#   cd src/whisper && python -m pytest -q test_compare_transcripts.py
+
+
+# --- Reference implementation ---
+
+def levenshtein(reference, hypothesis):
+    previous = list(range(len(hypothesis) + 1))
+    for i, token in enumerate(reference, 1):
+        current = [i]
+        for j, other in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (token != other)))
+        previous = current
+    return previous[-1]
+
+def check_ops(ops, reference, hypothesis):
+    """The ops must turn reference into hypothesis; returns their cost."""
+    i = j = cost = 0
+    for op in ops:
+        if op in (MATCH, SUBSTITUTION):
+            assert (reference[i] == hypothesis[j]) == (op == MATCH)
+            i += 1
+            j += 1
+        elif op == DELETION:
+            i += 1
+        else:
+            assert op == INSERTION
+            j += 1
+        cost += op != MATCH
+    assert (i, j) == (len(reference), len(hypothesis))
+    return cost
+
+def random_pair(rng, max_length=40, alphabet=6):
+    reference = [rng.randrange(alphabet) for _ in range(rng.randrange(max_length + 1))]
+    hypothesis = []
+    for token in reference:
+        roll = rng.random()
+        if roll < 0.15:
+            hypothesis.append(rng.randrange(alphabet))
+        elif roll < 0.3:
+            continue
+        elif roll < 0.45:
+            hypothesis.extend([token, rng.randrange(alphabet)])
+        else:
+            hypothesis.append(token)
+    if rng.random() < 0.2: # Also completely unrelated pairs
+        hypothesis = [rng.randrange(alphabet) for _ in range(rng.randrange(max_length + 1))]
+    return reference, hypothesis
+
+
+# --- Edit distance and alignment ---
+
+def test_bit_parallel_distance_matches_dp():
+    rng = random.Random(1)
+    for _ in range(300):
+        reference, hypothesis = random_pair(rng, max_length=90) # Past 64 tokens: multi-word bit vectors
+        assert compare_transcripts.bit_parallel_distance(reference, hypothesis) == levenshtein(reference, hypothesis)
+
+def test_banded_alignment_is_optimal():
+    rng = random.Random(2)
+    for _ in range(300):
+        reference, hypothesis = random_pair(rng)
+        ops = compare_transcripts.align(np.asarray(reference, dtype=np.int64), np.asarray(hypothesis, dtype=np.int64))
+        assert check_ops(ops, reference, hypothesis) == levenshtein(reference, hypothesis)
+
+def test_hirschberg_split_is_optimal(monkeypatch):
+    # A tiny band budget forces the split at every level of the recursion
+    monkeypatch.setattr(compare_transcripts, "MAX_BAND_CELLS", 8)
+    rng = random.Random(3)
+    for _ in range(200):
+        reference, hypothesis = random_pair(rng)
+        ops = compare_transcripts.align(np.asarray(reference, dtype=np.int64), np.asarray(hypothesis, dtype=np.int64))
+        assert check_ops(ops, reference, hypothesis) == levenshtein(reference, hypothesis)
+
+def test_align_with_empty_sides():
+    empty = np.zeros(0, dtype=np.int64)
+    words = np.arange(3, dtype=np.int64)
+    assert compare_transcripts.align(empty, words) == [INSERTION] * 3
+    assert compare_transcripts.align(words, empty) == [DELETION] * 3
+    assert compare_transcripts.align(empty, empty) == []
+
+
+# --- compare() ---
+
+def test_compare_reports_the_metrics_the_ui_reads():
+    result = compare_transcripts.compare("the cat sat on the mat", "The cat sat on a hat!")
+    for key in ("wer", "cer", "mer", "wil", "hits", "substitutions", "deletions", "insertions"):
+        assert key in result
+    assert (result["hits"], result["substitutions"], result["deletions"], result["insertions"]) == (4, 2, 0, 0)
+    assert result["wer"] == pytest.approx(2 / 6)
+    assert result["mer"] == pytest.approx(2 / 6)
+    assert result["wil"] == pytest.approx(1 - (4 / 6) * (4 / 6))
+    # "the" -> "a" (3 edits) and "mat" -> "hat" (1 edit) over 22 reference characters
+    assert result["character_errors"] == 4
+    assert result["cer"] == pytest.approx(4 / 22)
+
+def test_compare_counts_deletions_and_insertions():
+    result = compare_transcripts.compare("one two three four", "one three four five six")
+    assert (result["hits"], result["substitutions"], result["deletions"], result["insertions"]) == (3, 0, 1, 2)
+    assert result["wer"] == pytest.approx(3 / 4)
+
+def test_compare_empty_reference():
+    result = compare_transcripts.compare("", "some words here")
+    assert result["insertions"] == 3 and result["hits"] == 0
+    assert result["wer"] == 1.0 and result["cer"] == 1.0 and result["wil"] == 1.0
+
+def test_compare_empty_hypothesis():
+    result = compare_transcripts.compare("some words here", "")
+    assert result["deletions"] == 3 and result["hits"] == 0
+    assert result["wer"] == 1.0 and result["mer"] == 1.0
+    # No matched word remains, so there is no separating space to lose
+    assert result["character_errors"] == len("some words here") and result["cer"] == 1.0
+    # A dropped word next to a matched one also loses its space
+    assert compare_transcripts.compare("a b c", "a b")["character_errors"] == 2
+
+def test_compare_identical_and_both_empty():
+    same = compare_transcripts.compare("hello world", "hello world")
+    assert same["wer"] == 0.0 and same["cer"] == 0.0 and same["hits"] == 2
+    empty = compare_transcripts.compare("", "")
+    assert empty["wer"] == 0.0 and empty["cer"] == 0.0 and empty["mer"] == 0.0
+
+def test_compare_segments_from_transcript_json():
+    reference = json.dumps({"transcription": [
+        {"text": "good morning everyone", "start_seconds": 0.0, "end_seconds": 2.0},
+        {"text": "let us begin", "start_seconds": 2.0, "end_seconds": 4.0},
+    ]})
+    result = compare_transcripts.compare(reference, "good morning every one let us begin")
+    first, second = result["segments"]
+    assert (first["start_seconds"], second["start_seconds"]) == (0.0, 2.0)
+    assert first["substitutions"] + first["insertions"] == 2 and second["wer"] == 0.0
+    assert result["substitutions"] + result["insertions"] == 2
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("youtube_transcript_api")
+
+import youtubeapi
+from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled
+
+# Tests for youtubeapi.py against a fake YouTubeTranscriptApi (no network).
+#
+#   cd src/whisper && python -m pytest -q test_youtubeapi.py
+
+
+# --- Fake API ---
+
+class FakeTranscript:
+    def __init__(self, video_id, language_code, is_generated=False):
+        self.video_id = video_id
+        self.language_code = language_code
+        self.is_generated = is_generated
+
+    def fetch(self):
+        return [SimpleNamespace(start=i * 2.0, duration=1.5, text=f"{self.language_code} line {i}") for i in range(3)]
+
+class FakeTranscriptList:
+    def __init__(self, video_id, manual=(), generated=()):
+        self.video_id = video_id
+        self.transcripts = ([FakeTranscript(video_id, code) for code in manual]
+                            + [FakeTranscript(video_id, code, is_generated=True) for code in generated])
+
+    def __iter__(self):
+        return iter(self.transcripts)
+
+    def _find(self, language_codes, candidates):
+        # Like the real API: the first requested code that exists wins
+        for code in language_codes:
+            for transcript in candidates:
+                if transcript.language_code == code:
+                    return transcript
+        raise NoTranscriptFound(self.video_id, language_codes, self)
+
+    def find_transcript(self, language_codes):
+        manual = [t for t in self.transcripts if not t.is_generated]
+        generated = [t for t in self.transcripts if t.is_generated]
+        return self._find(language_codes, manual + generated)
+
+    def find_generated_transcript(self, language_codes):
+        return self._find(language_codes, [t for t in self.transcripts if t.is_generated])
+
+    def find_manually_created_transcript(self, language_codes):
+        return self._find(language_codes, [t for t in self.transcripts if not t.is_generated])
+
+class FakeApi:
+    """list_transcripts() per video id from a {video_id: FakeTranscriptList | Exception} table, counting calls."""
+
+    def __init__(self, videos):
+        self.videos = videos
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def list_transcripts(self, video_id):
+        with self._lock:
+            self.calls.append(video_id)
+        result = self.videos[video_id]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+VIDEO_A = "AAAAAAAAAAA"
+VIDEO_B = "BBBBBBBBBBB"
+VIDEO_C = "CCCCCCCCCCC"
+
+
+# --- select_transcript ---
+
+def test_select_transcript_follows_language_priority():
+    transcripts = FakeTranscriptList(VIDEO_A, manual=["de", "en-GB"], generated=["en"])
+    assert youtubeapi.select_transcript(transcripts, ["fr", "en-GB", "en"]).language_code == "en-GB"
+
+def test_select_transcript_uses_default_preferences():
+    transcripts = FakeTranscriptList(VIDEO_A, manual=["de", "en-US"])
+    assert youtubeapi.select_transcript(transcripts).language_code == "en-US"
+
+def test_select_transcript_falls_back_to_generated_then_manual():
+    generated = FakeTranscriptList(VIDEO_A, manual=["de"], generated=["hi"])
+    assert youtubeapi.select_transcript(generated, ["en"]).language_code == "hi"
+    manual_only = FakeTranscriptList(VIDEO_A, manual=["de"])
+    assert youtubeapi.select_transcript(manual_only, ["en"]).language_code == "de"
+
+def test_select_transcript_none_available():
+    assert youtubeapi.select_transcript(FakeTranscriptList(VIDEO_A), ["en"]) is None
+
+
+# --- fetch_transcript error paths ---
+
+def test_fetch_transcript_returns_raw_segments():
+    api = FakeApi({VIDEO_A: FakeTranscriptList(VIDEO_A, manual=["en"])})
+    entry = youtubeapi.fetch_transcript(VIDEO_A, api=api)
+    assert entry["language"] == "en" and entry["cached"] is False
+    assert entry["segments"][1] == {"start": 2.0, "end": 3.5, "text": "en line 1"}
+
+def test_fetch_transcript_transcripts_disabled():
+    api = FakeApi({VIDEO_A: TranscriptsDisabled(VIDEO_A)})
+    assert youtubeapi.fetch_transcript(VIDEO_A, api=api) is None
+
+def test_fetch_transcript_no_transcript_found():
+    transcripts = FakeTranscriptList(VIDEO_A)
+    api = FakeApi({VIDEO_A: NoTranscriptFound(VIDEO_A, ["en"], transcripts)})
+    assert youtubeapi.fetch_transcript(VIDEO_A, api=api) is None
+
+def test_fetch_transcript_empty_list():
+    api = FakeApi({VIDEO_A: FakeTranscriptList(VIDEO_A)})
+    assert youtubeapi.fetch_transcript(VIDEO_A, ["en"], api=api) is None
+
+
+# --- TranscriptCache ---
+
+def test_cache_hit_skips_the_api(tmp_path):
+    cache = youtubeapi.TranscriptCache(str(tmp_path))
+    api = FakeApi({VIDEO_A: FakeTranscriptList(VIDEO_A, manual=["en"])})
+    first = youtubeapi.fetch_transcript(VIDEO_A, api=api, cache=cache)
+    second = youtubeapi.fetch_transcript(VIDEO_A, api=api, cache=cache)
+    assert api.calls == [VIDEO_A]
+    assert second["cached"] is True and second["segments"] == first["segments"]
+    # Stored under the chosen language too, so an explicit request for it hits
+    assert youtubeapi.fetch_transcript(VIDEO_A, ["en"], api=api, cache=cache)["cached"] is True
+    assert api.calls == [VIDEO_A]
+
+def test_cache_ttl_expiry(tmp_path):
+    cache = youtubeapi.TranscriptCache(str(tmp_path), ttl=60)
+    cache.put(VIDEO_A, None, {"video_id": VIDEO_A, "language": "en", "segments": []})
+    assert cache.get(VIDEO_A) is not None
+    stale = time.time() - 120
+    os.utime(cache._path(VIDEO_A, None), (stale, stale))
+    assert cache.get(VIDEO_A) is None
+
+    api = FakeApi({VIDEO_A: FakeTranscriptList(VIDEO_A, manual=["en"])})
+    assert youtubeapi.fetch_transcript(VIDEO_A, api=api, cache=cache)["cached"] is False
+    assert api.calls == [VIDEO_A]
+
+
+# --- fetch_many ---
+
+def test_fetch_many_keeps_order_and_deduplicates(tmp_path):
+    api = FakeApi({
+        VIDEO_A: FakeTranscriptList(VIDEO_A, manual=["en"]),
+        VIDEO_B: FakeTranscriptList(VIDEO_B, generated=["hi"]),
+        VIDEO_C: TranscriptsDisabled(VIDEO_C),
+    })
+    urls = [f"https://www.youtube.com/watch?v={VIDEO_B}", VIDEO_A, f"https://youtu.be/{VIDEO_C}",
+            "not a url", VIDEO_A, f"https://www.youtube.com/watch?v={VIDEO_B}"]
+    results = youtubeapi.fetch_many(urls, api=api, max_workers=4)
+
+    assert [r.get("video_id") for r in results] == [VIDEO_B, VIDEO_A, VIDEO_C, None, VIDEO_A, VIDEO_B]
+    assert results[0]["language"] == "hi" and results[1]["language"] == "en"
+    assert results[2]["error"] == "Transcript not available"
+    assert results[3]["error"] == "Could not extract video ID"
+    assert results[4] == results[1] and results[5] == results[0]
+    assert sorted(api.calls) == sorted([VIDEO_A, VIDEO_B, VIDEO_C]) # Each unique URL fetched once
@@ -1,18 +1,17 @@
 import argparse
+import copy
 import os
 import subprocess
-import json
-import tempfile
+import shutil
 import wave
 import contextlib
 import sys
 import logging
 from pathlib import Path
-import pprint # For pretty printing the diarization object
-import torch # Import torch
 from io import StringIO # Import StringIO
-import time # Import time
 import numpy as np # Import numpy for averaging
+from artifact_store import PCM_CONFIG
+from transcript_output import write_transcript
 
 # Configure logging
 log_stream = StringIO()
@@ -25,17 +24,31 @@ logging.basicConfig(
     ]
 )
 
+def detach_log_capture():
+    """Stops capturing log lines into log_stream (long-lived processes must not accumulate them)."""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if getattr(handler, "stream", None) is log_stream:
+            root.removeHandler(handler)
+
 # --- Argument Parsing ---
 parser = argparse.ArgumentParser(description='Transcribe audio/video file using Whisper and optionally perform speaker diarization.')
 parser.add_argument('--input', required=True, help='Path to the input media file.')
 parser.add_argument('--output-json', required=True, help='Path to save the output JSON file.')
 parser.add_argument('--diarize', action='store_true', help='Perform speaker diarization.')
 parser.add_argument('--hf-token', help='Hugging Face token for pyannote.audio.')
+parser.add_argument('--word-timestamps', action='store_true', help='Compute word timestamps for the whole file (default: segment level; see word_alignment.py).')
+parser.add_argument('--restart', action='store_true', help='Ignore and discard any checkpoint of an interrupted run of this input.')
+parser.add_argument('--profile', action='store_true', help='Profile this run (cProfile + tracemalloc); results are saved next to the output JSON.')
+parser.add_argument('--dedupe', action='store_true', help='Reuse transcripts of fingerprint-matched earlier media for duplicate ranges (see audio_fingerprint.py).')
+parser.add_argument('--waveform-sidecar', action='store_true', help='Also write all waveform peak levels to <output>.peaks (see waveform_peaks.py).')
+parser.add_argument('--no-artifacts', action='store_true', help='Do not reuse or store per-stage artifacts (see artifact_store.py).')
+mode_group = parser.add_mutually_exclusive_group()
+mode_group.add_argument('--progressive', action='store_true', help='Quick preview pass with a small model first, then refine (patch events as JSON lines on stdout).')
+mode_group.add_argument('--redecode', action='store_true', help='Cheap pass, then re-decode only low-confidence spans with a larger model (see selective_redecode.py).')
 # Add Whisper model options if needed (e.g., --model, --language)
 # parser.add_argument('--model', default='base', help='Whisper model name (e.g., tiny, base, small, medium, large)')
 
-args = parser.parse_args()
-
 # --- Helper Functions ---
 
 def check_ffmpeg():
@@ -90,48 +103,108 @@ def convert_to_wav(input_path, output_path):
         logging.error(f"An unexpected error occurred during ffmpeg conversion: {e}")
         return False
 
-def run_whisper(input_path):
-    """Runs Whisper transcription and returns segments with word timestamps."""
+def run_vad(audio_path):
+    """Speech regions [{start, end}] in seconds, using faster-whisper's Silero VAD."""
+    try:
+        from faster_whisper import decode_audio
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+        sampling_rate = 16000
+        audio = decode_audio(audio_path, sampling_rate=sampling_rate)
+        regions = get_speech_timestamps(audio, VadOptions())
+        logging.info(f"VAD found {len(regions)} speech regions.")
+        return [{"start": r["start"] / sampling_rate, "end": r["end"] / sampling_rate} for r in regions]
+    except Exception as e:
+        logging.error(f"Error during VAD: {e}")
+        return None
+
+def run_whisper(input_path, on_segment=None, word_timestamps=None, clip_timestamps=None, checkpoint=None,
+                language=None, model_size=None):
+    """
+    Runs Whisper transcription of a file (or 16 kHz float32 samples) and
+    returns segments (with word timestamps when
+    `word_timestamps` or WHISPER_WORD_TIMESTAMPS is set). `on_segment` is
+    called with each segment as soon as it is decoded. `clip_timestamps`
+    (a VAD map of {start, end} seconds) restricts decoding to those regions.
+    With a `checkpoint` (transcription_checkpoint.py) every segment is
+    committed as it is emitted, and a previous run's segments are reused:
+    decoding resumes at the last committed offset. `language` (from
+    language_id.py) is forced instead of detecting it again, and `model_size`
+    overrides the configured model.
+    """
     try:
         # Ensure whisper-ctranslate2 is installed: pip install -U whisper-ctranslate2 faster-whisper
         # Using faster-whisper for potentially better performance and word timestamps
-        from faster_whisper import WhisperModel
-        logging.info("Loading Whisper model...")
-        # Adjust model size and compute type as needed
-        # model_size = args.model or "base"
-        model_size = os.environ.get("WHISPER_MODEL_SIZE", "base") # Provide default 'base'
-        device_type = os.environ.get("WHISPER_DEVICE_TYPE", "cpu") # Default to 'cpu'
-        compute_type = os.environ.get("WHISPER_COMPUTE_TYPE", "int8") # Default compute type for CPU
+        from model_loader import load_whisper_model, whisper_beam_size, whisper_config, word_timestamps_enabled
+        # Model size, device and compute type come from WHISPER_MODEL_SIZE /
+        # WHISPER_DEVICE_TYPE / WHISPER_COMPUTE_TYPE, then the autotune.py
+        # profile (defaults: base, cpu, int8)
+        config = whisper_config(model_size)
+        beam_size = whisper_beam_size(model_size)
+        if word_timestamps is None:
+            word_timestamps = word_timestamps_enabled()
 
         # Log the device being used
-        logging.info(f"Using device: {device_type} with compute type: {compute_type}")
+        logging.info(f"Using device: {config['device']} with compute type: {config['compute_type']}")
 
         # For CPU: compute_type="int8"
         # For GPU: compute_type="float16" (or "int8_float16")
-        model = WhisperModel(model_size, device=device_type, compute_type=compute_type)
-        logging.info(f"Starting Whisper transcription for '{input_path}'...")
-        # Use word_timestamps=True
-        segments_gen, info = model.transcribe(input_path, beam_size=5, word_timestamps=True)
+        model = load_whisper_model(model_size=model_size)
+        source = input_path if isinstance(input_path, str) else f"{len(input_path) / 16000:.1f}s of decoded audio"
+        logging.info(f"Starting Whisper transcription for '{source}' (beam size {beam_size})...")
+        # Word timestamps add an alignment pass over the whole file; by default they
+        # are computed later, only for requested segments (word_alignment.py)
+        options = {}
+        if language:
+            options["language"] = language
+        if clip_timestamps:
+            options["clip_timestamps"] = [t for region in clip_timestamps for t in (region["start"], region["end"])]
 
         segments = []
-        word_probabilities = [] # List to store word probabilities
-        for segment in segments_gen:
-            segment_dict = {
-                "start": segment.start,
-                "end": segment.end,
-                "text": segment.text.strip(),
-                "words": []
-            }
-            if segment.words:
-                for word in segment.words:
-                    segment_dict["words"].append({
-                        "word": word.word.strip(),
-                        "start": word.start,
-                        "end": word.end,
-                        "probability": word.probability # Include probability
-                    })
-                    word_probabilities.append(word.probability) # Collect word probability
-            segments.append(segment_dict)
+        if checkpoint is not None and checkpoint.resuming:
+            from transcription_checkpoint import clips_after
+            segments = list(checkpoint.segments)
+            for segment_dict in segments:
+                if on_segment is not None:
+                    on_segment(segment_dict)
+            # Continue after the last committed segment, in the same language and
+            # with the committed text as context, instead of starting over
+            options["clip_timestamps"] = clips_after(checkpoint.offset, clip_timestamps)
+            options["initial_prompt"] = checkpoint.prompt()
+            if checkpoint.language:
+                options["language"] = checkpoint.language
+            logging.info(f"Resuming from checkpoint at {checkpoint.offset:.1f}s ({len(segments)} segments already done)")
+
+        word_probabilities = [w["probability"] for s in segments for w in s["words"]] # List to store word probabilities
+        language = checkpoint.language if checkpoint is not None and checkpoint.language else language
+        if options.get("clip_timestamps") == []:
+            logging.info("Checkpoint already covers all speech regions.")
+        else:
+            segments_gen, info = model.transcribe(input_path, beam_size=beam_size, word_timestamps=word_timestamps, **options)
+            language = info.language
+            if checkpoint is not None:
+                checkpoint.start(info.language, info.duration)
+
+            for segment in segments_gen:
+                segment_dict = {
+                    "start": segment.start,
+                    "end": segment.end,
+                    "text": segment.text.strip(),
+                    "words": []
+                }
+                if segment.words:
+                    for word in segment.words:
+                        segment_dict["words"].append({
+                            "word": word.word.strip(),
+                            "start": word.start,
+                            "end": word.end,
+                            "probability": word.probability # Include probability
+                        })
+                        word_probabilities.append(word.probability) # Collect word probability
+                segments.append(segment_dict)
+                if checkpoint is not None:
+                    checkpoint.commit(segment_dict)
+                if on_segment is not None:
+                    on_segment(segment_dict)
 
         # Calculate average word confidence
         if word_probabilities:
@@ -140,7 +213,7 @@ def run_whisper(input_path):
         else:
             logging.info("Word probabilities not available in transcription result.")
 
-        logging.info(f"Whisper transcription finished. Detected language: {info.language}")
+        logging.info(f"Whisper transcription finished. Detected language: {language}")
         return segments
     except ImportError:
         logging.error("faster-whisper or whisper-ctranslate2 not found. Please install with: pip install -U faster-whisper whisper-ctranslate2")
@@ -148,6 +221,9 @@ def run_whisper(input_path):
     except Exception as e:
         logging.error(f"Error during Whisper transcription: {e}")
         return None
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
 
 def run_diarization(wav_path, hf_token):
     """Runs pyannote.audio diarization."""
@@ -160,13 +236,19 @@ def run_diarization(wav_path, hf_token):
         from pyannote.audio import Pipeline
         logging.info("Loading pyannote.audio pipeline...")
         # Use token for authentication
-        pipeline = Pipeline.from_pretrained("pyannote/speaker-diarization-3.1", use_auth_token=hf_token)
+        pipeline = Pipeline.from_pretrained(DIARIZATION_PIPELINE, use_auth_token=hf_token)
 
         # Send pipeline to GPU if available (optional)
         # import torch
         # if torch.cuda.is_available():
         #   pipeline.to(torch.device("cuda"))
 
+        # Multi-hour files: bounded memory via windows + global speaker linking
+        from windowed_diarization import diarize_windowed, windowed_mode
+        if windowed_mode(wav_path):
+            logging.info(f"Starting windowed speaker diarization for '{wav_path}'...")
+            return diarize_windowed(pipeline, wav_path)
+
         logging.info(f"Starting speaker diarization for '{wav_path}'...")
         diarization = pipeline(wav_path)
         logging.info("Speaker diarization finished.")
@@ -301,91 +383,249 @@ def assign_speakers(diarization, segments):
     return segments
 
 # --- Main Execution ---
-def main():
-    input_file = args.input
-    output_json_file = args.output_json
-    do_diarize = args.diarize
-    hf_token = args.hf_token or os.environ.get('HUGGING_FACE_TOKEN')
-
-    if not os.path.exists(input_file):
-        logging.error(f"Input file not found: {input_file}")
-        sys.exit(1)
+DIARIZATION_PIPELINE = "pyannote/speaker-diarization-3.1"
+
+def diarization_config(wav_path):
+    from windowed_diarization import window_config, windowed_mode
+    config = {"pipeline": DIARIZATION_PIPELINE}
+    if windowed_mode(wav_path):
+        config.update(window_config())
+    return config
+
+def transcribe_file(input_file, output_json_file, do_diarize=False, hf_token=None, metrics=None, progressive=False,
+                    redecode=False, artifacts=None, resume=True, restart=False, dedupe=None, waveform_sidecar=None):
+    """
+    Runs the full pipeline (optional WAV conversion + diarization, Whisper,
+    alignment) and writes the output JSON. Returns True on success.
+    `metrics` defaults to the captured log lines of this process. With
+    `progressive`, a preview transcript is written to the output file first
+    and patch events are printed (see progressive_transcribe.py). With
+    `redecode`, only low-confidence spans get the expensive decode and the
+    document gains a "redecode" stats object.
+
+    Each stage's output is kept in the artifact store (artifact_store.py,
+    disable with `artifacts=False` or ARTIFACT_STORE=0), so re-running with
+    different options only recomputes the stages whose inputs changed.
+    With `resume` (default), the plain Whisper pass is checkpointed and an
+    interrupted run of the same input continues where it stopped
+    (`restart` discards that checkpoint first). With `dedupe` (default:
+    WHISPER_DEDUPE), ranges that match fingerprinted earlier media reuse
+    their transcript and only the rest is transcribed (audio_fingerprint.py).
+    When a WAV is available, waveform peaks are summarized in the document's
+    "waveform" field; with `waveform_sidecar` (default: WAVEFORM_SIDECAR) all
+    levels are also written next to the output (`<output>.peaks`).
+    """
+    from artifact_store import open_artifacts
+    from audio_fingerprint import dedupe_enabled
+    from language_id import identify_media_language, language_config, language_of, model_size_for
+    from waveform_peaks import (SAMPLES_PER_PEAK, peaks_from_wav, sidecar_enabled, waveform_enabled, waveform_summary,
+                                write_peaks)
+    from model_loader import whisper_beam_size, whisper_config, word_timestamps_enabled
+
+    # The progressive and redecode modes run their own passes over the whole file
+    dedupe = (dedupe_enabled() if dedupe is None else dedupe) and not progressive and not redecode
 
     # Ensure output directory exists
     Path(output_json_file).parent.mkdir(parents=True, exist_ok=True)
 
-    temp_dir = None
-    wav_file_path = None
-    transcription_input = input_file # Use original file for Whisper by default
+    # Private scratch workspace (scratch.py): unique per job, quota-managed, removed on exit
+    from scratch import scratch_workspace
+    workspace = scratch_workspace("transcribe")
+    extra = {}
+    checkpoint = None
 
     try:
-        if do_diarize:
-            # Create a temporary directory for the WAV file
-            temp_dir = tempfile.TemporaryDirectory()
-            wav_file_path = os.path.join(temp_dir.name, "diarization_input.wav")
-
-            # Convert input to WAV for diarization
-            if not convert_to_wav(input_file, wav_file_path):
+        store = open_artifacts(input_file, workspace.directory, artifacts)
+
+        # 0. Decoded PCM: needed for diarization, and kept for later runs when the store is on
+        wav_file_path = None
+        pcm_key = None
+        if do_diarize or store.persistent:
+            if not store.persistent:
+                from scratch import ScratchFull, estimate_pcm_bytes
+                try:
+                    workspace.reserve("pcm.wav", estimate_pcm_bytes(input_file)) # TransientArtifacts' "pcm" file
+                except ScratchFull as e:
+                    logging.error(f"Not enough scratch space for the WAV conversion: {e}")
+                    return False
+            wav_file_path, pcm_key = store.file_stage(
+                "pcm", PCM_CONFIG, [store.media], lambda path: convert_to_wav(input_file, path), "wav")
+            if wav_file_path is None and do_diarize:
                 logging.error("Failed to convert file to WAV for diarization. Proceeding without diarization.")
                 do_diarize = False # Disable diarization if conversion fails
-            else:
-                # Use the converted WAV for Whisper as well for consistency
-                transcription_input = wav_file_path
-                logging.info(f"Using converted WAV file for transcription: {transcription_input}")
-
-        # 1. Run Whisper Transcription
-        transcription_segments = run_whisper(transcription_input)
-        if transcription_segments is None:
+        # Use the converted WAV for Whisper as well for consistency
+        transcription_input = wav_file_path or input_file
+        source_key = pcm_key if wav_file_path else store.media
+
+        # 1. Optional VAD map (WHISPER_VAD=1): Whisper only decodes the speech regions
+        vad_map, vad_key = None, None
+        if os.environ.get("WHISPER_VAD", "0").lower() in ("1", "true", "yes"):
+            vad_map, vad_key = store.json_stage("vad", {"method": "silero", "options": "default"}, [source_key],
+                                                lambda: run_vad(transcription_input))
+
+        # 2. Spoken language, identified once (language_id.py) and forced in every later stage
+        configured_size = whisper_config()["model_size"]
+        language_id, _ = store.json_stage("language", language_config(configured_size), [source_key, vad_key],
+                                          lambda: identify_media_language(transcription_input, vad_map=vad_map))
+        language = language_of(language_id)
+        model_size = model_size_for(language_id, configured_size)
+
+        # 3. Run Whisper Transcription
+        asr_config = dict(whisper_config(model_size), beam_size=whisper_beam_size(model_size),
+                          word_timestamps=word_timestamps_enabled(),
+                          mode="progressive" if progressive else "redecode" if redecode else "full",
+                          language=language)
+        if redecode:
+            import selective_redecode
+            asr_config["redecode"] = {"model": selective_redecode.REDECODE_MODEL, "beam": selective_redecode.REDECODE_BEAM,
+                                      "first_pass_beam": selective_redecode.FIRST_PASS_BEAM}
+        if dedupe:
+            asr_config["dedupe"] = True
+
+        # Long files survive a crash/restart: the plain pass checkpoints segments as they
+        # are decoded and the next run with the same input and settings resumes
+        if resume and not progressive and not redecode and not dedupe:
+            from artifact_store import media_hash, stage_key
+            from transcription_checkpoint import CheckpointLocked, TranscriptionCheckpoint
+            media = store.media or media_hash(input_file)
+            try:
+                checkpoint = TranscriptionCheckpoint(stage_key("asr-checkpoint", asr_config, [media, vad_map]), fresh=restart)
+            except CheckpointLocked as e:
+                logging.warning(f"{e}; transcribing without a checkpoint.")
+
+        def compute_asr():
+            if progressive:
+                from progressive_transcribe import transcribe_progressive
+                run = lambda path, on_segment: run_whisper(path, on_segment, clip_timestamps=vad_map,
+                                                           language=language, model_size=model_size)
+                segments = transcribe_progressive(transcription_input, run, preview_output=output_json_file,
+                                                  language=language)
+                return None if segments is None else {"segments": segments}
+            if redecode:
+                from selective_redecode import selective_transcribe
+                try:
+                    segments, stats = selective_transcribe(transcription_input, language=language,
+                                                           model_size=model_size)
+                except Exception as e:
+                    logging.error(f"Error during selective transcription: {e}")
+                    return None
+                return {"segments": segments, "extra": {"redecode": stats}}
+            if dedupe:
+                from artifact_store import media_hash
+                from audio_fingerprint import transcribe_with_reuse
+                from faster_whisper import decode_audio
+                try:
+                    audio = decode_audio(transcription_input, sampling_rate=16000)
+                    segments, stats = transcribe_with_reuse(
+                        audio, store.media or media_hash(input_file),
+                        lambda ranges: run_whisper(audio, clip_timestamps=ranges or vad_map,
+                                                   language=language, model_size=model_size))
+                except Exception as e:
+                    logging.error(f"Error during fingerprint-deduplicated transcription: {e}")
+                    return None
+                return None if segments is None else {"segments": segments, "extra": {"fingerprint": stats}}
+            segments = run_whisper(transcription_input, clip_timestamps=vad_map, checkpoint=checkpoint,
+                                   language=language, model_size=model_size)
+            return None if segments is None else {"segments": segments}
+
+        asr, asr_key = store.json_stage("asr", asr_config, [source_key, vad_key], compute_asr)
+        if asr is None:
             logging.error("Whisper transcription failed.")
-            sys.exit(1)
-
-        # 2. Run Diarization (if requested and WAV exists)
-        speaker_turns = None
+            return False
+        if progressive and "asr" in store.hits:
+            # compute_asr did not run, so the promised events are replayed from the stored segments
+            from progressive_transcribe import replay_progressive
+            replay_progressive(asr["segments"])
+        extra.update(asr.get("extra", {}))
+        if language_id:
+            extra["language_id"] = language_id
+
+        # 4. Run Diarization (if requested and WAV exists)
+        speaker_turns, diarization_key = None, None
         if do_diarize and wav_file_path and os.path.exists(wav_file_path):
-            speaker_turns = run_diarization(wav_file_path, hf_token)
+            speaker_turns, diarization_key = store.json_stage(
+                "diarization", diarization_config(wav_file_path), [pcm_key],
+                lambda: run_diarization(wav_file_path, hf_token))
             if speaker_turns is None:
                  logging.warning("Diarization failed or was skipped. Speaker labels will be 'Unknown'.")
 
-        # 3. Align Transcription and Diarization
-        final_segments = align_transcription_diarization(transcription_segments, speaker_turns)
-
-        # 4. Format output (convert seconds to HH:MM:SS.ms if needed by frontend, but keep seconds for processing)
-        output_data = []
-        for seg in final_segments:
-            # Keep seconds for internal use, format for display later if needed
-            output_data.append({
-                "start_seconds": seg["start"],
-                "end_seconds": seg["end"],
-                "text": seg["text"],
-                "speaker": seg.get("speaker", "Unknown"),
-                "words": seg.get("words", []) # Include word timestamps
-            })
+        # 5. Align Transcription and Diarization
+        final_segments, _ = store.json_stage(
+            "aligned", {}, [asr_key, diarization_key],
+            lambda: align_transcription_diarization(copy.deepcopy(asr["segments"]), speaker_turns))
+        # 6. Waveform peaks for the player (waveform_peaks.py): coarse levels inline, sidecar file on request
+        if wav_file_path and waveform_enabled():
+            try:
+                peaks_path, _ = store.file_stage(
+                    "peaks", {"samples_per_peak": list(SAMPLES_PER_PEAK), "bits": 8}, [pcm_key],
+                    lambda path: write_peaks(path, peaks_from_wav(wav_file_path)) is not None, "peaks")
+                if peaks_path:
+                    sidecar = None
+                    if sidecar_enabled() if waveform_sidecar is None else waveform_sidecar:
+                        sidecar = os.path.splitext(output_json_file[:-3] if output_json_file.endswith(".gz") else output_json_file)[0] + ".peaks"
+                        shutil.copyfile(peaks_path, sidecar)
+                    extra["waveform"] = waveform_summary(peaks_path, sidecar and os.path.basename(sidecar))
+            except Exception as e:
+                logging.warning(f"Could not compute waveform peaks: {e}")
+        if store.persistent:
+            extra["artifacts"] = {"reused": store.hits, "computed": store.misses}
 
         # --- Retrieve Captured Logs ---
-        log_stream.seek(0)
-        metrics = log_stream.read().splitlines()
+        if metrics is None:
+            log_stream.seek(0)
+            metrics = log_stream.read().splitlines()
         # --- End Retrieve Captured Logs ---
 
-        # 5. Save output JSON
+        # 7. Save output JSON (shared schema, see transcript_output.py)
         try:
-            with open(output_json_file, 'w', encoding='utf-8') as f:
-                json.dump({"transcription": output_data, "metrics": metrics}, f, indent=2, ensure_ascii=False)
+            write_transcript(output_json_file, final_segments, source="whisper", language=language, metrics=metrics, **extra)
             logging.info(f"Transcription saved to {output_json_file}")
         except Exception as e:
             logging.error(f"Failed to write output JSON: {e}")
-            sys.exit(1)
+            return False
+        if checkpoint is not None:
+            checkpoint.discard() # The transcript (and ASR artifact) now hold the segments
+        return True
+    finally:
+        if checkpoint is not None:
+            checkpoint.release() # Kept (unlocked) for a resume unless discarded above
+        # Clean up temporary directory and file
+        try:
+            workspace.close()
+            logging.info("Cleaned up scratch workspace.")
+        except Exception as e:
+            logging.error(f"Error cleaning up scratch workspace: {e}")
+
+def main():
+    input_file = args.input
+    output_json_file = args.output_json
+    do_diarize = args.diarize
+    hf_token = args.hf_token or os.environ.get('HUGGING_FACE_TOKEN')
+
+    # Respect the CPU thread share when launched by job_scheduler.py
+    from model_loader import apply_thread_budget
+    apply_thread_budget()
+    if args.word_timestamps:
+        os.environ["WHISPER_WORD_TIMESTAMPS"] = "1"
+
+    if not os.path.exists(input_file):
+        logging.error(f"Input file not found: {input_file}")
+        sys.exit(1)
 
+    from profiling import profile_base, profile_run, profiling_requested
+    try:
+        with profile_run(profile_base(output_json_file), profiling_requested(args.profile)):
+            ok = transcribe_file(input_file, output_json_file, do_diarize, hf_token,
+                                 progressive=args.progressive, redecode=args.redecode,
+                                 artifacts=False if args.no_artifacts else None, restart=args.restart,
+                                 dedupe=True if args.dedupe else None,
+                                 waveform_sidecar=True if args.waveform_sidecar else None)
+        if not ok:
+            sys.exit(1)
     except Exception as e:
         logging.error(f"An error occurred in the main process: {e}", exc_info=True)
         sys.exit(1)
-    finally:
-        # Clean up temporary directory and file
-        if temp_dir:
-            try:
-                temp_dir.cleanup()
-                logging.info("Cleaned up temporary directory.")
-            except Exception as e:
-                logging.error(f"Error cleaning up temporary directory: {e}")
 
 if __name__ == "__main__":
+    args = parser.parse_args()
     main()
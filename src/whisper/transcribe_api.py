@@ -1,9 +1,7 @@
 import sys
 import json
 from faster_whisper import WhisperModel
-from datetime import timedelta
 import os
-import tempfile
 import subprocess
 import mimetypes
 import whisper
@@ -12,6 +10,7 @@ import torch
 import warnings
 import io
 import numpy as np # Needed for pyannote processing
+from transcript_output import dumps, build_document, print_transcript
 
 # Set default encoding to UTF-8
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -35,12 +34,6 @@ warnings.filterwarnings("ignore", category=UserWarning, module='whisper.transcri
 # Suppress specific Hugging Face warnings if they appear
 warnings.filterwarnings("ignore", message="Using 'chunk_length_s' is deprecated")
 
-# Helper: Convert seconds to HH:MM:SS format
-def format_time(seconds):
-    # Round to nearest second
-    seconds = round(seconds)
-    return str(timedelta(seconds=seconds))
-
 def check_file_type(file_path):
     """
     Check if a file is audio or video by examining its contents.
@@ -81,13 +74,17 @@ def check_file_type(file_path):
         else:
             return 'unknown'
 
-def extract_audio_from_video(video_path):
+def extract_audio_from_video(video_path, workspace):
     """
-    Extract audio from a video file and return the path to the audio file.
-    Requires ffmpeg to be installed.
+    Extract audio from a video file into the job's scratch workspace and return
+    the path to the audio file. Requires ffmpeg to be installed.
     """
-    # Create a temporary file for the audio
-    audio_path = os.path.join(tempfile.gettempdir(), f"audio-{os.path.basename(video_path)}.wav")
+    from scratch import ScratchFull, estimate_pcm_bytes
+    try:
+        audio_path = workspace.path(f"audio-{os.path.basename(video_path)}.wav", reserve=estimate_pcm_bytes(video_path))
+    except ScratchFull as e:
+        print(f"Not enough scratch space to extract audio: {e}", file=sys.stderr)
+        return None
     
     try:
         print(f"Extracting audio from {video_path} to {audio_path}", file=sys.stderr)
@@ -119,9 +116,14 @@ def extract_audio_from_video(video_path):
         return None
 
 def transcribe_media(file_path, enable_diarization=False):
+    from scratch import scratch_workspace
+    # Private per-job directory: concurrent uploads with the same name don't collide
+    with scratch_workspace("transcribe-api") as workspace:
+        return _transcribe_media(file_path, workspace, enable_diarization)
+
+def _transcribe_media(file_path, workspace, enable_diarization=False):
     file_extension = os.path.splitext(file_path)[1].lower()
     audio_path = file_path
-    temp_audio_created = False
     
     # Check the actual content type of the file
     print(f"Analyzing file type of {file_path}", file=sys.stderr)
@@ -132,8 +134,7 @@ def transcribe_media(file_path, enable_diarization=False):
     if file_extension == '.webm':
         if file_type == 'video':
             print(f"WebM file contains video, extracting audio...", file=sys.stderr)
-            audio_path = extract_audio_from_video(file_path)
-            temp_audio_created = audio_path is not None
+            audio_path = extract_audio_from_video(file_path, workspace)
             if not audio_path:
                 print(json.dumps({"error": "Failed to extract audio from WebM video"}), file=sys.stderr)
                 return False
@@ -142,8 +143,7 @@ def transcribe_media(file_path, enable_diarization=False):
     # Handle regular video files
     elif file_type == 'video' or file_extension in ['.mp4', '.avi', '.mov', '.mkv']:
         print(f"Extracting audio from video file {file_path}", file=sys.stderr)
-        audio_path = extract_audio_from_video(file_path)
-        temp_audio_created = audio_path is not None
+        audio_path = extract_audio_from_video(file_path, workspace)
         
         if not audio_path:
             print(json.dumps({"error": "Failed to extract audio from video"}), file=sys.stderr)
@@ -155,15 +155,18 @@ def transcribe_media(file_path, enable_diarization=False):
     if enable_diarization:
         print("Speaker diarization is disabled in this version", file=sys.stderr)
 
-    # Load Whisper model (consider loading only once if possible for performance)
-    model_size = os.environ.get("WHISPER_MODEL_SIZE") 
-    # Use "cpu" if CUDA is not available or causing issues
-    device_type = os.environ.get("WHISPER_DEVICE_TYPE")
-    compute_type = os.environ.get("WHISPER_COMPUTE_TYPE") # Use "int8" or "float32" if float16 causes issues
+    # Load Whisper model: WHISPER_* env vars, then the autotune.py profile, then defaults
+    from model_loader import whisper_beam_size, whisper_config
+    config = whisper_config()
+    model_size = config["model_size"]
+    device_type = config["device"]
+    compute_type = config["compute_type"]
+    beam_size = whisper_beam_size()
 
     try:
         print(f"Loading whisper model: {model_size} on {device_type}", file=sys.stderr)
-        model = WhisperModel(model_size, device=device_type, compute_type=compute_type)
+        model = WhisperModel(model_size, device=device_type, compute_type=compute_type,
+                             cpu_threads=config["cpu_threads"], num_workers=config["num_workers"])
     except Exception as e:
         print(f"Error loading model on {device_type}: {e}", file=sys.stderr)
         # Fallback to CPU if CUDA fails
@@ -174,10 +177,15 @@ def transcribe_media(file_path, enable_diarization=False):
              print(f"Fatal error loading model on CPU: {e_cpu}", file=sys.stderr)
              sys.exit(1)
 
+    # Spoken language, identified once from sampled speech windows and forced for decoding
+    from language_id import identify_media_language, language_of
+    language_id = identify_media_language(audio_path, model)
+    language = language_of(language_id)
+
     # Transcribe audio
     try:
         print(f"Starting transcription of {audio_path}", file=sys.stderr)
-        segments_gen, _ = model.transcribe(audio_path, beam_size=5) # Added beam_size
+        segments_gen, _ = model.transcribe(audio_path, beam_size=beam_size, language=language)
     except Exception as e:
         print(f"Error during transcription: {e}", file=sys.stderr)
         sys.exit(1)
@@ -189,11 +197,9 @@ def transcribe_media(file_path, enable_diarization=False):
         for segment in segments_gen:
             segment_count += 1
             output.append({
-                "start": format_time(segment.start),
-                "end": format_time(segment.end),
-                "start_seconds": round(segment.start),  # Round to whole seconds
-                "end_seconds": round(segment.end),      # Round to whole seconds
-                "text": segment.text.strip() # Strip leading/trailing whitespace
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text # Stripped by the output layer
             })
     except Exception as e:
         print(f"Error processing segments: {e}", file=sys.stderr)
@@ -208,26 +214,14 @@ def transcribe_media(file_path, enable_diarization=False):
         print(f"Warning: No transcription was generated. The audio might be empty or too short.", file=sys.stderr)
         # Create a single empty segment to avoid errors in the frontend
         output.append({
-            "start": "00:00",
-            "end": "00:01",
-            "start_seconds": 0,
-            "end_seconds": 1,
+            "start": 0,
+            "end": 1,
             "text": "(No speech detected)"
         })
 
-    result_json = json.dumps(output, indent=2, ensure_ascii=False)
-
-    # Clean up temporary audio file if created
-    if temp_audio_created:
-        try:
-            os.remove(audio_path)
-        except Exception as e:
-            print(f"Error cleaning up temporary audio file: {e}", file=sys.stderr)
-                
-    return result_json
-
-def format_timestamp(seconds):
-    return str(timedelta(seconds=round(seconds)))
+    # The extracted audio is removed with the scratch workspace
+    extra = {"language_id": language_id} if language_id else {}
+    return dumps(build_document(output, source="whisper", language=language, **extra)).decode("utf-8")
 
 def transcribe_and_diarize(file_path, diarize_flag):
     """
@@ -244,9 +238,12 @@ def transcribe_and_diarize(file_path, diarize_flag):
         model = whisper.load_model(model_size, device=device)
         # print("Whisper model loaded.", file=sys.stderr)
 
-        # Perform transcription with word timestamps
+        # Segment-level by default; word timestamps on demand via word_alignment.py
         # print(f"Starting transcription for: {file_path}", file=sys.stderr)
-        result = model.transcribe(file_path, word_timestamps=True, fp16=torch.cuda.is_available())
+        from language_id import forced_language
+        from model_loader import word_timestamps_enabled
+        result = model.transcribe(file_path, word_timestamps=word_timestamps_enabled(), fp16=torch.cuda.is_available(),
+                                  language=forced_language())
         # print("Transcription finished.", file=sys.stderr)
 
         diarization = None
@@ -325,16 +322,14 @@ def transcribe_and_diarize(file_path, diarize_flag):
                                 "word": word_text,
                                 "start": word_start,
                                 "end": word_end,
-                                "start_formatted": format_timestamp(word_start),
-                                "end_formatted": format_timestamp(word_end),
+                                "probability": word_info.get('probability'),
                             })
 
 
+                # Raw segment; timestamps are rounded/formatted by the output layer
                 processed_segments.append({
-                    "start_seconds": segment_start,
-                    "end_seconds": segment_end,
-                    "start": format_timestamp(segment_start),
-                    "end": format_timestamp(segment_end),
+                    "start": segment_start,
+                    "end": segment_end,
                     "text": segment_text,
                     "words": words_in_segment,
                     "speaker": speaker_label, # Assign determined or default speaker
@@ -347,10 +342,8 @@ def transcribe_and_diarize(file_path, diarize_flag):
              if full_text:
                  duration = result.get('duration', 0)
                  processed_segments.append({
-                     "start_seconds": 0,
-                     "end_seconds": duration,
-                     "start": format_timestamp(0),
-                     "end": format_timestamp(duration),
+                     "start": 0,
+                     "end": duration,
                      "text": full_text,
                      "words": [],
                      "speaker": "SPEAKER_00", # Default speaker
@@ -358,7 +351,8 @@ def transcribe_and_diarize(file_path, diarize_flag):
 
 
         # Include diarization error in the output if it occurred
-        output = {"transcription": processed_segments}
+        # The language Whisper settled on is reported with the transcript, for translation
+        output = {"transcription": processed_segments, "language": result.get("language")}
         if diarization_error:
             output["diarization_warning"] = diarization_error
 
@@ -375,16 +369,23 @@ if __name__ == "__main__":
     parser.add_argument('--file', type=str, required=True, help='Path to the media file.')
     # Keep diarize argument
     parser.add_argument('--diarize', action='store_true', help='Enable speaker diarization.')
+    parser.add_argument('--profile', action='store_true', help='Profile this run (cProfile + tracemalloc); results are saved next to the input file.')
 
     args = parser.parse_args()
 
+    # Respect the CPU thread share when launched by job_scheduler.py
+    from model_loader import apply_thread_budget
+    apply_thread_budget()
+
     if not os.path.exists(args.file):
         # Output error as JSON
         print(json.dumps({"error": f"File not found: {args.file}"}))
         sys.exit(1)
 
-    # Perform transcription and diarization
-    result_data = transcribe_and_diarize(args.file, args.diarize)
+    # Perform transcription and diarization (output goes to stdout, so a profile is saved next to the input)
+    from profiling import profile_base, profile_run, profiling_requested
+    with profile_run(profile_base(args.file), profiling_requested(args.profile)):
+        result_data = transcribe_and_diarize(args.file, args.diarize)
 
     # Check if the result indicates an error from the function
     if "error" in result_data:
@@ -392,7 +393,8 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Output the final result (transcription and optional warning) as JSON
-    print(json.dumps(result_data.get("transcription", []), ensure_ascii=False, indent=2))
+    extra = {"diarization_warning": result_data["diarization_warning"]} if "diarization_warning" in result_data else {}
+    print_transcript(result_data.get("transcription", []), source="whisper", language=result_data.get("language"), **extra)
     # Optionally print warning to stderr if it exists, so it doesn't interfere with JSON stdout
     if "diarization_warning" in result_data:
         print(f"Diarization Warning: {result_data['diarization_warning']}", file=sys.stderr)
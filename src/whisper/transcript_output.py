@@ -0,0 +1,220 @@
+import gzip
+import io
+import json
+import sys
+
+import numpy as np
+
+# Optional fast JSON encoder
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# Shared output layer for every transcription entry point.
+#
+# All producers (transcribe.py, transcribe_api.py, youtubeapi.py) hand over "raw"
+# segments - dicts with numeric `start`/`end` seconds, `text` and optionally
+# `speaker` and `words` - and this module turns them into one schema:
+#
+#   {
+#     "schema_version": 1,
+#     "source": "whisper" | "youtube" | ...,
+#     "language": "en" | null,
+#     "transcription": [
+#       {"start": "00:00:01.240", "end": "00:00:03.500",
+#        "start_seconds": 1.24, "end_seconds": 3.5,
+#        "text": "...", "speaker": "SPEAKER_00" | null,
+#        "words": [{"word": "...", "start": 1.24, "end": 1.5, "probability": 0.98}],
+#        "id": 3, "revision": 1}      (id/revision only for progressive runs)
+#     ],
+#     "metrics": [...]            (optional)
+#     <extra top-level fields>    (optional, e.g. diarization_warning)
+#   }
+#
+# Seconds are rounded to milliseconds and the HH:MM:SS.mmm strings are computed
+# for a whole batch of segments at once with NumPy instead of per segment/word.
+
+SCHEMA_VERSION = 1
+TIME_DECIMALS = 3
+STREAM_BATCH_SIZE = 256 # Segments formatted/encoded per batch when streaming
+OPTIONAL_SEGMENT_KEYS = ("id", "revision")
+
+
+# --- Timestamps ---
+
+def format_timestamps(seconds):
+    """Formats an array of seconds as HH:MM:SS.mmm strings in one vectorized pass."""
+    millis = np.rint(np.maximum(np.asarray(seconds, dtype=np.float64), 0) * 1000).astype(np.int64)
+    total_seconds, ms = np.divmod(millis, 1000)
+    minutes, s = np.divmod(total_seconds, 60)
+    h, m = np.divmod(minutes, 60)
+    out = np.char.zfill(h.astype(str), 2)
+    for part, width in ((m, 2), (s, 2)):
+        out = np.char.add(np.char.add(out, ":"), np.char.zfill(part.astype(str), width))
+    out = np.char.add(np.char.add(out, "."), np.char.zfill(ms.astype(str), 3))
+    return out.tolist()
+
+def format_timestamp(seconds):
+    """Single-value version of format_timestamps (same output)."""
+    return format_timestamps([seconds])[0]
+
+
+# --- Schema ---
+
+def build_segments(raw_segments):
+    """Converts raw producer segments into schema segments (batched rounding/formatting)."""
+    raw_segments = list(raw_segments)
+    if not raw_segments:
+        return []
+
+    bounds = np.round(np.array([(s["start"], s["end"]) for s in raw_segments], dtype=np.float64), TIME_DECIMALS)
+    formatted = format_timestamps(bounds.ravel())
+    bounds = bounds.tolist()
+
+    # Word times are rounded in one pass over all words of the batch
+    word_lists = [s.get("words") or [] for s in raw_segments]
+    all_words = [w for words in word_lists for w in words]
+    if all_words:
+        word_bounds = np.round(np.array([(w["start"], w["end"]) for w in all_words], dtype=np.float64), TIME_DECIMALS).tolist()
+    word_index = 0
+
+    segments = []
+    for index, (raw, words) in enumerate(zip(raw_segments, word_lists)):
+        out_words = []
+        for word in words:
+            word_start, word_end = word_bounds[word_index]
+            word_index += 1
+            out_words.append({
+                "word": word["word"].strip(),
+                "start": word_start,
+                "end": word_end,
+                "probability": None if word.get("probability") is None else float(word["probability"]),
+            })
+        segment = {
+            "start": formatted[2 * index],
+            "end": formatted[2 * index + 1],
+            "start_seconds": bounds[index][0],
+            "end_seconds": bounds[index][1],
+            "text": raw["text"].strip(),
+            "speaker": raw.get("speaker"),
+            "words": out_words,
+        }
+        # Progressive transcription (progressive_transcribe.py) tracks segment identity
+        for key in OPTIONAL_SEGMENT_KEYS:
+            if key in raw:
+                segment[key] = raw[key]
+        segments.append(segment)
+    return segments
+
+def build_document(raw_segments, source, language=None, metrics=None, **extra):
+    """Builds the full output document for a list of raw segments."""
+    document = _envelope(source, language, extra)
+    document["transcription"] = build_segments(raw_segments)
+    if metrics is not None:
+        document["metrics"] = list(metrics)
+    return document
+
+def _envelope(source, language, extra):
+    document = {"schema_version": SCHEMA_VERSION, "source": source, "language": language}
+    document.update(extra)
+    return document
+
+
+# --- Encoding ---
+
+def dumps(obj):
+    """Compact JSON encoding to UTF-8 bytes (orjson when installed)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _open_binary(target, compress):
+    """Returns (binary file, should_close) for a path or an open file object."""
+    if isinstance(target, (str, bytes)) or hasattr(target, "__fspath__"):
+        path = str(target)
+        if compress is None:
+            compress = path.endswith(".gz")
+        return (gzip.open(path, "wb", compresslevel=6) if compress else open(path, "wb")), True
+    if isinstance(target, io.TextIOBase):
+        target.flush()
+        target = target.buffer
+    if compress:
+        return gzip.GzipFile(fileobj=target, mode="wb", compresslevel=6), True
+    return target, False
+
+
+class TranscriptWriter:
+    """
+    Streams a transcript document to a file as segments arrive, so large
+    transcripts never have to be held or encoded as one object. Segments are
+    buffered and formatted in batches of STREAM_BATCH_SIZE.
+    """
+
+    def __init__(self, target, source, language=None, compress=None, **extra):
+        self.file, self._close_file = _open_binary(target, compress)
+        self.pending = []
+        self.count = 0
+        head = dumps(_envelope(source, language, extra))
+        self.file.write(head[:-1] + b',"transcription":[')
+
+    def add(self, raw_segment):
+        self.pending.append(raw_segment)
+        if len(self.pending) >= STREAM_BATCH_SIZE:
+            self.flush()
+
+    def extend(self, raw_segments):
+        for raw_segment in raw_segments:
+            self.add(raw_segment)
+
+    def flush(self):
+        if not self.pending:
+            return
+        encoded = [dumps(segment) for segment in build_segments(self.pending)]
+        self.file.write((b"," if self.count else b"") + b",".join(encoded))
+        self.count += len(self.pending)
+        self.pending = []
+
+    def close(self, metrics=None):
+        self.flush()
+        self.file.write(b"]")
+        if metrics is not None:
+            self.file.write(b',"metrics":' + dumps(list(metrics)))
+        self.file.write(b"}")
+        if self._close_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._close_file:
+            self.file.close()
+
+
+def write_transcript(target, raw_segments, source, language=None, metrics=None, compress=None, **extra):
+    """
+    Writes raw segments as a schema document to a path or file object.
+    Paths ending in .gz are gzip-compressed unless `compress` says otherwise.
+    """
+    writer = TranscriptWriter(target, source, language=language, compress=compress, **extra)
+    try:
+        writer.extend(raw_segments)
+    except Exception:
+        if writer._close_file:
+            writer.file.close()
+        raise
+    writer.close(metrics=metrics)
+    return writer.count
+
+def print_transcript(raw_segments, source, language=None, metrics=None, **extra):
+    """Writes a schema document to stdout followed by a newline."""
+    write_transcript(sys.stdout, raw_segments, source, language=language, metrics=metrics, **extra)
+    sys.stdout.buffer.write(b"\n")
+    sys.stdout.flush()
@@ -0,0 +1,457 @@
+import argparse
+import json
+import os
+import sys
+import zipfile
+from datetime import timedelta
+
+import numpy as np
+
+from transcript_output import format_timestamp
+
+# Columnar transcript storage.
+#
+# The JSON transcripts written by transcribe.py / transcribe_api.py / youtubeapi.py
+# (see transcript_output.py, plus older files in their previous layouts) are lists of dicts where every word repeats its keys (and sometimes formatted
+# copies of its timestamps). This module packs the same data into flat NumPy
+# arrays inside an uncompressed .npz:
+#
+#   seg.<key>      one value per segment (float32 times, int32 ids, ...)
+#   word.<key>     one value per word, flattened across segments
+#   seg_word_offsets   segment i owns words [offsets[i], offsets[i+1])
+#   strings.offsets / strings.blob   shared UTF-8 string table
+#   header         JSON describing column kinds, key order and top-level metadata
+#
+# Because the archive is stored (not deflated), every member can be memory-mapped
+# straight from disk, so rendering or searching a transcript does not require
+# parsing the whole file. Conversion back to JSON is lossless: columns are only
+# narrowed to float32/float16 when the original values survive the round trip.
+
+FORMAT_VERSION = 1
+SEGMENT_CONTAINER_KEYS = ("transcription", "segments")
+
+
+# --- Timestamp formatters used by the existing entry points ---
+
+def format_clock(seconds):
+    """HH:MM:SS rounded to whole seconds (transcribe_api.format_timestamp)."""
+    return str(timedelta(seconds=round(seconds)))
+
+def format_srt(seconds):
+    """HH:MM:SS,mmm as written by youtubeapi.fetch_transcript."""
+    return f"{int(seconds // 3600):02}:{int((seconds % 3600) // 60):02}:{int(seconds % 60):02},{int((seconds % 1) * 1000):03}"
+
+TIME_FORMATTERS = {
+    "hms_ms": format_timestamp,  # transcript_output schema
+    "clock": format_clock,
+    "srt": format_srt,
+}
+
+
+# --- Column packing helpers ---
+
+def _decimal_roundtrip(packed):
+    """Decode a narrow float array via its shortest decimal representation."""
+    return packed.astype(str).astype(np.float64)
+
+def _pack_floats(values, candidates, exact=True):
+    """Packs floats into the narrowest candidate dtype that restores them exactly."""
+    original = np.asarray(values, dtype=np.float64)
+    if not exact:
+        packed = original.astype(candidates[0])
+        return packed, "decimal" if packed.dtype == np.float32 else "binary"
+    for dtype in candidates:
+        packed = original.astype(dtype)
+        if np.array_equal(packed.astype(np.float64), original):
+            return packed, "binary"
+        if np.array_equal(_decimal_roundtrip(packed), original):
+            return packed, "decimal"
+    return original, "binary"
+
+def _pack_ints(values):
+    original = np.asarray(values, dtype=np.int64)
+    if original.size == 0 or (original.min() >= -2**31 and original.max() < 2**31):
+        return original.astype(np.int32)
+    return original
+
+def _unpack_floats(array, decode):
+    if decode == "decimal":
+        return _decimal_roundtrip(np.asarray(array)).tolist()
+    return np.asarray(array, dtype=np.float64).tolist()
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _StringTable:
+    """Deduplicating UTF-8 string table shared by all string columns."""
+
+    def __init__(self):
+        self.ids = {}
+        self.encoded = []
+
+    def add(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = len(self.encoded)
+            self.ids[text] = string_id
+            self.encoded.append(text.encode("utf-8"))
+        return string_id
+
+    def arrays(self):
+        lengths = np.fromiter((len(b) for b in self.encoded), dtype=np.int64, count=len(self.encoded))
+        offsets = np.zeros(len(self.encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        blob = np.frombuffer(b"".join(self.encoded), dtype=np.uint8)
+        return offsets, blob
+
+
+def _time_source_key(key, records):
+    """Finds the numeric key a formatted timestamp string is derived from."""
+    candidates = [f"{key}_seconds"]
+    if key.endswith("_formatted"):
+        candidates.append(key[: -len("_formatted")])
+    for candidate in candidates:
+        if records and all(_is_number(r.get(candidate)) for r in records):
+            return candidate
+    return None
+
+def _encode_columns(prefix, records, keys, strings, arrays, exact):
+    """Encodes a list of uniform dicts into arrays; returns per-key column specs."""
+    specs = {}
+    for key in keys:
+        values = [r[key] for r in records]
+        name = f"{prefix}.{key}"
+
+        # Nulls (e.g. unknown speaker, missing probability) are stored as positions
+        null_positions = [i for i, v in enumerate(values) if v is None]
+        present = [v for v in values if v is not None]
+        if values and not present:
+            specs[key] = {"kind": "null"}
+            continue
+        null_set = set(null_positions)
+        if null_positions:
+            placeholder = 0 if _is_number(present[0]) else ""
+            values = [placeholder if v is None else v for v in values]
+            arrays[f"{name}.null_positions"] = np.asarray(null_positions, dtype=np.int64)
+
+        if values and all(_is_number(v) for v in values):
+            if all(isinstance(v, int) for v in values):
+                arrays[name] = _pack_ints(values)
+                specs[key] = {"kind": "int"}
+            else:
+                candidates = (np.float16, np.float32) if key == "probability" else (np.float32,)
+                arrays[name], decode = _pack_floats(values, candidates, exact)
+                spec = {"kind": "float", "decode": decode}
+                int_positions = [i for i, v in enumerate(values) if isinstance(v, int) and i not in null_set]
+                if int_positions:
+                    arrays[f"{name}.int_positions"] = np.asarray(int_positions, dtype=np.int64)
+                    spec["int_positions"] = True
+                specs[key] = spec
+        elif all(isinstance(v, str) for v in values):
+            source = _time_source_key(key, records)
+            style = None
+            if source is not None:
+                for style_name, formatter in TIME_FORMATTERS.items():
+                    if all(formatter(r[source]) == r[key] for r in records):
+                        style = style_name
+                        break
+            if style is not None:
+                specs[key] = {"kind": "time", "source": source, "style": style}
+            elif key == "speaker":
+                categories = list(dict.fromkeys(values))
+                lookup = {c: i for i, c in enumerate(categories)}
+                arrays[name] = np.asarray([lookup[v] for v in values], dtype=np.int16)
+                specs[key] = {"kind": "category", "categories": categories}
+            else:
+                arrays[name] = np.asarray([strings.add(v) for v in values], dtype=np.uint32)
+                specs[key] = {"kind": "string"}
+        else:
+            raise ValueError(f"Unsupported values in column '{name}' (expected all numbers or all strings)")
+        if null_positions:
+            specs[key]["nulls"] = True
+    return specs
+
+def _record_keys(records, label):
+    """Returns the shared key order of a list of dicts, or raises if they differ."""
+    if not records:
+        return []
+    keys = list(records[0].keys())
+    key_set = set(keys)
+    for index, record in enumerate(records):
+        if set(record.keys()) != key_set:
+            raise ValueError(f"{label} {index} has keys {sorted(record.keys())}, expected {sorted(keys)}")
+    return keys
+
+
+# --- Encoding ---
+
+def encode_transcript(data, exact=True):
+    """
+    Converts a transcript JSON object (any of the shapes produced by the entry
+    points) into a dict of NumPy arrays. With exact=False, times are always
+    stored as float32 and probabilities as float16, even if that loses precision.
+    """
+    if isinstance(data, list):
+        container, segments, top_level = None, data, {}
+    elif isinstance(data, dict):
+        container = next((k for k in SEGMENT_CONTAINER_KEYS if isinstance(data.get(k), list)), None)
+        if container is None:
+            raise ValueError(f"No segment list found (looked for {', '.join(SEGMENT_CONTAINER_KEYS)})")
+        segments = data[container]
+        top_level = {k: v for k, v in data.items() if k != container}
+    else:
+        raise ValueError("Transcript must be a list of segments or an object containing one")
+
+    segment_keys = _record_keys(segments, "Segment")
+    has_words = "words" in segment_keys
+    segment_value_keys = [k for k in segment_keys if k != "words"]
+
+    words = []
+    word_counts = np.zeros(len(segments), dtype=np.int64)
+    if has_words:
+        for index, segment in enumerate(segments):
+            words.extend(segment["words"])
+            word_counts[index] = len(segment["words"])
+    word_keys = _record_keys(words, "Word")
+
+    strings = _StringTable()
+    arrays = {}
+    segment_specs = _encode_columns("seg", segments, segment_value_keys, strings, arrays, exact)
+    word_specs = _encode_columns("word", words, word_keys, strings, arrays, exact)
+
+    offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+    np.cumsum(word_counts, out=offsets[1:])
+    arrays["seg_word_offsets"] = offsets
+    arrays["strings.offsets"], arrays["strings.blob"] = strings.arrays()
+
+    # Youtube output repeats the joined segment text at the top level
+    derived_text = (
+        "text" in top_level and "text" in segment_specs
+        and top_level["text"] == " ".join(s["text"] for s in segments)
+    )
+    header = {
+        "version": FORMAT_VERSION,
+        "container": container,
+        "top_level_keys": list(data.keys()) if isinstance(data, dict) else None,
+        "top_level": {k: v for k, v in top_level.items() if not (derived_text and k == "text")},
+        "derived_text": derived_text,
+        "segment_count": len(segments),
+        "word_count": len(words),
+        "segment_keys": segment_keys,
+        "word_keys": word_keys,
+        "segment_columns": segment_specs,
+        "word_columns": word_specs,
+    }
+    arrays["header"] = np.frombuffer(json.dumps(header, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+    return arrays
+
+def save_columnar(data, path, exact=True):
+    """Writes a transcript JSON object to an uncompressed (memory-mappable) .npz."""
+    arrays = encode_transcript(data, exact=exact)
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+    return path
+
+
+# --- Decoding ---
+
+def _mmap_npz(path):
+    """Memory-maps every member of an uncompressed .npz file."""
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as raw:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"Member '{info.filename}' is compressed and cannot be memory-mapped")
+            # Local file header: 30 fixed bytes + file name + extra field
+            raw.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(raw.read(4), dtype="<u2")
+            raw.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(raw)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(raw)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(raw)
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if dtype.hasobject:
+                raise ValueError(f"Member '{name}' holds Python objects and cannot be memory-mapped")
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=raw.tell(),
+                                         shape=shape, order="F" if fortran_order else "C")
+    return arrays
+
+
+class ColumnarTranscript:
+    """Read access to a columnar transcript without materialising the JSON."""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.header = json.loads(bytes(np.asarray(arrays["header"])).decode("utf-8"))
+        if self.header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar transcript version: {self.header.get('version')}")
+        self.string_offsets = arrays["strings.offsets"]
+        self.string_blob = arrays["strings.blob"]
+        self.word_offsets = arrays["seg_word_offsets"]
+
+    def __len__(self):
+        return self.header["segment_count"]
+
+    def string(self, string_id):
+        start, end = self.string_offsets[string_id], self.string_offsets[string_id + 1]
+        return bytes(self.string_blob[start:end]).decode("utf-8")
+
+    def column(self, level, key):
+        """Returns the raw array behind a numeric/id column (e.g. ('word', 'start'))."""
+        return self.arrays[f"{'seg' if level == 'segment' else level}.{key}"]
+
+    def words_in(self, index):
+        """Slice bounds of the words belonging to segment `index`."""
+        return int(self.word_offsets[index]), int(self.word_offsets[index + 1])
+
+    def segment_at(self, seconds):
+        """Index of the segment covering `seconds` (binary search on segment starts)."""
+        columns = self.header["segment_columns"]
+        # Same precedence as the writer's time columns: "start_seconds", else run_whisper's "start"
+        key = next((k for k in ("start_seconds", "start") if columns.get(k, {}).get("kind") in ("int", "float")), None)
+        if key is None:
+            raise KeyError("Transcript has no numeric segment start column ('start_seconds' or 'start')")
+        starts = np.asarray(self.column("segment", key))
+        return max(int(np.searchsorted(starts, seconds, side="right")) - 1, 0)
+
+    def find_word(self, word):
+        """Indices of words whose text equals `word`, found without decoding other words."""
+        encoded = word.encode("utf-8")
+        lengths = np.diff(self.string_offsets)
+        matches = [i for i in np.flatnonzero(lengths == len(encoded)) if self.string(i) == word]
+        if not matches or "word" not in self.header["word_columns"]:
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(np.isin(self.column("word", "word"), matches))
+
+    def _decode_columns(self, prefix, specs, count, start=0, stop=None):
+        stop = count if stop is None else stop
+        columns = {}
+        for key, spec in specs.items():
+            if spec["kind"] == "time":
+                continue
+            if spec["kind"] == "null":
+                columns[key] = [None] * (stop - start)
+                continue
+            array = self.arrays[f"{prefix}.{key}"][start:stop]
+            if spec["kind"] == "int":
+                columns[key] = np.asarray(array, dtype=np.int64).tolist()
+            elif spec["kind"] == "float":
+                values = _unpack_floats(array, spec["decode"])
+                if spec.get("int_positions"):
+                    positions = np.asarray(self.arrays[f"{prefix}.{key}.int_positions"])
+                    for position in positions[(positions >= start) & (positions < stop)]:
+                        values[position - start] = int(values[position - start])
+                columns[key] = values
+            elif spec["kind"] == "category":
+                categories = spec["categories"]
+                columns[key] = [categories[c] for c in np.asarray(array)]
+            else:
+                columns[key] = [self.string(int(i)) for i in np.asarray(array)]
+            if spec.get("nulls"):
+                positions = np.asarray(self.arrays[f"{prefix}.{key}.null_positions"])
+                for position in positions[(positions >= start) & (positions < stop)]:
+                    columns[key][position - start] = None
+        for key, spec in specs.items():
+            if spec["kind"] == "time":
+                formatter = TIME_FORMATTERS[spec["style"]]
+                columns[key] = [formatter(v) for v in columns[spec["source"]]]
+        return columns
+
+    def segments(self, start=0, stop=None):
+        """Decodes segments [start, stop) back into the original dict layout."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        header = self.header
+        segment_columns = self._decode_columns("seg", header["segment_columns"], len(self), start, stop)
+        has_words = "words" in header["segment_keys"]
+        if has_words and stop > start:
+            word_start, word_stop = int(self.word_offsets[start]), int(self.word_offsets[stop])
+            word_columns = self._decode_columns("word", header["word_columns"], header["word_count"], word_start, word_stop)
+        result = []
+        for index in range(start, stop):
+            segment = {}
+            for key in header["segment_keys"]:
+                if key == "words":
+                    lo, hi = self.words_in(index)
+                    lo, hi = lo - word_start, hi - word_start
+                    segment["words"] = [
+                        {k: word_columns[k][i] for k in header["word_keys"]} for i in range(lo, hi)
+                    ]
+                else:
+                    segment[key] = segment_columns[key][index - start]
+            result.append(segment)
+        return result
+
+    def to_json(self):
+        """Reconstructs the exact JSON object the transcript was encoded from."""
+        segments = self.segments()
+        header = self.header
+        if header["container"] is None:
+            return segments
+        data = {}
+        for key in header["top_level_keys"]:
+            if key == header["container"]:
+                data[key] = segments
+            elif key == "text" and header["derived_text"]:
+                data[key] = " ".join(s["text"] for s in segments)
+            else:
+                data[key] = header["top_level"][key]
+        return data
+
+
+def load_columnar(path, mmap=True):
+    """Opens a columnar transcript, memory-mapping its arrays by default."""
+    if mmap:
+        return ColumnarTranscript(_mmap_npz(path))
+    with np.load(path) as archive:
+        return ColumnarTranscript({name: archive[name] for name in archive.files})
+
+
+# --- Converters ---
+
+def json_to_columnar(json_path, npz_path, exact=True):
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return save_columnar(data, npz_path, exact=exact)
+
+def columnar_to_json(npz_path, json_path):
+    data = load_columnar(npz_path).to_json()
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return json_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert transcripts between JSON and the columnar .npz format.')
+    parser.add_argument('--input', required=True, help='Input transcript (.json or .npz).')
+    parser.add_argument('--output', required=True, help='Output path (.npz or .json).')
+    parser.add_argument('--lossy', action='store_true', help='Always use float32 times / float16 probabilities.')
+    parser.add_argument('--verify', action='store_true', help='Check that the conversion round-trips exactly.')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"ERROR: Input file not found: {args.input}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.input.endswith(".npz"):
+            columnar_to_json(args.input, args.output)
+        else:
+            json_to_columnar(args.input, args.output, exact=not args.lossy)
+            if args.verify:
+                with open(args.input, "r", encoding="utf-8") as f:
+                    original = json.load(f)
+                restored = load_columnar(args.output).to_json()
+                if json.dumps(original) != json.dumps(restored):
+                    print("ERROR: Round trip mismatch", file=sys.stderr)
+                    sys.exit(1)
+                print("Round trip verified.", file=sys.stderr)
+        print(f"Written {args.output} ({os.path.getsize(args.output)} bytes, input {os.path.getsize(args.input)} bytes)", file=sys.stderr)
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
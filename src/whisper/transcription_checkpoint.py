@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import time
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError: # Windows: concurrent runs of one key are not detected
+    FCNTL_AVAILABLE = False
+
+# Checkpoints for long transcriptions.
+#
+# run_whisper appends every decoded segment to a JSON-lines file as it is
+# emitted, so a process that dies 80 minutes into a 3-hour file (OOM, deploy,
+# the Node route's timeout) loses at most the segment in flight. The file is
+# keyed by the media hash and the ASR settings; a restart with the same input
+# finds it and resumes decoding at the end of the last committed segment,
+# with the detected language and the last committed text as prompt context.
+#
+#   {"type": "header", "language": "en", "duration": 10800.0}
+#   {"type": "segment", "segment": {...}, "offset": 4812.4}
+#
+# The checkpoint is deleted once the transcript has been written. While a run
+# uses it, it holds an exclusive flock on the .jsonl; a concurrent run of the
+# same key gets CheckpointLocked and transcribes without a checkpoint instead
+# of interleaving its segments with the first run's.
+
+CHECKPOINT_DIR = os.environ.get("WHISPER_CHECKPOINT_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "sonicseeker", "checkpoints")
+SYNC_INTERVAL = float(os.environ.get("WHISPER_CHECKPOINT_SYNC", 10)) # Seconds between fsyncs
+PROMPT_CHARS = 200 # Committed text carried over as the initial prompt on resume
+
+
+class CheckpointLocked(Exception):
+    """Raised when another process is already checkpointing the same key."""
+
+
+class TranscriptionCheckpoint:
+    """Append-only record of the segments decoded so far for one (media, settings) key."""
+
+    def __init__(self, key, directory=None, fresh=False):
+        self.path = os.path.join(directory or CHECKPOINT_DIR, f"{key}.jsonl")
+        self.segments = []
+        self.language = None
+        self.offset = 0.0
+        self._file = None
+        self._last_sync = 0.0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock_file = open(self.path, "a", encoding="utf-8")
+        if FCNTL_AVAILABLE:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock_file.close()
+                raise CheckpointLocked(f"Checkpoint {self.path} is in use by another run")
+        if fresh:
+            self._lock_file.truncate(0) # Not removed: the lock stays on this file
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break # A torn last line from the crash; everything before it is intact
+            if record.get("type") == "header":
+                self.language = record.get("language")
+            elif record.get("type") == "segment":
+                self.segments.append(record["segment"])
+                self.offset = max(self.offset, record["offset"])
+        if self.segments:
+            logging.info(f"Found checkpoint with {len(self.segments)} segments up to {self.offset:.1f}s")
+
+    @property
+    def resuming(self):
+        return bool(self.segments)
+
+    def prompt(self):
+        """The tail of the committed text, used as the decoder's previous-text context."""
+        text = " ".join(s["text"] for s in self.segments[-5:]).strip()
+        return text[-PROMPT_CHARS:] or None
+
+    def _write(self, record, force_sync=False):
+        if self._file is None:
+            # Drop a torn trailing line before appending after it
+            with open(self.path, "a+", encoding="utf-8") as f:
+                f.seek(0)
+                valid = []
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    valid.append(line)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.writelines(valid)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        now = time.monotonic()
+        if force_sync or now - self._last_sync >= SYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._last_sync = now
+
+    def start(self, language, duration):
+        if not self.resuming:
+            self._write({"type": "header", "language": language, "duration": duration}, force_sync=True)
+
+    def commit(self, segment):
+        self.segments.append(segment)
+        self.offset = max(self.offset, segment["end"])
+        self._write({"type": "segment", "segment": segment, "offset": self.offset})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def release(self):
+        """Closes the checkpoint and its lock, keeping the file for a later resume."""
+        self.close()
+        if self._lock_file is not None:
+            self._lock_file.close() # Releases the flock
+            self._lock_file = None
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path) # Still under the lock, so no other run is appending to it
+        except OSError:
+            pass
+        self.release()
+
+
+def clips_after(offset, clip_timestamps=None):
+    """faster-whisper clip_timestamps covering only the audio after `offset` (seconds)."""
+    if not clip_timestamps:
+        return [offset] # A single start time means "from here to the end"
+    clips = []
+    for region in clip_timestamps:
+        if region["end"] > offset:
+            clips.extend((max(region["start"], offset), region["end"]))
+    return clips
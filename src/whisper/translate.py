@@ -1,19 +1,22 @@
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-import torch
 from typing import Optional, List, Dict
-import langid
-import gradio as gr
 import sys
 import argparse
 import os
 import time
 import base64
 import io
+import json
+
+from language_id import nllb_code, transcript_language
+
+# torch, transformers and gradio are imported where they are used, so the
+# module (language list, stub runs in stub_models.py) loads without the ML stack.
 
 # ...existing code...
 
 def check_gpu():
     """Check and print GPU information"""
+    import torch
     if torch.cuda.is_available():
         device = torch.device("cuda")
         gpu_name = torch.cuda.get_device_name(0)
@@ -59,6 +62,8 @@ def integrate_with_whisper_ui(translator_instance, whisper_ui_block):
         translator_instance: An instance of the TranscriptTranslator class
         whisper_ui_block: The Gradio block containing the Whisper UI
     """
+    import gradio as gr
+
     with whisper_ui_block:
         # Add a horizontal line to separate transcription and translation
         gr.Markdown("---")
@@ -172,7 +177,55 @@ def setup_translation_for_whisper(whisper_block=None):
 #     # At the end of your UI definition
 #     translator = setup_translation_for_whisper(whisper_ui)
 
-def translate_text(text, target_language, source_language=None):
+# --- Translation backends ---
+#
+# "torch" runs NLLB through transformers (AutoModelForSeq2SeqLM.generate), one chunk
+# at a time. "ctranslate2" converts the same checkpoint once to an int8
+# CTranslate2 model (cached on disk, see model_loader.convert_to_ct2) and
+# translates all chunks in one translate_batch call. Select with --backend or
+# TRANSLATE_BACKEND; the default stays "torch".
+
+BACKENDS = ("torch", "ctranslate2")
+MAX_CHUNK_LENGTH = 512
+BEAM_SIZE = 4
+
+def split_text(text, max_length=MAX_CHUNK_LENGTH):
+    """Splits text at sentence ends into chunks shorter than max_length characters."""
+    if len(text) <= max_length:
+        return [text]
+    sentences = text.replace("! ", "!SPLIT").replace("? ", "?SPLIT").replace(". ", ".SPLIT").split("SPLIT")
+    chunks = []
+    current_chunk = ""
+    for sentence in sentences:
+        if len(current_chunk) + len(sentence) < max_length:
+            current_chunk += sentence + " "
+        else:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            current_chunk = sentence + " "
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+def translate_chunks_ct2(chunks, src_lang_code, target_lang_code, device="cpu"):
+    """Translates a list of chunks with the CTranslate2 NLLB model in one batch."""
+    from model_loader import load_ct2_translator
+    compute_type = "int8_float16" if device == "cuda" else "int8"
+    tokenizer, translator = load_ct2_translator(device=device, compute_type=compute_type)
+    tokenizer.src_lang = src_lang_code
+    sources = [tokenizer.convert_ids_to_tokens(tokenizer.encode(chunk, truncation=True)) for chunk in chunks]
+    results = translator.translate_batch(
+        sources,
+        target_prefix=[[target_lang_code]] * len(sources),
+        beam_size=BEAM_SIZE,
+        length_penalty=1.0,
+        max_decoding_length=MAX_CHUNK_LENGTH,
+    )
+    # Drop the forced target language token before decoding
+    return [tokenizer.decode(tokenizer.convert_tokens_to_ids(result.hypotheses[0][1:]), skip_special_tokens=True)
+            for result in results]
+
+def translate_text(text, target_language, source_language=None, backend=None):
     """Simple translation function for command-line use"""
     try:
         # Add debug info
@@ -208,59 +261,42 @@ def translate_text(text, target_language, source_language=None):
         
         # Set source language - either provided or English as default
         if source_language:
-            src_lang_code = LANGUAGE_CODES.get(source_language.lower(), source_language)
+            # Whisper codes ("hi") from the transcript's language ID map to NLLB codes too
+            src_lang_code = nllb_code(LANGUAGE_CODES.get(source_language.lower(), source_language))
         else:
             # Default to English for simplicity in this command-line version
             src_lang_code = "eng_Latn"
             print(f"Using {src_lang_code} as source language", file=sys.stderr)
+
+        backend = (backend or os.environ.get("TRANSLATE_BACKEND", "torch")).lower()
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown translation backend: {backend} (choose from {', '.join(BACKENDS)})")
+        if backend == "ctranslate2":
+            chunks = split_text(text)
+            print(f"Translating {len(chunks)} chunk(s) with CTranslate2", file=sys.stderr)
+            final_result = " ".join(translate_chunks_ct2(chunks, src_lang_code, target_lang_code, device.type))
+            print(f"Translation complete: {len(final_result)} chars", file=sys.stderr)
+            return final_result
         
-        # Load model and tokenizer with GPU optimizations
-        model_name = "facebook/nllb-200-distilled-600M"
+        # Load model and tokenizer (cached per process, see model_loader.py)
+        from model_loader import NLLB_MODEL, load_translation_model
+        model_name = NLLB_MODEL
         print(f"Loading model: {model_name} to {device}", file=sys.stderr)
-        
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        
-        # Optimize loading for GPU usage
+        tokenizer, model = load_translation_model(model_name, device)
         if device.type == "cuda":
-            # Use half-precision for better GPU memory efficiency 
-            model = AutoModelForSeq2SeqLM.from_pretrained(
-                model_name,
-                torch_dtype=torch.float16,  # Use FP16 for faster inference
-                low_cpu_mem_usage=True      # Optimize memory usage during loading
-            ).to(device)
-            
-            # Clear CUDA cache to free up memory
-            torch.cuda.empty_cache()
             print("Using FP16 precision for faster GPU inference", file=sys.stderr)
-        else:
-            # Standard loading for CPU
-            model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device)
         
         # Set source language
         tokenizer.src_lang = src_lang_code
         print(f"Tokenizer configured with source language: {src_lang_code}", file=sys.stderr)
         
         # Handle long text by breaking into shorter chunks if needed
-        MAX_LENGTH = 512
+        MAX_LENGTH = MAX_CHUNK_LENGTH
         
         # Check if text needs chunking
         if len(text) > MAX_LENGTH:
             print(f"Text length ({len(text)}) exceeds maximum. Splitting into chunks.", file=sys.stderr)
-            # Simple splitting by sentences
-            sentences = text.replace("! ", "!SPLIT").replace("? ", "?SPLIT").replace(". ", ".SPLIT").split("SPLIT")
-            chunks = []
-            current_chunk = ""
-            
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) < MAX_LENGTH:
-                    current_chunk += sentence + " "
-                else:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = sentence + " "
-            
-            if current_chunk:
-                chunks.append(current_chunk.strip())
+            chunks = split_text(text, MAX_LENGTH)
             
             print(f"Split into {len(chunks)} chunks", file=sys.stderr)
             
@@ -277,7 +313,7 @@ def translate_text(text, target_language, source_language=None):
                             forced_bos_token_id=tokenizer.convert_tokens_to_ids(target_lang_code),
                             max_length=MAX_LENGTH,
                             # Optimized parameters for better quality and speed
-                            num_beams=4,
+                            num_beams=BEAM_SIZE,
                             length_penalty=1.0,
                             early_stopping=True
                         )
@@ -309,7 +345,7 @@ def translate_text(text, target_language, source_language=None):
                         forced_bos_token_id=tokenizer.convert_tokens_to_ids(target_lang_code),
                         max_length=MAX_LENGTH,
                         # Optimized parameters for better quality and speed
-                        num_beams=4,
+                        num_beams=BEAM_SIZE,
                         length_penalty=1.0,
                         early_stopping=True
                     )
@@ -329,13 +365,137 @@ def translate_text(text, target_language, source_language=None):
     except ImportError as e:
         print(f"Import error: {e}", file=sys.stderr)
         print("Try installing missing packages with:", file=sys.stderr)
-        print("  pip install transformers torch langid", file=sys.stderr)
+        print("  pip install transformers torch", file=sys.stderr)
         return f"ERROR: Missing required packages: {e}"
     except Exception as e:
         print(f"Error during translation: {e}", file=sys.stderr)
         # Return the error message so we can at least see something in the frontend
         return f"ERROR: Translation failed: {e}"
 
+# --- Multi-target translation ---
+
+def _language_code(language):
+    return nllb_code(TranscriptTranslator.LANGUAGE_CODES.get(language.lower(), language))
+
+def _translate_chunk_targets_torch(tokenizer, model, chunk, target_codes, device):
+    """
+    Encodes one chunk once and decodes every target from the shared encoder
+    states: the encoder output is broadcast over a batch of one row per target,
+    and each row's decoder starts with its own language token.
+    """
+    import torch
+    from transformers.modeling_outputs import BaseModelOutput
+
+    inputs = tokenizer(chunk, return_tensors="pt", truncation=True).to(device)
+    with torch.no_grad():
+        encoder_states = model.get_encoder()(**inputs).last_hidden_state
+        count = len(target_codes)
+        start = model.config.decoder_start_token_id
+        decoder_input_ids = torch.tensor(
+            [[start, tokenizer.convert_tokens_to_ids(code)] for code in target_codes], device=device)
+        generated_tokens = model.generate(
+            encoder_outputs=BaseModelOutput(last_hidden_state=encoder_states.expand(count, -1, -1)),
+            attention_mask=inputs["attention_mask"].expand(count, -1),
+            decoder_input_ids=decoder_input_ids,
+            max_length=MAX_CHUNK_LENGTH,
+            num_beams=BEAM_SIZE,
+            length_penalty=1.0,
+            early_stopping=True
+        )
+    return tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
+
+def translate_multi(text, target_languages, source_language=None, backend=None):
+    """
+    Translates one text into several target languages in a single pass and
+    returns {target_language: translation}. Raises on failure.
+    """
+    target_languages = list(dict.fromkeys(target_languages))
+    target_codes = [_language_code(language) for language in target_languages]
+    src_lang_code = _language_code(source_language) if source_language else "eng_Latn"
+    backend = (backend or os.environ.get("TRANSLATE_BACKEND", "torch")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown translation backend: {backend} (choose from {', '.join(BACKENDS)})")
+
+    device = check_gpu()
+    chunks = split_text(text)
+    print(f"Translating {len(chunks)} chunk(s) from {src_lang_code} into {', '.join(target_codes)} ({backend})", file=sys.stderr)
+
+    if backend == "ctranslate2":
+        # CTranslate2 does not expose encoder states for reuse; instead every
+        # (chunk, target) pair goes through a single translate_batch call
+        pairs = [(chunk, code) for chunk in chunks for code in target_codes]
+        from model_loader import load_ct2_translator
+        compute_type = "int8_float16" if device.type == "cuda" else "int8"
+        tokenizer, translator = load_ct2_translator(device=device.type, compute_type=compute_type)
+        tokenizer.src_lang = src_lang_code
+        encoded = {chunk: tokenizer.convert_ids_to_tokens(tokenizer.encode(chunk, truncation=True)) for chunk in chunks}
+        results = translator.translate_batch(
+            [encoded[chunk] for chunk, _ in pairs],
+            target_prefix=[[code] for _, code in pairs],
+            beam_size=BEAM_SIZE,
+            length_penalty=1.0,
+            max_decoding_length=MAX_CHUNK_LENGTH,
+        )
+        decoded = [tokenizer.decode(tokenizer.convert_tokens_to_ids(result.hypotheses[0][1:]), skip_special_tokens=True)
+                   for result in results]
+        per_chunk = [decoded[i:i + len(target_codes)] for i in range(0, len(decoded), len(target_codes))]
+    else:
+        from model_loader import load_translation_model
+        tokenizer, model = load_translation_model(device=device)
+        tokenizer.src_lang = src_lang_code
+        import torch
+        per_chunk = []
+        for i, chunk in enumerate(chunks):
+            print(f"Translating chunk {i+1}/{len(chunks)}", file=sys.stderr)
+            per_chunk.append(_translate_chunk_targets_torch(tokenizer, model, chunk, target_codes, device))
+        if device.type == "cuda":
+            torch.cuda.empty_cache()
+
+    return {language: " ".join(outputs[index] for outputs in per_chunk).strip()
+            for index, language in enumerate(target_languages)}
+
+
+# --- Benchmark ---
+
+BENCHMARK_TEXT = (
+    "Welcome to the weekly project meeting. Today we will review the transcription pipeline and the translation service. "
+    "The team reduced processing time for long recordings by half, but memory usage on the smaller nodes is still too high. "
+    "Please upload your recordings before Friday so that we can compare the new results with last month's numbers. "
+    "If anything is unclear, send a message to the support channel and someone will get back to you within a day. "
+)
+
+def run_benchmark(backends=BACKENDS, target_language="hindi", repeat=4):
+    """Times each backend on the same text (first call includes loading/conversion) and compares outputs."""
+    from compare_transcripts import compare
+    text = BENCHMARK_TEXT * repeat
+    results = {}
+    outputs = {}
+    for backend in backends:
+        started = time.perf_counter()
+        translate_text("Hello.", target_language, "english", backend=backend)
+        load_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        output = translate_text(text, target_language, "english", backend=backend)
+        seconds = time.perf_counter() - started
+        if output.startswith("ERROR:"):
+            results[backend] = {"error": output}
+            continue
+        outputs[backend] = output
+        results[backend] = {
+            "load_seconds": round(load_seconds, 2),
+            "seconds": round(seconds, 2),
+            "input_chars": len(text),
+            "chars_per_second": round(len(text) / seconds, 1),
+        }
+    if "torch" in outputs:
+        for backend, output in outputs.items():
+            if backend != "torch":
+                agreement = compare(outputs["torch"], output, mode="wer", normalize=False)
+                results[backend]["wer_vs_torch"] = round(agreement["wer"], 4)
+                results[backend]["cer_vs_torch"] = round(agreement["cer"], 4)
+                results[backend]["speedup_vs_torch"] = round(results["torch"]["seconds"] / results[backend]["seconds"], 2)
+    return results
+
 if __name__ == "__main__":
     # Change stdout encoding to UTF-8 to handle non-Latin scripts
     if sys.stdout.encoding != 'utf-8':
@@ -344,57 +504,99 @@ if __name__ == "__main__":
     
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description='Translate text using NLLB-200 model')
-    parser.add_argument('--text', required=True, help='Text to translate (or base64 encoded text)')
-    parser.add_argument('--target', required=True, help='Target language')
+    parser.add_argument('--text', help='Text to translate (or base64 encoded text)')
+    parser.add_argument('--target', help='Target language')
+    parser.add_argument('--targets', nargs='+', help='Several target languages at once (output is JSON: {"translations": {...}})')
     parser.add_argument('--source', help='Source language (optional)')
+    parser.add_argument('--source-transcript', help='Transcript JSON whose identified language is the source (instead of --source)')
     parser.add_argument('--base64', action='store_true', help='Indicates that text is base64 encoded')
     parser.add_argument('--output-file', help='Write translation to file instead of stdout (solves encoding issues)')
+    parser.add_argument('--backend', choices=BACKENDS, help='Translation backend (default: TRANSLATE_BACKEND or torch)')
+    parser.add_argument('--list-languages', action='store_true', help='Print the supported target language names as JSON and exit')
+    parser.add_argument('--benchmark', action='store_true', help='Compare the backends on a sample text and print timings as JSON')
+    parser.add_argument('--profile', action='store_true', help='Profile this run (cProfile + tracemalloc); results are saved next to the output file')
     
     args = parser.parse_args()
-    
-    try:
-        # Decode base64 if needed
-        if args.base64:
-            try:
-                decoded_text = base64.b64decode(args.text).decode('utf-8')
-                print(f"Successfully decoded base64 text (length: {len(decoded_text)})", file=sys.stderr)
-            except Exception as e:
-                print(f"Error decoding base64: {e}", file=sys.stderr)
-                print("ERROR: Failed to decode base64 text")
-                sys.exit(1)
-            text_to_translate = decoded_text
-        else:
-            text_to_translate = args.text
+    if args.list_languages:
+        print(json.dumps({"languages": sorted(TranscriptTranslator.LANGUAGE_CODES)}))
+        sys.exit(0)
+    if args.benchmark:
+        backends = [args.backend] if args.backend else list(BACKENDS)
+        print(json.dumps(run_benchmark(backends, args.target or "hindi"), indent=2))
+        sys.exit(0)
+    if not args.text or not (args.target or args.targets):
+        parser.error("--text and --target (or --targets) are required")
+
+    if args.source_transcript and not args.source:
+        # The language identified once at transcription time (language_id.py), not re-detected here
+        args.source = transcript_language(args.source_transcript)
+
+    # Respect the CPU thread share when launched by job_scheduler.py
+    from model_loader import apply_thread_budget
+    apply_thread_budget()
+
+    # Without --output-file the translation goes to stdout and the profile to the working directory
+    from profiling import profile_base, profile_run, profiling_requested
+    with profile_run(profile_base(args.output_file), profiling_requested(args.profile)):
+        try:
+            # Decode base64 if needed
+            if args.base64:
+                try:
+                    decoded_text = base64.b64decode(args.text).decode('utf-8')
+                    print(f"Successfully decoded base64 text (length: {len(decoded_text)})", file=sys.stderr)
+                except Exception as e:
+                    print(f"Error decoding base64: {e}", file=sys.stderr)
+                    print("ERROR: Failed to decode base64 text")
+                    sys.exit(1)
+                text_to_translate = decoded_text
+            else:
+                text_to_translate = args.text
         
-        # Translate the text
-        translated_text = translate_text(text_to_translate, args.target, args.source)
+            if args.targets:
+                # One pass for all targets; errors keep the "ERROR:" text contract of the single mode
+                try:
+                    translations = translate_multi(text_to_translate, args.targets, args.source, backend=args.backend)
+                    output = json.dumps({"translations": translations}, ensure_ascii=False)
+                except Exception as e:
+                    print(f"Error during multi-target translation: {e}", file=sys.stderr)
+                    output = f"ERROR: Translation failed: {e}"
+                if args.output_file:
+                    with open(args.output_file, 'w', encoding='utf-8') as f:
+                        f.write(output)
+                    print(f"Translations written to {args.output_file}", file=sys.stderr)
+                else:
+                    print(output)
+                sys.exit(1 if output.startswith("ERROR:") else 0)
+
+            # Translate the text
+            translated_text = translate_text(text_to_translate, args.target, args.source, backend=args.backend)
         
-        # Make sure we have output
-        if not translated_text:
-            print("WARNING: Empty translation result", file=sys.stderr)
-            translated_text = "[Empty translation result]"
+            # Make sure we have output
+            if not translated_text:
+                print("WARNING: Empty translation result", file=sys.stderr)
+                translated_text = "[Empty translation result]"
         
-        # Print the translated text either to file or stdout with proper encoding
-        if args.output_file:
-            # Write to file (safer for non-Latin scripts)
-            with open(args.output_file, 'w', encoding='utf-8') as f:
-                f.write(translated_text)
-            print(f"Translation written to {args.output_file}", file=sys.stderr)
-        else:
-            # Print to stdout with UTF-8 encoding
-            try:
-                # Try direct print with proper encoding
-                print(translated_text)
-            except UnicodeEncodeError:
-                # If that fails, encode to UTF-8 bytes and decode to ASCII with escapes
-                escaped_text = translated_text.encode('utf-8').decode('ascii', errors='backslashreplace')
-                print(escaped_text)
-                print("WARNING: Translation contains characters that cannot be displayed in console.", file=sys.stderr)
-                print("Consider using --output-file option for better results.", file=sys.stderr)
-    except Exception as e:
-        print(f"Unexpected error in main: {e}", file=sys.stderr)
-        # Make sure to output something to stdout for the API to capture
-        print(f"ERROR: {e}")
-        sys.exit(1)
+            # Print the translated text either to file or stdout with proper encoding
+            if args.output_file:
+                # Write to file (safer for non-Latin scripts)
+                with open(args.output_file, 'w', encoding='utf-8') as f:
+                    f.write(translated_text)
+                print(f"Translation written to {args.output_file}", file=sys.stderr)
+            else:
+                # Print to stdout with UTF-8 encoding
+                try:
+                    # Try direct print with proper encoding
+                    print(translated_text)
+                except UnicodeEncodeError:
+                    # If that fails, encode to UTF-8 bytes and decode to ASCII with escapes
+                    escaped_text = translated_text.encode('utf-8').decode('ascii', errors='backslashreplace')
+                    print(escaped_text)
+                    print("WARNING: Translation contains characters that cannot be displayed in console.", file=sys.stderr)
+                    print("Consider using --output-file option for better results.", file=sys.stderr)
+        except Exception as e:
+            print(f"Unexpected error in main: {e}", file=sys.stderr)
+            # Make sure to output something to stdout for the API to capture
+            print(f"ERROR: {e}")
+            sys.exit(1)
 
-# ...existing code...
\ No newline at end of file
+    # ...existing code...
\ No newline at end of file
@@ -0,0 +1,167 @@
+import argparse
+import base64
+import contextlib
+import json
+import os
+import struct
+import sys
+import wave
+
+import numpy as np
+
+# Precomputed waveform peaks for the player.
+#
+# WaveSurfer.tsx / MediaPlayer.tsx otherwise decode the whole media file in the
+# browser just to draw the waveform. The pipeline already has 16 kHz mono PCM
+# (transcribe.convert_to_wav), so the peaks are computed here once:
+#
+#   level i: one (min, max) pair per SAMPLES_PER_PEAK[i] samples
+#            64 -> 250 peaks/s ... 16384 -> ~1 peak/s
+#
+# The finest level is computed from the samples, every coarser level from the
+# level below it (factor 4), chunk by chunk, so the WAV is read once and never
+# held in memory as a whole. Peaks are quantized to int8 (or int16 with
+# bits=16) and written as one binary file:
+#
+#   b"SSPK" | uint32 header length | JSON header | level 0 | level 1 | ...
+#
+# with every level stored as interleaved min/max pairs (the audiowaveform .dat
+# layout, which wavesurfer's `peaks` option takes after scaling). The header
+# lists sample_rate, bits and per level samples_per_peak, length (pairs) and
+# byte offset. The transcript document carries the header plus the coarse
+# levels inline (base64) so the player can draw immediately. The finer levels
+# are only written next to the transcript as a sidecar file when a caller asks
+# for them (WAVEFORM_SIDECAR=1 or --waveform-sidecar), since whoever keeps the
+# transcript must also clean up the sidecar.
+#
+#   python waveform_peaks.py --input audio.wav --output audio.peaks [--bits 16]
+
+MAGIC = b"SSPK"
+FORMAT_VERSION = 1
+SAMPLE_RATE = 16000
+SAMPLES_PER_PEAK = (64, 256, 1024, 4096, 16384)
+INLINE_MIN_SAMPLES_PER_PEAK = 1024 # Coarser levels are embedded in the transcript (~225 KB per hour)
+CHUNK_SAMPLES = SAMPLES_PER_PEAK[-1] * 64 # ~65 s; a multiple of every level
+
+
+def waveform_enabled():
+    return os.environ.get("WAVEFORM_PEAKS", "1").lower() not in ("0", "false", "no")
+
+def sidecar_enabled():
+    return os.environ.get("WAVEFORM_SIDECAR", "0").lower() in ("1", "true", "yes")
+
+
+# --- Computation ---
+
+def _chunk_levels(samples, bits):
+    """Min/max pairs of every level for one chunk of int16 samples (all levels from one pass)."""
+    finest = SAMPLES_PER_PEAK[0]
+    padded = np.pad(samples, (0, -len(samples) % finest), mode="edge") if len(samples) % finest else samples
+    blocks = padded.reshape(-1, finest)
+    mins, maxs = blocks.min(axis=1), blocks.max(axis=1)
+    levels = [(mins, maxs)]
+    for previous, current in zip(SAMPLES_PER_PEAK, SAMPLES_PER_PEAK[1:]):
+        factor = current // previous
+        mins = np.pad(mins, (0, -len(mins) % factor), mode="edge").reshape(-1, factor).min(axis=1)
+        maxs = np.pad(maxs, (0, -len(maxs) % factor), mode="edge").reshape(-1, factor).max(axis=1)
+        levels.append((mins, maxs))
+    shift = 8 if bits == 8 else 0
+    dtype = np.int8 if bits == 8 else np.int16
+    return [np.stack((mins >> shift, maxs >> shift), axis=1).astype(dtype).ravel() for mins, maxs in levels]
+
+def compute_peaks(chunks, bits=8):
+    """Peak pyramid from an iterable of int16 sample chunks (each a multiple of the coarsest level, except the last)."""
+    parts = [[] for _ in SAMPLES_PER_PEAK]
+    samples = 0
+    for chunk in chunks:
+        samples += len(chunk)
+        if len(chunk):
+            for level, pairs in zip(parts, _chunk_levels(chunk, bits)):
+                level.append(pairs)
+    dtype = np.int8 if bits == 8 else np.int16
+    return {"samples": samples, "bits": bits,
+            "levels": [np.concatenate(level) if level else np.zeros(0, dtype=dtype) for level in parts]}
+
+def wav_chunks(path):
+    """int16 chunks of a 16 kHz mono 16-bit WAV (as written by convert_to_wav)."""
+    with contextlib.closing(wave.open(path, "rb")) as f:
+        if f.getnchannels() != 1 or f.getsampwidth() != 2 or f.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"Expected 16 kHz mono 16-bit PCM: {path}")
+        while True:
+            frames = f.readframes(CHUNK_SAMPLES)
+            if not frames:
+                return
+            yield np.frombuffer(frames, dtype="<i2")
+
+def peaks_from_wav(path, bits=8):
+    return compute_peaks(wav_chunks(path), bits)
+
+
+# --- Storage ---
+
+def _header(pyramid):
+    item = 1 if pyramid["bits"] == 8 else 2
+    levels = []
+    offset = 0
+    for samples_per_peak, pairs in zip(SAMPLES_PER_PEAK, pyramid["levels"]):
+        levels.append({"samples_per_peak": samples_per_peak, "length": len(pairs) // 2, "offset": offset})
+        offset += len(pairs) * item
+    return {"version": FORMAT_VERSION, "sample_rate": SAMPLE_RATE, "bits": pyramid["bits"],
+            "duration": round(pyramid["samples"] / SAMPLE_RATE, 3), "levels": levels}
+
+def write_peaks(path, pyramid):
+    """Writes the binary peak file; returns its header."""
+    header = _header(pyramid)
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(encoded)) + encoded)
+        for pairs in pyramid["levels"]:
+            f.write(pairs.astype(pairs.dtype.newbyteorder("<"), copy=False).tobytes())
+    return header
+
+def read_header(path):
+    """(header, byte offset of level data)."""
+    with open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"Not a peak file: {path}")
+        length, = struct.unpack("<I", f.read(4))
+        return json.loads(f.read(length)), 8 + length
+
+def read_level(path, samples_per_peak):
+    """Memory-mapped (length, 2) min/max array of one level."""
+    header, data_offset = read_header(path)
+    level = next((l for l in header["levels"] if l["samples_per_peak"] == samples_per_peak), None)
+    if level is None:
+        raise KeyError(f"No level with {samples_per_peak} samples per peak in {path}")
+    dtype = np.dtype("<i1" if header["bits"] == 8 else "<i2")
+    if level["length"] == 0:
+        return np.zeros((0, 2), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=data_offset + level["offset"],
+                     shape=(level["length"], 2))
+
+def waveform_summary(path, file_name=None):
+    """
+    Header plus the coarse levels inline (base64), for embedding in the
+    transcript document. "file" names the sidecar with all levels (None: none).
+    """
+    header, _ = read_header(path)
+    for level in header["levels"]:
+        if level["samples_per_peak"] >= INLINE_MIN_SAMPLES_PER_PEAK:
+            level["data"] = base64.b64encode(np.ascontiguousarray(read_level(path, level["samples_per_peak"])).tobytes()).decode("ascii")
+    header["file"] = file_name
+    return header
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compute a multi-resolution waveform peak file from 16 kHz mono PCM.')
+    parser.add_argument('--input', required=True, help='16 kHz mono 16-bit WAV.')
+    parser.add_argument('--output', help='Peak file (default: <input>.peaks).')
+    parser.add_argument('--bits', type=int, choices=(8, 16), default=8)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(json.dumps({"error": f"File not found: {args.input}"}))
+        sys.exit(1)
+    output = args.output or os.path.splitext(args.input)[0] + ".peaks"
+    header = write_peaks(output, peaks_from_wav(args.input, args.bits))
+    print(json.dumps(dict(header, file=output, size_bytes=os.path.getsize(output)), indent=2))
@@ -0,0 +1,206 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import wave
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Memory-bounded diarization for multi-hour audio.
+#
+# pyannote's pipeline holds the whole file's segmentation scores and embeddings
+# and clusters all of them at once, so memory and the clustering step grow
+# faster than linearly with duration. For long files (DIARIZATION_WINDOWED=auto
+# and longer than WINDOWED_MIN_SECONDS, or =1) the WAV is diarized instead in
+# fixed windows of WINDOW_SECONDS overlapping by OVERLAP_SECONDS:
+#
+#   - each window is read from the WAV on its own and run through the pipeline
+#     with return_embeddings=True; only its turns and one embedding per local
+#     speaker are kept, so peak memory is that of one window
+#   - each window owns the middle of its overlap with the next, and turns are
+#     clipped to the owned part (no double-counted speech at the seams)
+#   - a global agglomerative clustering over the compact embeddings
+#     (cosine distance, average linkage, speakers of one window never merged)
+#     links local speakers into file-wide SPEAKER_xx labels
+#
+#   python windowed_diarization.py --input long.wav --hf-token ... [--window 600]
+
+WINDOW_SECONDS = float(os.environ.get("DIARIZATION_WINDOW_SECONDS", 600))
+OVERLAP_SECONDS = float(os.environ.get("DIARIZATION_OVERLAP_SECONDS", 30))
+WINDOWED_MIN_SECONDS = float(os.environ.get("DIARIZATION_WINDOWED_MIN_SECONDS", 1800))
+LINK_THRESHOLD = float(os.environ.get("DIARIZATION_LINK_THRESHOLD", 0.6)) # Max cosine distance to link two speakers
+MERGE_GAP_SECONDS = 0.5 # Same-speaker turns closer than this (at window seams) are joined
+
+
+def wav_duration(wav_path):
+    with contextlib.closing(wave.open(wav_path, "rb")) as f:
+        return f.getnframes() / f.getframerate()
+
+def windowed_mode(wav_path):
+    """Whether to diarize this WAV in windows (DIARIZATION_WINDOWED: auto, 1 or 0)."""
+    mode = os.environ.get("DIARIZATION_WINDOWED", "auto").lower()
+    if mode in ("1", "true", "yes"):
+        return True
+    if mode in ("0", "false", "no"):
+        return False
+    return wav_duration(wav_path) > WINDOWED_MIN_SECONDS
+
+def window_config():
+    """Settings that change the windowed result (part of the diarization artifact key)."""
+    return {"windowed": {"window": WINDOW_SECONDS, "overlap": OVERLAP_SECONDS, "threshold": LINK_THRESHOLD}}
+
+
+# --- Windows ---
+
+def plan_windows(duration, window=None, overlap=None):
+    """[(start, end, owned_start, owned_end)] covering [0, duration]; owned parts tile it exactly."""
+    window = window or WINDOW_SECONDS
+    overlap = OVERLAP_SECONDS if overlap is None else overlap
+    step = window - overlap
+    windows = []
+    start = 0.0
+    while True:
+        end = min(duration, start + window)
+        windows.append([start, end, start + overlap / 2 if windows else 0.0, end])
+        if end >= duration:
+            break
+        start += step
+    for current, following in zip(windows, windows[1:]):
+        current[3] = following[2]
+    return [tuple(w) for w in windows]
+
+def read_window(wav_path, start, end):
+    """float32 samples of [start, end) of a 16-bit mono WAV, and its sample rate."""
+    with contextlib.closing(wave.open(wav_path, "rb")) as f:
+        rate = f.getframerate()
+        f.setpos(min(f.getnframes(), int(start * rate)))
+        frames = f.readframes(int((end - start) * rate))
+    return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0, rate
+
+def diarize_window(pipeline, samples, rate):
+    """(turns [(start, end, local label)], {local label: embedding}) of one window."""
+    import torch
+    diarization, embeddings = pipeline({"waveform": torch.from_numpy(samples)[None], "sample_rate": rate},
+                                       return_embeddings=True)
+    turns = [(turn.start, turn.end, label) for turn, _, label in diarization.itertracks(yield_label=True)]
+    # Embeddings are ordered like diarization.labels()
+    return turns, {label: np.asarray(embeddings[i], dtype=np.float32) for i, label in enumerate(diarization.labels())}
+
+
+# --- Global clustering ---
+
+def link_speakers(embeddings, windows, threshold=None):
+    """
+    Average-linkage clustering of local speaker embeddings by cosine distance.
+    `windows[i]` is the window of embedding i; speakers of the same window stay
+    apart (the pipeline already separated them). Returns a cluster id per embedding.
+    """
+    threshold = LINK_THRESHOLD if threshold is None else threshold
+    count = len(embeddings)
+    if count == 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float64)
+    valid = np.isfinite(vectors).all(axis=1) & (np.linalg.norm(vectors, axis=1) > 0)
+    indices = np.nonzero(valid)[0]
+    vectors = vectors[valid] / np.linalg.norm(vectors[valid], axis=1, keepdims=True)
+    window_ids = np.asarray(windows)[valid]
+    # Same-window pairs are infinitely far apart; the averages below keep that for
+    # any two clusters holding speakers of a shared window
+    distance = 1.0 - vectors @ vectors.T
+    distance[window_ids[:, None] == window_ids[None, :]] = np.inf
+
+    # Lance-Williams average linkage with a nearest-neighbour per row: each merge
+    # is one O(n) row update plus rescanning the rows that pointed at the pair
+    members = [[i] for i in indices]
+    sizes = np.ones(len(indices))
+    nearest = distance.argmin(axis=1) if len(indices) else np.zeros(0, dtype=int)
+    nearest_distance = distance[np.arange(len(indices)), nearest]
+    while len(indices) > 1:
+        a = int(nearest_distance.argmin())
+        if not nearest_distance[a] < threshold:
+            break
+        a, b = sorted((a, int(nearest[a]))) # The lower index survives, like the cluster order
+        merged = (sizes[a] * distance[a] + sizes[b] * distance[b]) / (sizes[a] + sizes[b])
+        merged[[a, b]] = np.inf
+        distance[a], distance[:, a] = merged, merged
+        distance[b], distance[:, b] = np.inf, np.inf
+        sizes[a] += sizes[b]
+        members[a] += members[b]
+        members[b] = []
+        nearest_distance[b] = np.inf
+        stale = np.nonzero((nearest == a) | (nearest == b))[0]
+        nearest[stale] = distance[stale].argmin(axis=1)
+        nearest_distance[stale] = distance[stale, nearest[stale]]
+        closer = merged < nearest_distance
+        nearest[closer], nearest_distance[closer] = a, merged[closer]
+
+    labels = np.full(count, -1)
+    for cluster_id, cluster in enumerate(c for c in members if c):
+        labels[cluster] = cluster_id
+    # Speakers without a usable embedding (too little speech) get their own cluster
+    for i in np.nonzero(~valid)[0]:
+        labels[i] = labels.max() + 1
+    return labels.tolist()
+
+def merge_turns(turns):
+    """Sorts turns and joins same-speaker turns separated by less than MERGE_GAP_SECONDS."""
+    merged = []
+    for turn in sorted(turns, key=lambda t: t["start"]):
+        if merged and merged[-1]["speaker"] == turn["speaker"] and turn["start"] - merged[-1]["end"] < MERGE_GAP_SECONDS:
+            merged[-1]["end"] = max(merged[-1]["end"], turn["end"])
+        else:
+            merged.append(dict(turn))
+    return merged
+
+
+def diarize_windowed(pipeline, wav_path, window=None, overlap=None):
+    """Speaker turns [{start, end, speaker}] of the WAV, one window in memory at a time."""
+    duration = wav_duration(wav_path)
+    windows = plan_windows(duration, window, overlap)
+    local_turns = [] # (start, end, index into embeddings)
+    embeddings, embedding_windows = [], []
+    for index, (start, end, owned_start, owned_end) in enumerate(windows):
+        logging.info(f"Diarizing window {index + 1}/{len(windows)} ({start:.0f}-{end:.0f}s)")
+        samples, rate = read_window(wav_path, start, end)
+        turns, speakers = diarize_window(pipeline, samples, rate)
+        del samples
+        slots = {}
+        for label, embedding in speakers.items():
+            slots[label] = len(embeddings)
+            embeddings.append(embedding)
+            embedding_windows.append(index)
+        for turn_start, turn_end, label in turns:
+            turn_start, turn_end = max(turn_start + start, owned_start), min(turn_end + start, owned_end)
+            if turn_end > turn_start and label in slots:
+                local_turns.append((turn_start, turn_end, slots[label]))
+
+    clusters = link_speakers(embeddings, embedding_windows)
+    # Global labels in order of first appearance, like the pipeline's own numbering
+    names = {}
+    turns = []
+    for turn_start, turn_end, slot in sorted(local_turns):
+        name = names.setdefault(clusters[slot], f"SPEAKER_{len(names):02d}")
+        turns.append({"start": round(turn_start, 3), "end": round(turn_end, 3), "speaker": name})
+    logging.info(f"Windowed diarization: {len(windows)} windows, {len(embeddings)} local speakers -> {len(names)} speakers")
+    return merge_turns(turns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Diarize a long 16 kHz mono WAV in overlapping windows.')
+    parser.add_argument('--input', required=True, help='16 kHz mono 16-bit WAV.')
+    parser.add_argument('--hf-token', help='Hugging Face token for pyannote.audio.')
+    parser.add_argument('--window', type=float, default=WINDOW_SECONDS)
+    parser.add_argument('--overlap', type=float, default=OVERLAP_SECONDS)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(json.dumps({"error": f"File not found: {args.input}"}))
+        sys.exit(1)
+    from pyannote.audio import Pipeline
+    from transcribe import DIARIZATION_PIPELINE
+    pipeline = Pipeline.from_pretrained(DIARIZATION_PIPELINE, use_auth_token=args.hf_token or os.environ.get('HUGGING_FACE_TOKEN'))
+    print(json.dumps(diarize_windowed(pipeline, args.input, args.window, args.overlap), indent=2))
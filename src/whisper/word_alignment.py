@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+
+from artifact_store import media_hash
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# On-demand word timestamps.
+#
+# Word timestamps need an extra cross-attention alignment pass over the audio,
+# so transcribe.py now transcribes at segment level by default. This module
+# computes words only for the segments a user actually asks for:
+#
+#   - each requested segment's audio is cut out, encoded once and force-aligned
+#     against the segment's existing text (the same find_alignment step
+#     faster-whisper uses for word_timestamps=True), so the text never changes
+#   - results are cached per media file (content hash) and segment, on disk and
+#     in memory, so repeat requests cost nothing
+#
+# CLI:
+#   python word_alignment.py --input a.mp3 --transcript a.json --segments 3-5,12
+#   python word_alignment.py --input a.mp3 --transcript a.json --range 60-90 --update
+
+SAMPLE_RATE = 16000
+CLIP_PADDING = 0.2 # Seconds of context on each side of a segment
+CACHE_DIR = os.environ.get("WORD_ALIGN_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "sonicseeker", "word_alignment")
+
+
+# --- Cache ---
+
+def _segment_key(segment, model_size):
+    text_hash = hashlib.sha1(segment["text"].strip().encode("utf-8")).hexdigest()[:12]
+    return f"{model_size}:{segment['start']:.3f}-{segment['end']:.3f}:{text_hash}"
+
+
+class AlignmentCache:
+    """Word lists per (media hash, segment key): one JSON file per media file."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or CACHE_DIR
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _path(self, media):
+        return os.path.join(self.directory, f"{media}.json")
+
+    def _entries(self, media):
+        if media not in self._memory:
+            try:
+                with open(self._path(media), encoding="utf-8") as f:
+                    self._memory[media] = json.load(f)
+            except (OSError, ValueError):
+                self._memory[media] = {}
+        return self._memory[media]
+
+    def get(self, media, key):
+        with self._lock:
+            return self._entries(media).get(key)
+
+    def put_many(self, media, items):
+        with self._lock:
+            entries = self._entries(media)
+            entries.update(items)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                temp_path = f"{self._path(media)}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(temp_path, self._path(media))
+            except OSError as e:
+                logging.warning(f"Could not write word alignment cache: {e}")
+
+
+# --- Alignment ---
+
+def _force_align(model, clip, text, language):
+    """Aligns known text against a clip (<= 30 s) and returns words with clip-relative times."""
+    from faster_whisper.tokenizer import Tokenizer
+
+    tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language=language or "en")
+    features = model.feature_extractor(clip)
+    num_frames = features.shape[-1]
+    window = model.feature_extractor.nb_max_frames
+    if num_frames > window:
+        raise ValueError("segment longer than one 30 s window")
+    features = np.pad(features, ((0, 0), (0, window - num_frames)))
+    encoder_output = model.encode(features)
+    text_tokens = tokenizer.encode(" " + text.strip())
+    alignment = model.find_alignment(tokenizer, [text_tokens], encoder_output, num_frames)
+    words = alignment[0] if alignment and isinstance(alignment[0], list) else alignment
+    return [{"word": w["word"].strip(), "start": float(w["start"]), "end": float(w["end"]),
+             "probability": float(w["probability"])} for w in words if w["word"].strip()]
+
+def _transcribe_words(model, clip, language):
+    """Fallback when forced alignment is unavailable: re-decode the clip with word timestamps."""
+    segments, _ = model.transcribe(clip, beam_size=1, word_timestamps=True, language=language,
+                                   condition_on_previous_text=False, vad_filter=False)
+    return [{"word": w.word.strip(), "start": w.start, "end": w.end, "probability": w.probability}
+            for segment in segments for w in segment.words or []]
+
+def align_segments(input_path, segments, language=None, model=None, cache=None, model_size=None):
+    """
+    Returns word lists for the given raw segments ({start, end, text} in seconds),
+    computing only those not already cached. Also returns how many were cached.
+    """
+    from model_loader import load_whisper_model, whisper_config
+
+    model_size = model_size or whisper_config()["model_size"]
+    cache = cache or AlignmentCache()
+    media = media_hash(input_path)
+    results = [None] * len(segments)
+    missing = []
+    for index, segment in enumerate(segments):
+        cached = cache.get(media, _segment_key(segment, model_size))
+        if cached is not None:
+            results[index] = cached
+        else:
+            missing.append(index)
+    if not missing:
+        return results, len(segments)
+
+    from faster_whisper import decode_audio
+    model = model or load_whisper_model(model_size=model_size)
+    audio = decode_audio(input_path, sampling_rate=SAMPLE_RATE)
+    duration = len(audio) / SAMPLE_RATE
+    computed = {}
+    for index in missing:
+        segment = segments[index]
+        clip_start = max(0.0, segment["start"] - CLIP_PADDING)
+        clip_end = min(duration, segment["end"] + CLIP_PADDING)
+        clip = audio[int(clip_start * SAMPLE_RATE):int(clip_end * SAMPLE_RATE)]
+        try:
+            words = _force_align(model, clip, segment["text"], language)
+        except Exception as e:
+            logging.info(f"Forced alignment unavailable for {segment['start']:.1f}s ({e}); re-decoding the clip")
+            words = _transcribe_words(model, clip, language)
+        for word in words:
+            word["start"] = round(min(max(word["start"] + clip_start, segment["start"]), segment["end"]), 3)
+            word["end"] = round(min(max(word["end"] + clip_start, word["start"]), segment["end"]), 3)
+        results[index] = words
+        computed[_segment_key(segment, model_size)] = words
+    cache.put_many(media, computed)
+    return results, len(segments) - len(missing)
+
+
+# --- Transcript helpers ---
+
+def load_segments(transcript_path):
+    """Reads a transcript document (or a bare segment list) into raw segments."""
+    with open(transcript_path, encoding="utf-8") as f:
+        document = json.load(f)
+    if isinstance(document, dict):
+        segments = document.get("transcription") or document.get("segments") or []
+    else:
+        segments = document
+    raw = []
+    for segment in segments:
+        start = segment.get("start_seconds", segment.get("start"))
+        end = segment.get("end_seconds", segment.get("end"))
+        raw.append({"start": float(start), "end": float(end), "text": segment.get("text", "")})
+    language = document.get("language") if isinstance(document, dict) else None
+    return document, raw, language
+
+def parse_indices(spec, count):
+    """'3-5,12' -> [3, 4, 5, 12] (clipped to the transcript)."""
+    indices = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        indices.extend(range(int(first), int(last or first) + 1))
+    return sorted({i for i in indices if 0 <= i < count})
+
+def indices_in_range(segments, start, end):
+    """Segments overlapping the [start, end] time range (seconds)."""
+    return [i for i, s in enumerate(segments) if s["end"] > start and s["start"] < end]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compute word timestamps on demand for selected transcript segments.')
+    parser.add_argument('--input', required=True, help='Original media file.')
+    parser.add_argument('--transcript', required=True, help='Transcript JSON produced by transcribe.py.')
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument('--segments', help='Segment indices, e.g. "3-5,12".')
+    selection.add_argument('--range', help='Time range in seconds, e.g. "60-90".')
+    parser.add_argument('--update', action='store_true', help='Write the words back into the transcript file.')
+    args = parser.parse_args()
+
+    for path in (args.input, args.transcript):
+        if not os.path.exists(path):
+            print(json.dumps({"error": f"File not found: {path}"}))
+            sys.exit(1)
+    try:
+        document, raw_segments, language = load_segments(args.transcript)
+        if args.segments:
+            indices = parse_indices(args.segments, len(raw_segments))
+        else:
+            start, _, end = args.range.partition("-")
+            indices = indices_in_range(raw_segments, float(start), float(end))
+        words, cached = align_segments(args.input, [raw_segments[i] for i in indices], language)
+
+        if args.update and isinstance(document, dict) and isinstance(document.get("transcription"), list):
+            for index, segment_words in zip(indices, words):
+                document["transcription"][index]["words"] = segment_words
+            temp_path = f"{args.transcript}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(document, f, ensure_ascii=False)
+            os.replace(temp_path, args.transcript)
+
+        print(json.dumps({
+            "segments": [{"index": i, "words": w} for i, w in zip(indices, words)],
+            "cached": cached,
+            "computed": len(indices) - cached,
+        }, ensure_ascii=False))
+    except Exception as e:
+        print(json.dumps({"error": f"Word alignment failed: {e}"}))
+        sys.exit(1)
@@ -0,0 +1,315 @@
+import argparse
+import gc
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Pre-fork worker pool that keeps one copy of the model weights in memory.
+#
+# Running N independent transcribe/translate processes loads N copies of the
+# weights. Here the parent loads them once instead:
+#
+#   - translation (NLLB, PyTorch): the parent loads the model, freezes the GC
+#     and forks the workers. Tensor storage is never written after loading, so
+#     the weight pages stay shared copy-on-write between all workers.
+#   - transcription (faster-whisper / CTranslate2): CTranslate2 starts its
+#     thread pool when the model is constructed and those threads do not
+#     survive fork(), so the Whisper model is loaded in the parent *after*
+#     forking, with one replica per worker (num_workers). CTranslate2 replicas
+#     on the same device share the weights, so N concurrent transcriptions
+#     still use a single copy.
+#
+# memory_report() reads /proc/<pid>/smaps_rollup and reports per process RSS,
+# PSS and USS (unique set size = memory that would be freed if that process
+# exited), which is the number that decides how many workers fit on a node.
+#
+# Requests are JSON lines on stdin, responses JSON lines on stdout:
+#   {"id": 1, "op": "translate", "text": "...", "target": "hindi", "source": "english"}
+#   {"id": 2, "op": "transcribe", "input": "a.mp3", "output_json": "a.json", "diarize": false}
+#   {"id": 3, "op": "memory"}
+#
+# With --batch, transcriptions without diarization go through one
+# DynamicBatcher (dynamic_batcher.py) instead, so concurrent short clips share
+# batched encoder/decoder calls; its metrics are part of the memory report.
+
+MODELS = ("translate", "whisper")
+FORK_AVAILABLE = "fork" in multiprocessing.get_all_start_methods()
+
+
+# --- Memory accounting ---
+
+def memory_usage(pid):
+    """Returns {rss_mb, pss_mb, uss_mb, shared_mb} for a process, or None when /proc is unavailable."""
+    fields = {}
+    for name in (f"/proc/{pid}/smaps_rollup", f"/proc/{pid}/smaps"):
+        try:
+            with open(name) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 3 and parts[2] == "kB":
+                        key = parts[0].rstrip(":")
+                        fields[key] = fields.get(key, 0) + int(parts[1])
+            break
+        except OSError:
+            continue
+    if not fields:
+        return None
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1),
+        "shared_mb": round(shared / 1024, 1),
+    }
+
+
+# --- Workers ---
+
+def _set_threads(threads):
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+def _translation_on_gpu():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+def _preload_translation():
+    import translate # Imported before fork so the module objects are shared too
+    from model_loader import load_ct2_translator, load_translation_model
+    if os.environ.get("TRANSLATE_BACKEND", "torch").lower() == "ctranslate2":
+        load_ct2_translator()
+    else:
+        load_translation_model()
+    return translate
+
+def _worker_main(tasks, results, threads, preload_in_child):
+    """Forked (or spawned) worker loop: runs translation tasks until it receives None."""
+    _set_threads(threads)
+    translator = _preload_translation() if preload_in_child else sys.modules.get("translate")
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, payload = task
+        started = time.perf_counter()
+        try:
+            if translator is None:
+                translator = _preload_translation()
+            text = translator.translate_text(payload["text"], payload["target"], payload.get("source"))
+            response = {"translation": text}
+        except Exception as e:
+            response = {"error": str(e)}
+        response["worker_pid"] = os.getpid()
+        response["seconds"] = round(time.perf_counter() - started, 3)
+        results.put((task_id, response))
+
+
+class WorkerPool:
+    """
+    Worker processes that share one copy of the translation model (via fork)
+    plus a thread pool over one multi-replica Whisper model.
+    """
+
+    def __init__(self, workers=2, preload=MODELS, threads=None, batch=False):
+        self.workers = max(1, workers)
+        self.preload = tuple(preload)
+        cpu_budget = int(os.environ.get("JOB_CPU_THREADS", 0)) or os.cpu_count() or 1
+        self.threads = threads or max(1, cpu_budget // self.workers)
+        self.processes = []
+        self._futures = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._transcriber = None
+        self.batch = batch
+        self._batcher = None
+
+    def start(self):
+        started = time.perf_counter()
+        # CUDA state and CTranslate2 thread pools do not survive fork(), so GPU
+        # and CTranslate2-backend workers load their own copy
+        torch_backend = os.environ.get("TRANSLATE_BACKEND", "torch").lower() == "torch"
+        share = FORK_AVAILABLE and "translate" in self.preload and torch_backend and not _translation_on_gpu()
+        if share:
+            _preload_translation()
+            # Move everything loaded so far out of the collector's reach, so GC
+            # passes in the workers don't write to (and un-share) those pages
+            gc.collect()
+            gc.freeze()
+        elif "translate" in self.preload:
+            logging.warning("Translation model not shared (no fork(), GPU or CTranslate2 backend): every worker loads its own copy.")
+
+        context = multiprocessing.get_context("fork" if FORK_AVAILABLE else "spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        for _ in range(self.workers):
+            process = context.Process(target=_worker_main,
+                                      args=(self.tasks, self.results, self.threads, not share and "translate" in self.preload),
+                                      daemon=True)
+            process.start()
+            self.processes.append(process)
+        threading.Thread(target=self._collect, daemon=True).start()
+
+        # Whisper after forking (see module comment): one model, one replica per worker
+        if "whisper" in self.preload:
+            self._load_transcriber()
+        logging.info(f"Worker pool ready in {time.perf_counter() - started:.1f}s: {self.workers} workers, {self.threads} threads each")
+        return self
+
+    def _load_transcriber(self):
+        os.environ["WHISPER_NUM_WORKERS"] = str(self.workers)
+        os.environ.setdefault("WHISPER_CPU_THREADS", str(self.threads))
+        import transcribe
+        # The module captures its log lines for single runs; a long-lived pool must not accumulate them
+        transcribe.detach_log_capture()
+        from model_loader import load_whisper_model
+        load_whisper_model()
+        jobs = self.workers
+        if self.batch:
+            from dynamic_batcher import DynamicBatcher
+            self._batcher = DynamicBatcher().start()
+            jobs = max(jobs, self._batcher.max_batch) # Enough jobs in flight to fill a batch
+        self._transcriber = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="transcribe")
+
+    def _collect(self):
+        while True:
+            try:
+                task_id, response = self.results.get()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._futures.pop(task_id, None)
+            if future is not None:
+                future.set_result(response)
+
+    def translate(self, text, target, source=None):
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            self._futures[task_id] = future
+        self.tasks.put((task_id, {"text": text, "target": target, "source": source}))
+        return future
+
+    def transcribe(self, input_path, output_json, diarize=False, hf_token=None):
+        if self._transcriber is None:
+            self._load_transcriber()
+        return self._transcriber.submit(self._transcribe, input_path, output_json, diarize, hf_token)
+
+    def _transcribe(self, input_path, output_json, diarize, hf_token):
+        import transcribe
+        started = time.perf_counter()
+        if not os.path.exists(input_path):
+            return {"error": f"Input file not found: {input_path}"}
+        if self._batcher is not None and not diarize:
+            from dynamic_batcher import transcribe_file_batched
+            ok = transcribe_file_batched(self._batcher, input_path, output_json)
+        else:
+            ok = transcribe.transcribe_file(input_path, output_json, diarize,
+                                            hf_token or os.environ.get('HUGGING_FACE_TOKEN'), metrics=[])
+        seconds = round(time.perf_counter() - started, 3)
+        return {"output_json": output_json, "seconds": seconds} if ok else {"error": "Transcription failed", "seconds": seconds}
+
+    def memory_report(self):
+        """Per-process memory of the parent and every worker, plus totals."""
+        parent = dict(memory_usage(os.getpid()) or {}, pid=os.getpid(), role="parent")
+        workers = [dict(memory_usage(p.pid) or {}, pid=p.pid, role="worker") for p in self.processes if p.is_alive()]
+        report = {"processes": [parent] + workers}
+        if workers and "uss_mb" in parent:
+            total_pss = parent["pss_mb"] + sum(w["pss_mb"] for w in workers)
+            report["total_pss_mb"] = round(total_pss, 1)
+            report["mean_worker_uss_mb"] = round(sum(w["uss_mb"] for w in workers) / len(workers), 1)
+            report["mean_worker_rss_mb"] = round(sum(w["rss_mb"] for w in workers) / len(workers), 1)
+        if self._batcher is not None:
+            report["batching"] = self._batcher.metrics()
+        return report
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        if self._transcriber is not None:
+            self._transcriber.shutdown(wait=True)
+        if self._batcher is not None:
+            self._batcher.close()
+
+
+# --- CLI ---
+
+def serve_stdin(pool):
+    """Reads JSON-line requests from stdin and writes responses as they complete."""
+    write_lock = threading.Lock()
+
+    def respond(request_id, response):
+        with write_lock:
+            sys.stdout.write(json.dumps(dict(response, id=request_id), ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+
+    pending = []
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError:
+            respond(None, {"error": "Invalid JSON"})
+            continue
+        request_id, op = request.get("id"), request.get("op")
+        if op == "translate":
+            future = pool.translate(request["text"], request["target"], request.get("source"))
+        elif op == "transcribe":
+            future = pool.transcribe(request["input"], request["output_json"], request.get("diarize", False), request.get("hf_token"))
+        elif op == "memory":
+            respond(request_id, pool.memory_report())
+            continue
+        else:
+            respond(request_id, {"error": f"Unknown op: {op}"})
+            continue
+        future.add_done_callback(lambda f, request_id=request_id: respond(
+            request_id, f.result() if f.exception() is None else {"error": str(f.exception())}))
+        pending.append(future)
+    for future in pending:
+        future.exception()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pre-fork worker pool sharing one copy of the model weights.')
+    parser.add_argument('--workers', type=int, help='Number of workers (processes for translation, replicas for Whisper; default: autotune.py profile or 2).')
+    parser.add_argument('--preload', nargs='*', choices=MODELS, default=list(MODELS), help='Models to load before serving.')
+    parser.add_argument('--threads', type=int, help='Threads per worker (default: autotune.py profile or CPU cores / workers).')
+    parser.add_argument('--batch', action='store_true', help='Batch concurrent transcriptions (WHISPER_BATCH_SIZE / WHISPER_BATCH_WAIT_MS, see dynamic_batcher.py).')
+    parser.add_argument('--report', action='store_true', help='Print the per-process memory report after startup and exit.')
+    args = parser.parse_args()
+
+    from model_loader import load_profile
+    tuned_pool = load_profile().get("pool", {})
+    workers = args.workers or tuned_pool.get("workers", 2)
+    threads = args.threads or (tuned_pool.get("threads_per_worker") if workers == tuned_pool.get("workers") else None)
+    pool = WorkerPool(workers, args.preload, threads, args.batch).start()
+    try:
+        if args.report:
+            print(json.dumps(pool.memory_report(), indent=2))
+        else:
+            serve_stdin(pool)
+            print(json.dumps(pool.memory_report()), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
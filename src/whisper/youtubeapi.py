@@ -2,7 +2,20 @@ from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, Tran
 from urllib.parse import urlparse, parse_qs
 import argparse
 import json
+import os
+import re
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from transcript_output import build_document, dumps, print_transcript
+
+PREFERRED_LANGUAGES = ['en', 'en-US', 'en-GB']
+AUTO_LANGUAGE = "auto" # Cache key when no explicit language was requested
+DEFAULT_CACHE_TTL = 7 * 24 * 3600 # One week
+DEFAULT_WORKERS = 8
+VIDEO_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{11}")
 
 def get_video_id(url):
     """Extracts the YouTube video ID from a URL."""
@@ -37,67 +50,102 @@ def get_video_id(url):
     # fail?
     return None
 
-def fetch_transcript(video_id):
-    """Fetches the transcript for a given video ID."""
+# --- Result cache ---
+
+class TranscriptCache:
+    """
+    On-disk cache of normalized transcripts keyed by (video id, language).
+    Entries older than `ttl` seconds are ignored and refetched.
+    """
+
+    def __init__(self, directory=None, ttl=DEFAULT_CACHE_TTL):
+        self.directory = directory or os.environ.get("YOUTUBE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "sonicseeker-youtube-cache")
+        self.ttl = ttl
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, video_id, language):
+        safe_language = re.sub(r"[^A-Za-z0-9_-]", "_", language or AUTO_LANGUAGE)
+        return os.path.join(self.directory, f"{video_id}.{safe_language}.json")
+
+    def get(self, video_id, language=None):
+        path = self._path(video_id, language)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, video_id, language, entry):
+        # Write then rename, so concurrent readers never see a partial file
+        path = self._path(video_id, language)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+
+
+# --- Fetching ---
+
+def select_transcript(transcript_list, languages=None):
+    """Picks the preferred language, then any generated, then any manual transcript."""
+    preferred_langs = languages or PREFERRED_LANGUAGES
+    try:
+        # find_transcript takes the whole priority list in one lookup
+        return transcript_list.find_transcript(preferred_langs)
+    except NoTranscriptFound:
+        pass
+    available = [t.language_code for t in transcript_list]
+    for finder in (transcript_list.find_generated_transcript, transcript_list.find_manually_created_transcript):
+        try:
+            return finder(available)
+        except NoTranscriptFound:
+            continue
+    return None
+
+def fetch_transcript(video_id, languages=None, api=YouTubeTranscriptApi, cache=None):
+    """
+    Fetches the transcript for a given video ID. Returns a cache entry
+    {"video_id", "language", "segments"} with raw segments, or None on failure.
+    `api` can be swapped for a stub exposing list_transcripts().
+    """
+    requested = ",".join(languages) if languages else None
+    if cache is not None:
+        entry = cache.get(video_id, requested)
+        if entry is not None:
+            print(f"Using cached transcript for {video_id} ({entry['language']})", file=sys.stderr)
+            return dict(entry, cached=True)
     try:
         # Fetch available transcripts
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-
-        # Try to find English first, then any generated, then any manual
-        preferred_langs = ['en', 'en-US', 'en-GB']
-        transcript = None
-
-        # Try preferred languages first
-        for lang in preferred_langs:
-            try:
-                transcript = transcript_list.find_transcript([lang])
-                print(f"Found preferred transcript: {lang}", file=sys.stderr)
-                break
-            except NoTranscriptFound:
-                continue
-
-        # If no preferred found, try finding a generated transcript in any language
-        if not transcript:
-            try:
-                transcript = transcript_list.find_generated_transcript(transcript_list.languages)
-                print(f"Found generated transcript: {transcript.language}", file=sys.stderr)
-            except NoTranscriptFound:
-                pass # Continue to try manual
-
-        # If still no transcript, try finding a manual transcript in any language
-        if not transcript:
-             try:
-                 transcript = transcript_list.find_manually_created_transcript(transcript_list.languages)
-                 print(f"Found manual transcript: {transcript.language}", file=sys.stderr)
-             except NoTranscriptFound:
-                 # If absolutely no transcript is found after all attempts
-                 print(f"ERROR: No transcript found for video ID: {video_id}", file=sys.stderr)
-                 return None
+        transcript_list = api.list_transcripts(video_id)
+        transcript = select_transcript(transcript_list, languages)
+        if transcript is None:
+            # If absolutely no transcript is found after all attempts
+            print(f"ERROR: No transcript found for video ID: {video_id}", file=sys.stderr)
+            return None
+        print(f"Found transcript for {video_id}: {transcript.language_code}", file=sys.stderr)
 
         # Fetch the actual transcript data
         transcript_data = transcript.fetch()
 
-        # Format data similar to Whisper output for consistency
-        # Adding 'start_seconds' and 'end_seconds'
+        # Raw segments; timestamps are rounded/formatted by the shared output layer
         formatted_data = []
         for item in transcript_data:
-             # --- Access attributes instead of keys ---
-             start_seconds = item.start
-             duration = item.duration
-             text = item.text
-             # --- End change ---
-
-             end_seconds = start_seconds + duration
              formatted_data.append({
-                 "start": f"{int(start_seconds // 3600):02}:{int((start_seconds % 3600) // 60):02}:{int(start_seconds % 60):02},{int((start_seconds % 1) * 1000):03}",
-                 "end": f"{int(end_seconds // 3600):02}:{int((end_seconds % 3600) // 60):02}:{int(end_seconds % 60):02},{int((end_seconds % 1) * 1000):03}",
-                 "start_seconds": start_seconds,
-                 "end_seconds": end_seconds,
-                 "text": text
+                 "start": item.start,
+                 "end": item.start + item.duration,
+                 "text": item.text
              })
 
-        # Return the list of segments directly
-        return formatted_data
+        entry = {"video_id": video_id, "language": transcript.language_code, "segments": formatted_data}
+        if cache is not None:
+            # Store under the request key and the chosen language, so explicit
+            # requests for that language hit the cache too
+            cache.put(video_id, requested, entry)
+            if requested != transcript.language_code:
+                cache.put(video_id, transcript.language_code, entry)
+        return dict(entry, cached=False)
 
     except TranscriptsDisabled:
         print(f"ERROR: Transcripts are disabled for video ID: {video_id}", file=sys.stderr)
@@ -105,16 +153,59 @@ def fetch_transcript(video_id):
     except Exception as e:
         # Print the type of the exception as well for better debugging
         print(f"ERROR: An unexpected error occurred while fetching transcript: {type(e).__name__}: {e}", file=sys.stderr)
-        # Optionally, print traceback for more details
-        # import traceback
-        # traceback.print_exc(file=sys.stderr)
         return None
 
+def fetch_many(urls, languages=None, api=YouTubeTranscriptApi, cache=None, max_workers=DEFAULT_WORKERS):
+    """
+    Fetches transcripts for many URLs/IDs concurrently on a bounded thread pool.
+    Results keep the input order; each is a schema document or an error entry.
+    """
+    def fetch_one(url):
+        video_id = get_video_id(url) or (url if VIDEO_ID_PATTERN.fullmatch(url) else None)
+        if not video_id:
+            return {"url": url, "video_id": None, "error": "Could not extract video ID"}
+        entry = fetch_transcript(video_id, languages=languages, api=api, cache=cache)
+        if entry is None:
+            return {"url": url, "video_id": video_id, "error": "Transcript not available"}
+        return build_document(entry["segments"], source="youtube", language=entry["language"],
+                              url=url, video_id=video_id, cached=entry["cached"])
+
+    # Duplicate URLs in one request are fetched once
+    unique = list(dict.fromkeys(urls))
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unique) or 1))) as pool:
+        fetched = dict(zip(unique, pool.map(fetch_one, unique)))
+    return [fetched[url] for url in urls]
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Fetch YouTube transcript.')
-    parser.add_argument('--url', required=True, help='YouTube video URL')
+    parser.add_argument('--url', help='YouTube video URL')
+    parser.add_argument('--urls', nargs='+', help='Bulk mode: several YouTube URLs or video IDs')
+    parser.add_argument('--urls-file', help='Bulk mode: file with one URL or video ID per line')
+    parser.add_argument('--languages', help='Comma-separated language priority (default: en,en-US,en-GB)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Concurrent fetches in bulk mode')
+    parser.add_argument('--cache-dir', help='Transcript cache directory (default: $YOUTUBE_CACHE_DIR or system temp)')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_CACHE_TTL, help='Cache entry lifetime in seconds')
+    parser.add_argument('--no-cache', action='store_true', help='Always fetch from YouTube')
     args = parser.parse_args()
 
+    languages = [lang.strip() for lang in args.languages.split(",") if lang.strip()] if args.languages else None
+    cache = None if args.no_cache else TranscriptCache(args.cache_dir, args.cache_ttl)
+
+    bulk_urls = list(args.urls or [])
+    if args.urls_file:
+        with open(args.urls_file, "r", encoding="utf-8") as f:
+            bulk_urls.extend(line.strip() for line in f if line.strip())
+
+    if bulk_urls:
+        results = fetch_many(bulk_urls, languages=languages, cache=cache, max_workers=args.workers)
+        sys.stdout.buffer.write(dumps({"results": results}) + b"\n")
+        failed = sum(1 for r in results if "error" in r)
+        print(f"Fetched {len(results) - failed}/{len(results)} transcripts", file=sys.stderr)
+        sys.exit(1 if failed == len(results) else 0)
+
+    if not args.url:
+        parser.error("--url, --urls or --urls-file is required")
+
     youtube_url = args.url
     video_id = get_video_id(youtube_url)
 
@@ -122,17 +213,11 @@ if __name__ == "__main__":
         print(f"ERROR: Could not extract video ID from URL: {youtube_url}", file=sys.stderr)
         sys.exit(1)
 
-    transcript_segments = fetch_transcript(video_id)
+    entry = fetch_transcript(video_id, languages=languages, cache=cache)
 
-    if transcript_segments is None:
+    if entry is None:
         # Error message already printed in fetch_transcript
         sys.exit(1)
     else:
-        # Wrap the segments list in a structure similar to Whisper's output
-        output_data = {
-            "text": " ".join([seg['text'] for seg in transcript_segments]), # Full text
-            "segments": transcript_segments,
-            "language": "unknown" # Language detection not performed here, set placeholder
-        }
-        # Print the JSON output to stdout
-        print(json.dumps(output_data))
+        # Print the JSON output to stdout in the same schema as the Whisper entry points
+        print_transcript(entry["segments"], source="youtube", language=entry["language"])